@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+A module of the binary column cache of the parsed input.
+The cache is written when a file is read the first time, and memory mapped as core.Columns on later runs,
+so the text parsing and validation are skipped. numpy is required to read the cache.
+
+Layout of the cache file, little endian:
+    header (HEADER_SIZE bytes): magic, version, flags, numbers of lines, size, mtime and hash of the input file
+    dates (int32), applicants (int32), starts (uint16), ends (uint16), each is a column of all lines
+'''
+
+import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+import core
+
+# magic and version of the cache file
+MAGIC = 'BFCOLS\0\0'
+VERSION = 2
+
+# flag of the cache written from the checked lines
+FLAG_CHECKED = 1
+
+# header of the cache file, padded to HEADER_SIZE
+_HEADER = struct.Struct('<8sIIQQd40s')
+HEADER_SIZE = 128
+
+# bytes of the beginning and the end of the input file in the hash
+_HASH_BYTES = 1024 * 1024
+
+
+def input_key(input_path):
+    """
+    Key of the input file, formed by the size, mtime and a hash of the beginning and the end of the file.
+
+    :param input_path: str, path of the input file.
+    :return: tuple, formed by size, mtime and hex digest.
+    """
+    stat = os.stat(input_path)
+    sha1 = hashlib.sha1()
+    with open(input_path, 'rb') as f:
+        sha1.update(f.read(_HASH_BYTES))
+        if stat.st_size > _HASH_BYTES:
+            f.seek(max(_HASH_BYTES, stat.st_size - _HASH_BYTES))
+            sha1.update(f.read(_HASH_BYTES))
+    return stat.st_size, stat.st_mtime, sha1.hexdigest()
+
+
+class ColumnWriter(object):
+    """
+    Collect the parsed lines to columns, and write the cache file.
+    A line which can not be restored exactly from the columns, like '9:00~12:00', disables the cache,
+    the checked lines are always restorable.
+    """
+
+    def __init__(self, cache_path, key, is_check):
+        """
+        :param cache_path: str, path of the cache file.
+        :param key: tuple, key of the input file by input_key.
+        :param is_check: bool, if the lines are checked.
+        """
+        self.cache_path = cache_path
+        self.key = key
+        self.is_check = is_check
+        self.flags = FLAG_CHECKED if is_check else 0
+        self.is_cacheable = True
+        self.dates, self.applicants = array.array('i'), array.array('i')
+        self.starts, self.ends = array.array('H'), array.array('H')
+
+    def add(self, booking):
+        """
+        Add a parsed line.
+
+        :param booking: core.Booking, the parsed line.
+        """
+        if not self.is_cacheable:
+            return
+        time, date, start, end, applicants = booking
+        if not self.is_check and time != core.booking_time(date, start, end):
+            self.is_cacheable = False
+            return
+        try:
+            self.applicants.append(applicants)
+        except OverflowError:
+            # more applicants than int32
+            self.is_cacheable = False
+            return
+        self.dates.append(date)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def close(self):
+        """
+        Write the cache file, the file is replaced atomically.
+
+        :return: bool, if the cache file is written.
+        """
+        if not self.is_cacheable:
+            return False
+        size, mtime, digest = self.key
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, self.flags, len(self.dates), size, mtime, digest).ljust(HEADER_SIZE, '\0'))
+            for column in (self.dates, self.applicants, self.starts, self.ends):
+                if sys.byteorder != 'little':
+                    column.byteswap()
+                column.tofile(f)
+        os.rename(tmp_path, self.cache_path)
+        return True
+
+
+def load_columns(cache_path, input_path, is_check):
+    """
+    Memory map the cache file as columns, if it matches the input file.
+
+    :param cache_path: str, path of the cache file.
+    :param input_path: str, path of the input file.
+    :param is_check: bool, if the lines should be checked, a cache of the unchecked lines does not match.
+    :return: core.Columns, None if the cache does not exist, does not match or numpy is not installed.
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        numpy = core.import_numpy()
+    except ImportError:
+        return None
+    with open(cache_path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            return None
+        magic, version, flags, count, size, mtime, digest = _HEADER.unpack(header[:_HEADER.size])
+        if magic != MAGIC or version != VERSION or (is_check and not flags & FLAG_CHECKED):
+            return None
+        if (size, mtime, digest) != input_key(input_path):
+            return None
+        if os.fstat(f.fileno()).st_size != HEADER_SIZE + count * 12:
+            return None
+        if count == 0:
+            empty = numpy.zeros(0, dtype=numpy.int32)
+            return core.Columns(empty, empty, empty, empty)
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    offset = HEADER_SIZE
+    dates = numpy.frombuffer(buf, dtype='<i4', count=count, offset=offset)
+    offset += count * 4
+    applicants = numpy.frombuffer(buf, dtype='<i4', count=count, offset=offset)
+    offset += count * 4
+    starts = numpy.frombuffer(buf, dtype='<u2', count=count, offset=offset)
+    offset += count * 2
+    ends = numpy.frombuffer(buf, dtype='<u2', count=count, offset=offset)
+    return core.Columns(dates, starts, ends, applicants)
+
+
+def caching_bookings(bookings, cache_path, input_path, is_check):
+    """
+    Pass the parsed lines through, and write the cache file after the last one.
+    The cache is not written if the input file changed during the reading.
+
+    :param bookings: iterable, core.Booking of all lines in the input file.
+    :param cache_path: str, path of the cache file.
+    :param input_path: str, path of the input file.
+    :param is_check: bool, if the lines are checked.
+    :return: generator, core.Booking.
+    """
+    key = input_key(input_path)
+    writer = ColumnWriter(cache_path, key, is_check)
+    for booking in bookings:
+        writer.add(booking)
+        yield booking
+    if input_key(input_path) == key:
+        writer.close()
@@ -7,14 +7,298 @@ A module calculate the profit of ordering badminton court.
 
 import datetime
 import re
+from itertools import islice, izip
+from operator import itemgetter
+
+import helpers
+from helpers import INCOMES_PER_APPLICANT, APPLICANTS_PER_COURT, ODER_STRATEGY, CHARGE_STRATEGY, COURTS_TABLE_SIZE
+from helpers import DATE_CACHE_SIZE, RESULT_CACHE_SIZE, MINUTES_PER_DAY, WEEK_STRS, LRUCache, parse_date_str
+from helpers import convert_time_str_minute, compile_charge_strategy, ChargeTable, CourtsTable, money, format_amount
+
+# numpy is imported by import_numpy at the first batch calculation, importing it takes most of the startup time
+numpy = None
+
+# regular expression for input line, groups are date, range of time, start time, end time and applicants,
+# the time is from 09:00 to 22:00 in minutes
+_RE_LINE = re.compile(r'\s*(\d{4}-\d\d-\d\d)\s+(((?:09|1\d|2[01]):[0-5]\d|22:00)~((?:09|1\d|2[01]):[0-5]\d|22:00))'
+                      r'\s+(\d+)\s*$')
+
+# the strategies compiled by refresh_strategies:
+# fingerprint and key of the strategies in helpers when they were compiled
+_STRATEGY_FINGERPRINT = None
+_STRATEGY_KEY = None
+# incomes from every applicant
+_INCOMES_PER_APPLICANT = None
+# courts table compiled from ODER_STRATEGY
+_COURTS_TABLE = None
+# charge tables compiled from CHARGE_STRATEGY, keys are day of week string
+_CHARGE_TABLES = None
+# charge tables indexed by the weekday number, None if the day is not in CHARGE_STRATEGY
+_WEEK_CHARGE_TABLES = None
+
+# cache from date string to the ordinal of the date
+_DATE_CACHE = LRUCache(DATE_CACHE_SIZE)
+
+# cache from the charge table, start minute, end minute and applicants to the result of a line,
+# the result is a tuple formed by income, payment, profit and the formatted string of them
+_RESULT_CACHE = LRUCache(RESULT_CACHE_SIZE)
+
+# numpy arrays compiled from the courts table and charge tables, see _batch_tables
+_BATCH_TABLES = dict()
+
+# charge tables of the strategies passed to payment_list
+_CHARGE_TABLE_CACHE = dict()
+# cache from the ordinal of the date to the date string
+_DATE_STR_CACHE = LRUCache(DATE_CACHE_SIZE)
+
+# format of the range of time in the time string of a line, formed by the hours and minutes of the start and end
+_RANGE_FORMAT = ' %02d:%02d~%02d:%02d'
+
+# title of the summary
+SUMMARY_TITLE = ('[Summary]', '')
+
+# format of the income, payment and profit in an output line, the profit with sign, or 0 without sign
+_RESULT_FORMAT = ' +%d -%d %+d'
+_ZERO_PROFIT_RESULT_FORMAT = ' +%d -%d 0'
+
+class _Record(tuple):
+    """
+    Help class of the immutable records of this module, the same as the classes of namedtuple.
+    The classes are written out instead, namedtuple compiles the source of each class when the programme starts.
+    """
+    __slots__ = ()
+    _fields = ()
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join('%s=%r' % item for item in zip(self._fields, self)))
+
+    def __getnewargs__(self):
+        return tuple(self)
+
+    def __getstate__(self):
+        # nothing but the fields, which are pickled by __getnewargs__
+        pass
+
+
+class Booking(_Record):
+    """
+    A parsed line of ordering information, the time is the output string like '2016-06-02 20:00~22:00',
+    the date is the proleptic Gregorian ordinal, the start and end are minutes of the day.
+    """
+    __slots__ = ()
+    _fields = ('time', 'date', 'start', 'end', 'applicants')
+
+    def __new__(cls, time, date, start, end, applicants):
+        return tuple.__new__(cls, (time, date, start, end, applicants))
+
+    time = property(itemgetter(0))
+    date = property(itemgetter(1))
+    start = property(itemgetter(2))
+    end = property(itemgetter(3))
+    applicants = property(itemgetter(4))
+
+
+class SessionInfo(_Record):
+    """
+    Immutable information of a line calculated by info_single, it takes a third of the memory of a dict.
+    The fields can be read by the keys and the methods of a dict as well, like info['payment'] or info.get('profit'),
+    but iterating it gives the values like a tuple.
+
+    Usage::
+        >>> info = SessionInfo('2016-06-02 20:00~22:00', 210, 240, -30)
+        >>> info['payment'], info.profit, info.get('count', 0)
+        (240, -30, 0)
+        >>> 'income' in info, 'count' in info
+        (True, False)
+        >>> info.items()[1:]
+        [('income', 210), ('payment', 240), ('profit', -30)]
+    """
+    __slots__ = ()
+    _fields = ('time', 'income', 'payment', 'profit')
+
+    def __new__(cls, time, income, payment, profit):
+        return tuple.__new__(cls, (time, income, payment, profit))
+
+    time = property(itemgetter(0))
+    income = property(itemgetter(1))
+    payment = property(itemgetter(2))
+    profit = property(itemgetter(3))
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def __contains__(self, key):
+        if isinstance(key, basestring):
+            return key in self._fields
+        return tuple.__contains__(self, key)
+
+    def get(self, key, default=None):
+        """
+        Get the field of the key like dict.get, the default if there is no such field.
+        """
+        return getattr(self, key) if key in self._fields else default
+
+    def keys(self):
+        return list(self._fields)
+
+    def values(self):
+        return list(self)
+
+    def items(self):
+        return zip(self._fields, self)
+
+# build a SessionInfo without calling its __new__, it is faster than building a dict
+_new_session_info = tuple.__new__
+
+
+class Columns(_Record):
+    """
+    Parsed lines in columns, the items are arrays of the fields of Booking except time, like the column cache.
+    """
+    __slots__ = ()
+    _fields = ('dates', 'starts', 'ends', 'applicants')
+
+    def __new__(cls, dates, starts, ends, applicants):
+        return tuple.__new__(cls, (dates, starts, ends, applicants))
+
+    dates = property(itemgetter(0))
+    starts = property(itemgetter(1))
+    ends = property(itemgetter(2))
+    applicants = property(itemgetter(3))
+
+# default numbers of lines calculated together when the input is Columns
+COLUMNS_CHUNK_SIZE = 65536
+
+
+def refresh_strategies(is_force=False):
+    """
+    Compile the strategies in helpers, if they changed since the last compilation.
+    The caches of the results are cleared when the strategies are compiled.
+    It is called when this module is imported and at the beginning of each summary. The functions calculating
+    a single line use the strategies of the last compilation, so they stay cheap for the callers of each line,
+    and a caller changing the strategies at runtime calls it before them.
+
+    :param is_force: bool, if compile the strategies even if they did not change.
+    :return: bool, if the strategies are compiled.
+    """
+    global _STRATEGY_FINGERPRINT, _STRATEGY_KEY, _INCOMES_PER_APPLICANT, _COURTS_TABLE, _CHARGE_TABLES, \
+        _WEEK_CHARGE_TABLES
+    # the fingerprint is cheap to compare, the key is only calculated when it changed
+    fingerprint = helpers.strategy_fingerprint()
+    if fingerprint == _STRATEGY_FINGERPRINT and not is_force:
+        return False
+    current_key = helpers.strategy_key()
+    if current_key == _STRATEGY_KEY and not is_force:
+        _STRATEGY_FINGERPRINT = fingerprint
+        return False
+    _INCOMES_PER_APPLICANT = helpers.INCOMES_PER_APPLICANT
+    _COURTS_TABLE, _CHARGE_TABLES = helpers.compile_strategies(current_key, is_force)
+    _WEEK_CHARGE_TABLES = [_CHARGE_TABLES.get(week_str) for week_str in WEEK_STRS]
+    _BATCH_TABLES.clear()
+    _RESULT_CACHE.clear()
+    _STRATEGY_KEY = current_key
+    _STRATEGY_FINGERPRINT = fingerprint
+    return True
+
+
+def result_cache_stats():
+    """
+    Statistics of the cache of the results of the lines.
+
+    :return: dict, hits, misses, evictions, size and hit rate of the cache.
+    """
+    return _RESULT_CACHE.stats()
+
+
+def date_ordinal(date_str):
+    """
+    Get the ordinal of the date, the results are cached by the date string.
+
+    :param date_str: str, format as '%Y-%m-%d' like '2016-06-02'.
+    :return: int, proleptic Gregorian ordinal of the date.
+    :raise: ValueError.
+
+    Usage::
+        >>> date_ordinal('2016-06-02')
+        736117
+    """
+    ordinal = _DATE_CACHE.get(date_str)
+    if ordinal is None:
+        ordinal = parse_date_str(date_str).toordinal()
+        _DATE_CACHE.put(date_str, ordinal)
+    return ordinal
+
+
+def date_cache_stats():
+    """
+    Statistics of the cache used by date_ordinal.
+
+    :return: dict, hits, misses, evictions, size and hit rate of the cache.
+    """
+    return _DATE_CACHE.stats()
 
-from helpers import INCOMES_PER_APPLICANT, APPLICANTS_PER_COURT, ODER_STRATEGY, CHARGE_STRATEGY
-from helpers import value_for, convert_time_str_tuple
 
-# regular expression for input string
-_RE_DATE = re.compile(r'\d{4}-((0[1-9]|1[0-2])-(0[1-9]|1[0-9]|2[0-8])|(0[13-9]|1[0-2])-(29|30)|(0[13578]|1[02])-31)')
-_RE_TIME = re.compile(r'((09|1[0-9]|2[012]):00)~((09|1\d|2[012]):00)')
-_RE_NUM = re.compile(r'\d+')
+def parse_line(format_str_line, is_check=False):
+    """
+    Parse a line of ordering information to a Booking in a single pass.
+
+    :param format_str_line: str, one line string,
+                            with the format: {date} {start_time~end_time} {numbers of applicants}.
+    :param is_check: bool, if check the legality of the line.
+    :return: Booking, the parsed line.
+    :raise: ValueError or AssertionError.
+
+    Usage::
+        >>> parse_line('2016-06-02 20:00~22:00 7', is_check=True)
+        Booking(time='2016-06-02 20:00~22:00', date=736117, start=1200, end=1320, applicants=7)
+        >>> parse_line('2016-06-02 20:15~21:45 7', is_check=True)
+        Booking(time='2016-06-02 20:15~21:45', date=736117, start=1215, end=1305, applicants=7)
+    """
+    if is_check:
+        m = _RE_LINE.match(format_str_line)
+        if m is None:
+            raise ValueError('Input string is not match the format. %s' % format_str_line)
+        date_str, hour_range_str, start_str, end_str, applicants_str = m.groups()
+        start = int(start_str[:2]) * 60 + int(start_str[3:])
+        end = int(end_str[:2]) * 60 + int(end_str[3:])
+        assert start < end, 'start time must less than end time.'
+    else:
+        date_str, hour_range_str, applicants_str = format_str_line.split()
+        start, end = [convert_time_str_minute(time_str) for time_str in hour_range_str.split('~')]
+    return Booking(date_str + ' ' + hour_range_str, date_ordinal(date_str), start, end, int(applicants_str))
+
+
+def parse_buffer(buf, pos, endpos, is_check=False):
+    """
+    Parse a line in a buffer like mmap to a Booking, without copying the line out of the buffer.
+
+    :param buf: buffer, str or mmap.
+    :param pos: int, start offset of the line.
+    :param endpos: int, end offset of the line, the line separator is not required to be excluded.
+    :param is_check: bool, if check the legality of the line.
+    :return: Booking, the parsed line.
+    :raise: ValueError or AssertionError.
+
+    Usage::
+        >>> parse_buffer('2016-06-02 20:00~22:00 7\\n2016-06-03 09:00~12:00 14\\n', 25, 51)
+        Booking(time='2016-06-03 09:00~12:00', date=736118, start=540, end=720, applicants=14)
+    """
+    m = _RE_LINE.match(buf, pos, endpos)
+    if m is None:
+        if is_check:
+            raise ValueError('Input string is not match the format. %s' % buf[pos:endpos])
+        # the line may be legal in the loose format, like '9:00~13:00'
+        return parse_line(buf[pos:endpos])
+    date_str, hour_range_str, start_str, end_str, applicants_str = m.groups()
+    start = int(start_str[:2]) * 60 + int(start_str[3:])
+    end = int(end_str[:2]) * 60 + int(end_str[3:])
+    if is_check:
+        assert start < end, 'start time must less than end time.'
+    return Booking(date_str + ' ' + hour_range_str, date_ordinal(date_str), start, end, int(applicants_str))
 
 
 def check_input_line(format_str_line):
@@ -22,21 +306,10 @@ def check_input_line(format_str_line):
     Check the legality of input line.
 
     :param format_str_line: str, one line input.
-    :return: None.
+    :return: Booking, the parsed line.
     :raise: ValueError or AssertionError.
     """
-    input_list = format_str_line.split()
-    assert len(input_list), 'Input information is not complete.'
-    re_list = [_RE_DATE, _RE_TIME, _RE_NUM]
-    for i in range(3):
-        # check the format
-        m = re_list[i].match(input_list[i])
-        if m is None:
-            raise ValueError('Input string is not match the format. %s' % format_str_line)
-        # check the time range.
-        if i == 1:
-            start, end = convert_time_str_tuple((m.group(1), m.group(3)))
-            assert start < end, 'start time must less than end time.'
+    return parse_line(format_str_line, is_check=True)
 
 
 def courts(applicants):
@@ -45,7 +318,7 @@ def courts(applicants):
 
     :param applicants: int, numbers of applicants.
     :return: int, courts will order.
-    :raise: ValueError.
+    :raise: AttributeError.
 
     Usage::
         >>> courts(3)
@@ -57,14 +330,14 @@ def courts(applicants):
         >>> courts(29)
         4
     """
-    quotient, remainder = divmod(applicants, APPLICANTS_PER_COURT)
-    strategy_str = value_for(remainder, value_for(quotient, ODER_STRATEGY))
-    if strategy_str == 'same':
-        return quotient
-    elif strategy_str == 'plus':
-        return quotient + 1
-    else:
-        raise ValueError('Can not resolve the strategy string.')
+    return _courts(applicants)
+
+
+def _courts(applicants):
+    """
+    Help function of courts without refreshing the strategies, used when calculating the summary.
+    """
+    return _COURTS_TABLE.courts(applicants)
 
 
 def income(applicants):
@@ -74,7 +347,7 @@ def income(applicants):
     :param applicants: int, numbers of applicants.
     :return: int, income from the applicants.
     """
-    return applicants * INCOMES_PER_APPLICANT
+    return applicants * _INCOMES_PER_APPLICANT
 
 
 def payment(info_list):
@@ -96,9 +369,10 @@ def payment(info_list):
 def day_of_week(data_str):
     """
     Check the date, weekday or weekend.
+    The date is parsed by the fixed layout, and the result does not depend on the locale.
 
     :param data_str: str, format as '%Y-%m-%d' like '2016-06-02'.
-    :return: str, weekday or weekend.
+    :return: str, day of week string in WEEK_STRS.
 
     Usage::
         >>> day_of_week('2016-10-14')
@@ -108,72 +382,70 @@ def day_of_week(data_str):
         >>> day_of_week('2016-10-18')
         'Tue'
     """
-    date = datetime.datetime.strptime(data_str, '%Y-%m-%d')
-    return date.strftime('%a')
+    return WEEK_STRS[parse_date_str(data_str).weekday()]
 
 
-def _payment_list_driver(hour_range_tuple, charge_strategy, result_list):
+def charge_table_of_date(date):
     """
-    Help function for generating payment list,
-    items of the list is a tuple with hours and payment per hour in these hours.
+    Find the compiled charge table of the day.
 
-    :param hour_range_tuple: tuple, range of hours, formed by datetime object.
-    :param charge_strategy: dict, charge strategy of the day.
-    :param result_list: list, items are tuple formed by hours and charge.
-    :return: list, result list after recursion.
-    :raise: AssertionError.
+    :param date: int or str, ordinal of the date or date string like '2016-06-02'.
+    :return: ChargeTable, charge table of the day.
+    :raise: AttributeError or ValueError.
 
     Usage::
-        >>> time_1 = datetime.datetime.strptime('20:00', '%H:%M')
-        >>> time_2 = datetime.datetime.strptime('22:00', '%H:%M')
-        >>> _payment_list_driver((time_1, time_2), CHARGE_STRATEGY[('Mon', 'Tue', 'Wed', 'Thu', 'Fri')], [])
-        [(2, 60)]
-        >>> time_1 = datetime.datetime.strptime('10:00', '%H:%M')
-        >>> time_2 = datetime.datetime.strptime('13:00', '%H:%M')
-        >>> _payment_list_driver((time_1, time_2), CHARGE_STRATEGY[('Mon', 'Tue', 'Wed', 'Thu', 'Fri')], [])
-        [(2, 30), (1, 50)]
-        >>> time_1 = datetime.datetime.strptime('20:00', '%H:%M')
-        >>> time_2 = datetime.datetime.strptime('22:00', '%H:%M')
-        >>> _payment_list_driver((time_1, time_2), CHARGE_STRATEGY[('Mon', 'Tue', 'Wed', 'Thu', 'Fri')], [])
-        [(2, 60)]
+        >>> charge_table_of_date('2016-10-15').cost(540, 720)
+        120
     """
-    start, end = hour_range_tuple
-    assert start < end, 'start time must less than end time.'
-    for key in charge_strategy:
-        start_k, end_k = convert_time_str_tuple(key)
-        if start_k <= start < end_k:
-            if end <= end_k:
-                result_list.append(((end - start).seconds/3600, charge_strategy[key]))
-                return result_list
-            else:
-                result_list.append(((end_k - start).seconds/3600, charge_strategy[key]))
-                return _payment_list_driver((end_k, end), charge_strategy, result_list)
+    return _charge_table_of_date(date)
+
+
+def _charge_table_of_date(date):
+    """
+    Help function of charge_table_of_date without refreshing the strategies, used when calculating the summary.
+    """
+    if isinstance(date, basestring):
+        date = date_ordinal(date)
+    # the weekday number of the ordinal, 0 is Monday
+    charge_table = _WEEK_CHARGE_TABLES[(date + 6) % 7]
+    if charge_table is None:
+        raise AttributeError('Can not found information of this day of week in config.')
+    return charge_table
 
 
 def payment_list(hour_range_str, charge_strategy):
     """
-    A wrapper for _payment_list_driver.
+    Generate the payment list by the compiled charge table of the strategy.
 
-    :param hour_range_str: str, range of hours, like '9:00~13:00'.
+    :param hour_range_str: str, range of time, like '9:00~13:00' or '9:30~13:00'.
     :param charge_strategy: dict, charge strategy of the day.
-    :return: list, with information of hours and payment per hour.
+    :return: list, with information of hours, int or fractions.Fraction, and payment per hour.
+    :raise: AssertionError or ValueError.
 
     Usage::
         >>> payment_list('12:00~15:00', CHARGE_STRATEGY[('Sat', 'Sun')])
         [(3, 50)]
         >>> payment_list('20:00~22:00', CHARGE_STRATEGY[('Mon', 'Tue', 'Wed', 'Thu', 'Fri')])
         [(2, 60)]
+        >>> payment_list('10:00~13:00', CHARGE_STRATEGY[('Mon', 'Tue', 'Wed', 'Thu', 'Fri')])
+        [(2, 30), (1, 50)]
+        >>> payment_list('11:30~12:15', CHARGE_STRATEGY[('Mon', 'Tue', 'Wed', 'Thu', 'Fri')])
+        [(Fraction(1, 2), 30), (Fraction(1, 4), 50)]
     """
-    hour_range_tuple = convert_time_str_tuple(hour_range_str.split('~'))
-    return _payment_list_driver(hour_range_tuple, charge_strategy, [])
+    key = tuple(sorted(charge_strategy.iteritems()))
+    charge_table = _CHARGE_TABLE_CACHE.get(key)
+    if charge_table is None:
+        charge_table = _CHARGE_TABLE_CACHE[key] = ChargeTable(charge_strategy)
+    start, end = [convert_time_str_minute(time_str) for time_str in hour_range_str.split('~')]
+    return charge_table.payment_list(start, end)
 
 
 def info_single(format_str_line):
     """
-    Generate a information dict by calculating a line of format string.
+    Generate a information record by calculating a line of format string.
     :param format_str_line: str, one line string,
                             with the format: {date} {start_time~end_time} {numbers of applicants}.
-    :return: dict, contains information of payment and income.
+    :return: SessionInfo, contains information of payment and income.
     Usage::
 
         >>> info_single('2016-06-02 20:00~22:00 7')['payment']
@@ -181,36 +453,390 @@ def info_single(format_str_line):
         >>> info_single('2016-06-09 16:00~18:00 16')['profit']
         180
     """
-    date_str, hour_range_str, applicants_str = format_str_line.split()
-    applicants = int(applicants_str)
-    numbers_courts = courts(applicants)
+    return info_booking(parse_line(format_str_line))
+
+
+def info_booking(booking):
+    """
+    Generate a information record by calculating a parsed line.
+
+    :param booking: Booking, the parsed line.
+    :return: SessionInfo, contains information of payment and income.
+    """
+    inc, pay, pro, _ = session_result(booking)
+    return _new_session_info(SessionInfo, (booking.time, inc, pay, pro))
+
+
+def session_result(booking):
+    """
+    Calculate the income, payment and profit of a parsed line.
+    The results only depend on the charge table of the day, the minutes and the applicants,
+    so they are cached by these keys with the formatted string of them.
+
+    :param booking: Booking, the parsed line.
+    :return: tuple, formed by income, payment, profit and the formatted string by format_result.
+
+    Usage::
+        >>> session_result(parse_line('2016-06-02 20:00~22:00 7'))
+        (210, 240, -30, ' +210 -240 -30')
+        >>> session_result(parse_line('2016-06-02 20:00~21:15 7'))
+        (210, 150, 60, ' +210 -150 +60')
+        >>> session_result(parse_line('2016-06-02 19:50~21:00 5'))[3]
+        ' +150 -73.33 +76.67'
+    """
+    return _session_result(booking)
+
+
+def _session_result(booking):
+    """
+    Help function of session_result without refreshing the strategies, used when calculating the summary.
+    """
+    charge_table = _charge_table_of_date(booking.date)
+    key = (charge_table, booking.start, booking.end, booking.applicants)
+    result = _RESULT_CACHE.get(key)
+    if result is None:
+        numbers_courts = _courts(booking.applicants)
+        # calculate the income
+        inc = booking.applicants * _INCOMES_PER_APPLICANT if numbers_courts > 0 else 0
+
+        # calculate the payment, exactly in charge minutes before converting to money
+        pay = money(charge_table.cost_minutes(booking.start, booking.end) * numbers_courts)
+
+        # calculate the profit, use '+' because the payment in negative
+        pro = inc - pay
+
+        result = (inc, pay, pro, format_result(inc, pay, pro))
+        _RESULT_CACHE.put(key, result)
+    return result
+
+
+def check_booking(booking):
+    """
+    Check if a parsed line can be calculated by the strategies in use, without calculating the result of it.
+    The strategies are not refreshed, refresh_strategies is called once before checking the lines.
+
+    :param booking: Booking, the parsed line.
+    :raise: AttributeError, ValueError or AssertionError.
+
+    Usage::
+        >>> check_booking(parse_line('2016-06-02 20:00~22:00 7'))
+        >>> check_booking(parse_line('2016-06-02 07:00~10:00 7'))
+        Traceback (most recent call last):
+        ...
+        ValueError: Can not find the charge of the hours in config.
+    """
+    _charge_table_of_date(booking.date).cost_minutes(booking.start, booking.end)
+    _courts(booking.applicants)
+
+
+def _bookings(info_iter):
+    """
+    Help function to parse the items which are not parsed in the iterable.
+
+    :param info_iter: iterable, formed by string of ordering information or Booking.
+    :return: generator, Booking.
+    """
+    for item in info_iter:
+        yield item if isinstance(item, Booking) else parse_line(item)
+
+
+def info_batch(weekdays, starts, ends, applicants):
+    """
+    Calculate the income, payment and profit of a chunk of parsed lines with vectorized tables, numpy is required.
+
+    :param weekdays: numpy.ndarray, weekday number of each line, 0 is Monday.
+    :param starts: numpy.ndarray, start minute of each line.
+    :param ends: numpy.ndarray, end minute of each line.
+    :param applicants: numpy.ndarray, numbers of applicants of each line.
+    :return: tuple, arrays of income, payment and profit, the arrays are of objects if any payment is fractional.
+    :raise: AttributeError, ValueError or AssertionError.
+
+    Usage::
+        >>> numpy = import_numpy()
+        >>> inc, pay, pro = info_batch(numpy.array([3, 5]), numpy.array([1200, 540]), numpy.array([1320, 720]),
+        ...                            numpy.array([7, 3]))
+        >>> inc.tolist(), pay.tolist(), pro.tolist()
+        ([210, 0], [240, 0], [-30, 0])
+        >>> info_batch(numpy.array([3]), numpy.array([1190]), numpy.array([1200]), numpy.array([5]))[1].tolist()
+        [Fraction(40, 3)]
+    """
+    inc, charge_minutes = batch_charges(_batch_tables(), _INCOMES_PER_APPLICANT, weekdays, starts, ends, applicants)
+    if numpy.any(charge_minutes % 60):
+        pay = numpy.array([money(amount) for amount in charge_minutes.tolist()], dtype=object)
+    else:
+        pay = charge_minutes // 60
+    return inc, pay, inc - pay
+
+
+def batch_charges(tables, incomes_per_applicant, weekdays, starts, ends, applicants):
+    """
+    Calculate the income and the charge minutes of a chunk of parsed lines with the compiled arrays of any strategies.
+
+    :param tables: dict, the arrays compiled by batch_tables.
+    :param incomes_per_applicant: int, incomes from every applicant.
+    :param weekdays: numpy.ndarray, weekday number of each line, 0 is Monday.
+    :param starts: numpy.ndarray, start minute of each line.
+    :param ends: numpy.ndarray, end minute of each line.
+    :param applicants: numpy.ndarray, numbers of applicants of each line.
+    :return: tuple, arrays of income and charge minutes, the payment is the charge minutes divided by 60.
+    :raise: AttributeError, ValueError or AssertionError.
+    """
+    weekdays, starts, ends, applicants = [numpy.asarray(column, dtype=numpy.int64)
+                                          for column in (weekdays, starts, ends, applicants)]
+    numbers_courts = batch_courts(applicants, tables)
     # calculate the income
-    inc = income(applicants) if numbers_courts > 0 else 0
+    inc = applicants * incomes_per_applicant * (numbers_courts > 0)
 
     # calculate the payment
-    charge_strategy = None
-    week_str = day_of_week(date_str)
-    for k, v in CHARGE_STRATEGY.iteritems():
-        if week_str in k:
-            charge_strategy = v
-    if not charge_strategy:
-        raise AttributeError('Can not found information of this day of week in config.')
-    pay = payment(payment_list(hour_range_str, charge_strategy)) * numbers_courts
+    return inc, batch_court_charges(tables, weekdays, starts, ends) * numbers_courts
+
 
-    # calculate the profit, use '+' because the payment in negative
-    pro = inc - pay
+def batch_court_charges(tables, weekdays, starts, ends):
+    """
+    Calculate the charge minutes of a court for each parsed line with the compiled arrays.
 
-    # use the time string as key of the return dict
-    time = date_str + ' ' + hour_range_str
-    # format the return dict
-    return dict(time=time, income=inc, payment=pay, profit=pro)
+    :param tables: dict, the arrays compiled by batch_tables.
+    :param weekdays: numpy.ndarray, weekday number of each line, 0 is Monday.
+    :param starts: numpy.ndarray, start minute of each line.
+    :param ends: numpy.ndarray, end minute of each line.
+    :return: numpy.ndarray, charge minutes of a court.
+    :raise: ValueError or AssertionError.
+    """
+    assert numpy.all(starts < ends), 'start time must less than end time.'
+    if numpy.any(tables['covered'][weekdays, ends] - tables['covered'][weekdays, starts] != ends - starts):
+        raise ValueError('Can not find the charge of the hours in config.')
+    return tables['cumulative'][weekdays, ends] - tables['cumulative'][weekdays, starts]
 
 
-def info_rows(info_iter):
+def batch_courts(applicants, tables):
+    """
+    Get the courts of an array of applicants from the compiled courts table.
+
+    :param applicants: numpy.ndarray, numbers of applicants.
+    :param tables: dict, the arrays compiled by batch_courts_tables or batch_tables.
+    :return: numpy.ndarray, courts will order.
+    :raise: AttributeError.
+    """
+    size = tables['size']
+    if numpy.any(applicants < 0):
+        raise AttributeError('Can not find the range for number in the config.')
+    numbers_courts = tables['courts'][numpy.minimum(applicants, size - 1)]
+    beyond = applicants >= size
+    if numpy.any(beyond):
+        if tables['open_quotient'] is None:
+            raise AttributeError('Can not find the range for number in the config.')
+        quotient, remainder = numpy.divmod(applicants[beyond], tables['applicants_per_court'])
+        numbers_courts[beyond] = quotient + tables['open_extra'][remainder]
+    if numpy.any(numbers_courts < 0):
+        raise AttributeError('Can not find the range for number in the config.')
+    return numbers_courts
+
+
+def _batch_tables():
+    """
+    Help function to compile the strategies in use to numpy arrays, the arrays are compiled once.
+
+    :return: dict, the arrays compiled by batch_tables.
+    :raise: ImportError.
+    """
+    if not _BATCH_TABLES:
+        _BATCH_TABLES.update(batch_tables(_COURTS_TABLE, _WEEK_CHARGE_TABLES))
+    return _BATCH_TABLES
+
+
+def batch_tables(courts_table, week_charge_tables):
+    """
+    Compile a courts table and the charge tables of the weekdays to numpy arrays, numpy is required.
+
+    :param courts_table: helpers.CourtsTable, the compiled oder strategy.
+    :param week_charge_tables: list, helpers.ChargeTable indexed by the weekday number, None if not in the config.
+    :return: dict, arrays of courts, open_extra, cumulative and covered, with the parameters of the courts table.
+    :raise: ImportError.
+    """
+    tables = batch_courts_tables(courts_table)
+    # rows are indexed by the weekday number, the days not in the config have no covered hours
+    empty = [0] * (MINUTES_PER_DAY + 1)
+    tables['cumulative'] = numpy.array([table.cumulative if table else empty
+                                        for table in week_charge_tables], dtype=numpy.int64)
+    tables['covered'] = numpy.array([table.covered if table else empty
+                                     for table in week_charge_tables], dtype=numpy.int64)
+    return tables
+
+
+def batch_courts_tables(courts_table):
+    """
+    Compile a courts table to numpy arrays, numpy is required.
+
+    :param courts_table: helpers.CourtsTable, the compiled oder strategy.
+    :return: dict, arrays of courts and open_extra, with the parameters of the courts table.
+    :raise: ImportError.
+    """
+    import_numpy()
+    tables = {'size': courts_table.size, 'open_quotient': courts_table.open_quotient,
+              'applicants_per_court': courts_table.applicants_per_court}
+    # -1 means the numbers of applicants is not in the config
+    tables['courts'] = numpy.array([-1 if numbers_courts is None else numbers_courts
+                                    for numbers_courts in courts_table.table], dtype=numpy.int64)
+    tables['open_extra'] = numpy.array(getattr(courts_table, 'open_extra', [0]), dtype=numpy.int64)
+    return tables
+
+
+def import_numpy():
+    """
+    Import numpy at the first use, so the programme starts fast without the batch calculation.
+
+    :return: module, numpy.
+    :raise: ImportError, if numpy is not installed.
+    """
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('numpy is required by the batch calculation.')
+    return numpy
+
+
+def _chunks(iterable, chunk_size):
+    """
+    Help function to split an iterable to lists with the chunk size.
+
+    :param iterable: iterable.
+    :param chunk_size: int, the max length of each list.
+    :return: generator, lists.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def info_results(info_iter, chunk_size=None):
+    """
+    Help function to calculate each item of the iterable, in chunks by info_batch if the chunk size is set.
+
+    :param info_iter: iterable, formed by string of ordering information or Booking, or Columns.
+    :param chunk_size: int, numbers of lines calculated together, None or 0 for calculating line by line.
+                       Columns are always calculated in chunks, COLUMNS_CHUNK_SIZE by default.
+    :return: generator, tuples formed by Booking, income, payment, profit and the formatted string by format_result.
+    """
+    refresh_strategies()
+    if isinstance(info_iter, Columns):
+        for item in _columns_results(info_iter, chunk_size or COLUMNS_CHUNK_SIZE):
+            yield item
+        return
+    if not chunk_size:
+        for booking in _bookings(info_iter):
+            inc, pay, pro, result_str = _session_result(booking)
+            yield booking, inc, pay, pro, result_str
+        return
+    import_numpy()
+    for chunk in _chunks(_bookings(info_iter), chunk_size):
+        dates, starts, ends, applicants = [numpy.array(column, dtype=numpy.int64) for column in zip(*chunk)[1:]]
+        inc, pay, pro = info_batch((dates + 6) % 7, starts, ends, applicants)
+        for booking, row_inc, row_pay, row_pro in izip(chunk, inc.tolist(), pay.tolist(), pro.tolist()):
+            yield booking, row_inc, row_pay, row_pro, format_result(row_inc, row_pay, row_pro)
+
+
+def _columns_results(columns, chunk_size):
+    """
+    Help function to calculate the Columns in chunks by info_batch.
+
+    :param columns: Columns, the parsed lines.
+    :param chunk_size: int, numbers of lines calculated together.
+    :return: generator, the same as info_results.
+    """
+    import_numpy()
+    for offset in xrange(0, len(columns.dates), chunk_size):
+        dates, starts, ends, applicants = [numpy.asarray(column[offset:offset + chunk_size], dtype=numpy.int64)
+                                           for column in columns]
+        inc, pay, pro = info_batch((dates + 6) % 7, starts, ends, applicants)
+        dates, starts, ends = dates.tolist(), starts.tolist(), ends.tolist()
+        # the time strings are joined by the date strings and the range strings of the chunk
+        date_strs = dict((date, datetime.date.fromordinal(date).isoformat()) for date in set(dates))
+        range_strs = dict((minutes, _range_str(*minutes)) for minutes in set(izip(starts, ends)))
+        for row in izip(dates, starts, ends, applicants.tolist(), inc.tolist(), pay.tolist(), pro.tolist()):
+            date, start, end, row_applicants, row_inc, row_pay, row_pro = row
+            booking = Booking(date_strs[date] + range_strs[start, end], date, start, end, row_applicants)
+            yield booking, row_inc, row_pay, row_pro, format_result(row_inc, row_pay, row_pro)
+
+
+def booking_time(date, start, end):
+    """
+    Format the time string of a line from the parsed fields, the same as the time of a checked line.
+
+    :param date: int, ordinal of the date.
+    :param start: int, start minute.
+    :param end: int, end minute.
+    :return: str, the time string.
+
+    Usage::
+        >>> booking_time(736117, 1200, 1320)
+        '2016-06-02 20:00~22:00'
+    """
+    date_str = _DATE_STR_CACHE.get(date)
+    if date_str is None:
+        date_str = datetime.date.fromordinal(date).isoformat()
+        _DATE_STR_CACHE.put(date, date_str)
+    return date_str + _range_str(start, end)
+
+
+def _range_str(start, end):
+    """
+    Help function to format the range of time in the time string of a line, with the leading space.
+    """
+    return _RANGE_FORMAT % (start // 60, start % 60, end // 60, end % 60)
+
+
+def format_result(inc, pay, pro):
+    """
+    Format the income, payment and profit of a line, the output string is the time string followed by it.
+
+    :param inc: int, income.
+    :param pay: int or fractions.Fraction, payment.
+    :param pro: int or fractions.Fraction, profit.
+    :return: str, formatted string, the fractional amounts are formatted with 2 decimals.
+
+    Usage::
+        >>> format_result(420, 180, 240)
+        ' +420 -180 +240'
+        >>> format_result(90, money(750), 90 - money(750))
+        ' +90 -12.50 +77.50'
+    """
+    if pay.__class__ is not int:
+        return ' +%s -%s %s' % (format_amount(inc), format_amount(pay), format_amount(pro, is_sign=pro != 0))
+    if pro:
+        return _RESULT_FORMAT % (inc, pay, pro)
+    return _ZERO_PROFIT_RESULT_FORMAT % (inc, pay)
+
+
+def summary_footer(total_income, total_payment, total_profit, rejected=None):
+    """
+    Generate the footer of the summary.
+
+    :param total_income: int, total income.
+    :param total_payment: int, total payment.
+    :param total_profit: int, total profit.
+    :param rejected: int, numbers of the invalid lines sent to the quarantine, None if not quarantining.
+    :return: list, output strings of the footer.
+    """
+    footer = ['', 'Total Income: {}'.format(format_amount(total_income)),
+              'Total Payment: {}'.format(format_amount(total_payment)), 'Profit: {}'.format(format_amount(total_profit))]
+    if rejected is not None:
+        footer.append('Rejected: {}'.format(rejected))
+    return footer
+
+
+def info_rows(info_iter, chunk_size=None, collectors=(), quarantine=None):
     """
     Generate a information list with all time information as key and profit information dict as value.
 
-    :param info_iter: iterable, formed by string of ordering information.
+    :param info_iter: iterable, formed by string of ordering information or Booking.
+    :param chunk_size: int, numbers of lines calculated together by info_batch, None or 0 for line by line.
+    :param collectors: iterable, objects collecting each line by add(booking, income, payment, profit).
+    :param quarantine: streams.Quarantine, collecting the invalid lines of info_iter, None if not quarantining.
     :return: list, formed by out put strings.
 
     Usage::
@@ -223,71 +849,59 @@ def info_rows(info_iter):
         >>> info_iter.append('2016-06-05 19:00~22:00 3')
         >>> info_rows(info_iter)[4]
         '2016-06-05 19:00~22:00 +0 -0 0'
+        >>> info_rows(info_iter, chunk_size=2) == info_rows(info_iter)
+        True
     """
-    # init
-    output_list = list()
-    total_income, total_payment, total_profit = 0, 0, 0
+    return list(info_rows_generator(info_iter, chunk_size, collectors, quarantine))
 
-    # set title
-    title = ['[Summary]', '']
-    output_list.extend(title)
-    for line in info_iter:
-        info = info_single(line)
-        # count for total
-        total_income += info['income']
-        total_payment += info['payment']
-        total_profit += info['profit']
-        # get format string
-        info['profit'] = '%+d' % info['profit'] if info['profit'] != 0 else str(info['profit'])
-        format_str = '{time} +{income} -{payment} {profit}'.format(**info)
-        output_list.append(format_str)
-
-    # set footer
-    footer = ['', 'Total Income: {}'.format(total_income), 'Total Payment: {}'.format(total_payment),
-              'Profit: {}'.format(total_profit)]
-    output_list.extend(footer)
-    return output_list
-
-
-def info_rows_generator(info_iter):
+
+def info_rows_generator(info_iter, chunk_size=None, collectors=(), quarantine=None):
     """
     A generator of information.
 
-    :param info_iter: iterable, formed by string of ordering information.
+    :param info_iter: iterable, formed by string of ordering information or Booking.
+    :param chunk_size: int, numbers of lines calculated together by info_batch, None or 0 for line by line.
+    :param collectors: iterable, objects collecting each line by add(booking, income, payment, profit).
+    :param quarantine: streams.Quarantine, collecting the invalid lines of info_iter, None if not quarantining.
     :return: generator, output strings with total information.
     """
     total_income, total_payment, total_profit = 0, 0, 0
-    title = ['[Summary]', '']
-    for line in title:
+    for line in SUMMARY_TITLE:
         yield line
-    for format_str_line in info_iter:
-        info = info_single(format_str_line)
-        total_income += info['income']
-        total_payment += info['payment']
-        total_profit += info['profit']
-        info['profit'] = '%+d' % info['profit'] if info['profit'] != 0 else str(info['profit'])
-        format_str = '{time} +{income} -{payment} {profit}'.format(**info)
-        yield format_str
-    footer = ['', 'Total Income: {}'.format(total_income), 'Total Payment: {}'.format(total_payment),
-              'Profit: {}'.format(total_profit)]
-    for line in footer:
+    for booking, inc, pay, pro, result_str in info_results(info_iter, chunk_size):
+        total_income += inc
+        total_payment += pay
+        total_profit += pro
+        for collector in collectors:
+            collector.add(booking, inc, pay, pro)
+        yield booking.time + result_str
+    rejected = quarantine.rejected if quarantine is not None else None
+    for line in summary_footer(total_income, total_payment, total_profit, rejected):
         yield line
 
 
-def generate_summary(info_iter, is_generator):
+def generate_summary(info_iter, is_generator, chunk_size=None, collectors=(), quarantine=None):
     """
     A wrapper of output iterable information.
 
-    :param info_iter: iterable.
+    :param info_iter: iterable, formed by string of ordering information or Booking.
     :param is_generator: bool, if the return type is a generator.
+    :param chunk_size: int, numbers of lines calculated together by info_batch, None or 0 for line by line.
+    :param collectors: iterable, objects collecting each line by add(booking, income, payment, profit),
+                       like the rollups in the rollup module.
+    :param quarantine: streams.Quarantine, collecting the invalid lines of info_iter, None if not quarantining.
     :return: iterable, generator.
     """
     info_handler = info_rows_generator if is_generator else info_rows
-    output_iter = info_handler(info_iter)
+    output_iter = info_handler(info_iter, chunk_size, collectors, quarantine)
     for line in output_iter:
         yield line
 
 
+# compile the strategies when importing
+refresh_strategies()
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
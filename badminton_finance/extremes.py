@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+A module keeping the most profitable and the most loss-making sessions of the summary.
+The sessions are kept in two heaps of a fixed size as a collector of core.generate_summary,
+so the memory does not grow with the input and no second pass is needed.
+'''
+
+import heapq
+
+import core
+
+
+class ExtremeSessions(object):
+    """
+    Collector of the K sessions of the most profit and the K sessions of the least profit.
+    The sessions of the same profit are ordered by date, start, end and applicants, so the report does not depend
+    on the order of the lines.
+
+    Usage::
+        >>> extremes = ExtremeSessions(1)
+        >>> for line in ('2016-06-02 20:00~22:00 7', '2016-06-04 09:00~12:00 14', '2016-06-06 19:00~21:00 4'):
+        ...     booking = core.parse_line(line, True)
+        ...     extremes.add(booking, *core.session_result(booking)[:3])
+        >>> report = extremes.report()
+        >>> report[:3]
+        ['[Top 1 sessions]', '', '2016-06-04 09:00~12:00 +420 -240 +180']
+        >>> report[3:]
+        ['', '[Bottom 1 sessions]', '', '2016-06-02 20:00~22:00 +210 -240 -30']
+    """
+
+    def __init__(self, k):
+        """
+        :param k: int, numbers of the sessions kept at each end.
+        """
+        self.k = k
+        # the roots of the heaps are the kept sessions which are dropped first
+        self.top = list()
+        self.bottom = list()
+
+    def _push(self, heap, item):
+        """
+        Help function to push a session to a heap, the root is replaced if the heap is full.
+        """
+        if len(heap) < self.k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    def add(self, booking, inc, pay, pro):
+        # most of the sessions are dropped by comparing the profit with the roots
+        top, bottom = self.top, self.bottom
+        if len(top) < self.k or pro >= top[0][0]:
+            self._push(top, (pro, -booking.date, -booking.start, -booking.end, -booking.applicants, booking, inc, pay))
+        if len(bottom) < self.k or -pro >= bottom[0][0]:
+            self._push(bottom, (-pro, -booking.date, -booking.start, -booking.end, -booking.applicants, booking, inc,
+                                pay))
+
+    def merge(self, other):
+        """
+        Merge the sessions of another collector of the same size.
+
+        :param other: ExtremeSessions.
+        """
+        for item in other.top:
+            self._push(self.top, item)
+        for item in other.bottom:
+            self._push(self.bottom, item)
+
+    def report(self):
+        """
+        Generate the report of the sessions, the most profitable and the most loss-making ones are the first.
+
+        :return: list, output strings formatted as the lines of the summary.
+        """
+        output_list = ['[Top %d sessions]' % self.k, '']
+        for item in sorted(self.top, reverse=True):
+            booking, inc, pay = item[5:]
+            output_list.append(booking.time + core.format_result(inc, pay, item[0]))
+        output_list.extend(['', '[Bottom %d sessions]' % self.k, ''])
+        for item in sorted(self.bottom, reverse=True):
+            booking, inc, pay = item[5:]
+            output_list.append(booking.time + core.format_result(inc, pay, -item[0]))
+        return output_list
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -6,6 +6,8 @@ Helper module for badminton_finance.
 '''
 
 import datetime
+import marshal
+import os
 
 # incomes from every applicant
 INCOMES_PER_APPLICANT = 30
@@ -35,6 +37,32 @@ ODER_STRATEGY = {
     }
 }
 
+# size of the compiled courts table, larger numbers of applicants use the open-ended range of ODER_STRATEGY
+COURTS_TABLE_SIZE = 1024
+
+# bound of the cache from date string to the charge table of the day
+DATE_CACHE_SIZE = 4096
+
+# bound of the cache of the results, keyed by the charge table, hours and applicants of the lines
+RESULT_CACHE_SIZE = 65536
+
+# directory of the caches of the user, the package directory is never written
+USER_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                              'badminton_finance')
+
+# file of the compiled strategies, they are checked and compiled again only when the strategies change,
+# None means compiling them in every run
+COMPILED_STRATEGIES_PATH = os.path.join(USER_CACHE_DIR, 'compiled_strategies')
+
+# version of the compiled strategies file, changes when the compiled classes change
+COMPILED_STRATEGIES_VERSION = 3
+
+# day of week strings, indexed by the weekday number of datetime.date
+WEEK_STRS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+# minutes of a day, the range of the charge tables
+MINUTES_PER_DAY = 24 * 60
+
 # charges of the court
 CHARGE_STRATEGY = {
     ('Mon', 'Tue', 'Wed', 'Thu', 'Fri'): {
@@ -89,21 +117,531 @@ def convert_time_str_tuple(str_tuple):
     return tuple([datetime.datetime.strptime(time_str, '%H:%M') for time_str in str_tuple])
 
 
-def _check_strategy():
+def resolve_courts(applicants, oder_strategy, applicants_per_court):
+    """
+    Resolve the courts for the applicants by scanning the oder strategy.
+
+    :param applicants: int, numbers of applicants.
+    :param oder_strategy: dict, oder strategy like ODER_STRATEGY.
+    :param applicants_per_court: int, the applicants for each court.
+    :return: int, courts will order.
+    :raise: AttributeError or ValueError.
+
+    Usage::
+        >>> resolve_courts(5, ODER_STRATEGY, APPLICANTS_PER_COURT)
+        1
+        >>> resolve_courts(29, ODER_STRATEGY, APPLICANTS_PER_COURT)
+        4
+    """
+    quotient, remainder = divmod(applicants, applicants_per_court)
+    strategy_str = value_for(remainder, value_for(quotient, oder_strategy))
+    if strategy_str == 'same':
+        return quotient
+    elif strategy_str == 'plus':
+        return quotient + 1
+    else:
+        raise ValueError('Can not resolve the strategy string.')
+
+
+class CourtsTable(object):
+    """
+    Compiled oder strategy, the courts for each numbers of applicants less than the size are stored in a list.
+    Larger numbers of applicants are resolved by the open-ended range of the oder strategy like (4, None),
+    which only depends on the remainder of the applicants.
+
+    Usage::
+        >>> table = CourtsTable(ODER_STRATEGY, APPLICANTS_PER_COURT, 64)
+        >>> table.courts(7)
+        2
+        >>> table.courts(100)
+        16
+    """
+
+    def __init__(self, oder_strategy, applicants_per_court, size):
+        """
+        :param oder_strategy: dict, oder strategy like ODER_STRATEGY.
+        :param applicants_per_court: int, the applicants for each court.
+        :param size: int, numbers of applicants in the table.
+        """
+        self.applicants_per_court = applicants_per_court
+        # quotient from which the open-ended range applies, None if there is no such range
+        self.open_quotient = None
+        for start, end in oder_strategy:
+            if end is None and start is not None:
+                self.open_quotient = start
+        if self.open_quotient is not None:
+            # the table must reach the open-ended range, so the rest can be resolved in the closed form
+            size = max(size, self.open_quotient * applicants_per_court)
+            self.open_extra = [resolve_courts(self.open_quotient * applicants_per_court + remainder,
+                                              oder_strategy, applicants_per_court) - self.open_quotient
+                               for remainder in range(applicants_per_court)]
+        self.size = size
+        self.table = [self._resolve(applicants, oder_strategy) for applicants in range(size)]
+
+    def _resolve(self, applicants, oder_strategy):
+        """
+        Resolve the courts, None if the numbers of applicants is not in the oder strategy.
+        """
+        try:
+            return resolve_courts(applicants, oder_strategy, self.applicants_per_court)
+        except AttributeError:
+            return None
+
+    def courts(self, applicants):
+        """
+        Get the courts for all applicants.
+
+        :param applicants: int, numbers of applicants.
+        :return: int, courts will order.
+        :raise: AttributeError.
+        """
+        if 0 <= applicants < self.size:
+            numbers_courts = self.table[applicants]
+        elif applicants >= self.size and self.open_quotient is not None:
+            quotient, remainder = divmod(applicants, self.applicants_per_court)
+            numbers_courts = quotient + self.open_extra[remainder]
+        else:
+            numbers_courts = None
+        if numbers_courts is None:
+            raise AttributeError('Can not find the range for number in the config.')
+        return numbers_courts
+
+
+def convert_time_str_minute(time_str):
+    """
+    Help function for convert a time string to the minute of the day.
+
+    :param time_str: str, time string like '09:30'.
+    :return: int, the minute of the day.
+    :raise: ValueError.
+
+    Usage::
+        >>> convert_time_str_minute('09:00')
+        540
+        >>> convert_time_str_minute('21:45')
+        1305
+    """
+    hour_str, minute_str = time_str.split(':')
+    hour, minute = int(hour_str), int(minute_str)
+    if not (0 <= hour and 0 <= minute < 60 and hour * 60 + minute <= MINUTES_PER_DAY):
+        raise ValueError('Time string is out of the day. %s' % time_str)
+    return hour * 60 + minute
+
+
+def money(charge_minutes):
+    """
+    Convert an amount in charge minutes, the charge per hour times the minutes, to money.
+
+    :param charge_minutes: int, amount in charge minutes.
+    :return: int if the money is whole, otherwise fractions.Fraction.
+
+    Usage::
+        >>> money(3600)
+        60
+        >>> money(750)
+        Fraction(25, 2)
+    """
+    if charge_minutes % 60 == 0:
+        return charge_minutes // 60
+    # imported only for the fractional amounts, importing it takes a part of the startup time
+    from fractions import Fraction
+    return Fraction(charge_minutes, 60)
+
+
+def amount_from_str(amount_str):
+    """
+    Parse an amount of money from str(amount), the inverse of str for int and fractions.Fraction.
+
+    :param amount_str: str, like '240' or '25/2'.
+    :return: int or fractions.Fraction.
+
+    Usage::
+        >>> amount_from_str('240'), amount_from_str('-25/2')
+        (240, Fraction(-25, 2))
+    """
+    if '/' not in amount_str:
+        return int(amount_str)
+    from fractions import Fraction
+    return Fraction(amount_str)
+
+
+def format_amount(amount, is_sign=False):
+    """
+    Format an amount of money, the fractional amount is formatted with 2 decimals.
+
+    :param amount: int, float or fractions.Fraction, amount of money.
+    :param is_sign: bool, if format with the sign.
+    :return: str, formatted amount.
+
+    Usage::
+        >>> format_amount(30)
+        '30'
+        >>> format_amount(12.5, is_sign=True)
+        '+12.50'
+    """
+    if amount == int(amount):
+        return ('%+d' if is_sign else '%d') % amount
+    return ('%+.2f' if is_sign else '%.2f') % amount
+
+
+class ChargeTable(object):
+    """
+    Compiled charge strategy of a group of days, the times are minutes of the day.
+
+    The cumulative charge minutes from the beginning of the day are stored for every minute,
+    so the charge of any range of minutes is the difference of two items, however fine the bands are.
+
+    Usage::
+        >>> table = ChargeTable(CHARGE_STRATEGY[('Mon', 'Tue', 'Wed', 'Thu', 'Fri')])
+        >>> table.cost(600, 780)
+        110
+        >>> table.cost(690, 735)
+        Fraction(55, 2)
+        >>> table.payment_list(600, 780)
+        [(2, 30), (1, 50)]
+    """
+
+    def __init__(self, charge_strategy, week=()):
+        """
+        :param charge_strategy: dict, charge strategy of the day.
+        :param week: tuple, the days of week using the strategy, like ('Sat', 'Sun').
+        """
+        self.week = week
+        self.bands = sorted((convert_time_str_minute(start_str), convert_time_str_minute(end_str), charge)
+                            for (start_str, end_str), charge in charge_strategy.iteritems())
+        rates = [None] * MINUTES_PER_DAY
+        for start, end, charge in self.bands:
+            rates[start:end] = [charge] * (end - start)
+        # cumulative[m] is the charge minutes before m, covered[m] counts the minutes with a charge before m
+        self.cumulative, self.covered = [0], [0]
+        for rate in rates:
+            self.cumulative.append(self.cumulative[-1] + (rate or 0))
+            self.covered.append(self.covered[-1] + (rate is not None))
+
+    def cost_minutes(self, start, end):
+        """
+        Calculate the charge of a range of minutes in charge minutes, see money.
+
+        :param start: int, start minute.
+        :param end: int, end minute.
+        :return: int, charge minutes of the range.
+        :raise: AssertionError or ValueError.
+        """
+        assert start < end, 'start time must less than end time.'
+        if self.covered[end] - self.covered[start] != end - start:
+            raise ValueError('Can not find the charge of the hours in config.')
+        return self.cumulative[end] - self.cumulative[start]
+
+    def cost(self, start, end):
+        """
+        Calculate the charge of a range of minutes.
+
+        :param start: int, start minute.
+        :param end: int, end minute.
+        :return: int or fractions.Fraction, charge of the range.
+        :raise: AssertionError or ValueError.
+        """
+        return money(self.cost_minutes(start, end))
+
+    def payment_list(self, start, end):
+        """
+        Split a range of minutes by the charge strategy.
+
+        :param start: int, start minute.
+        :param end: int, end minute.
+        :return: list, items are tuple formed by hours, int or fractions.Fraction, and charge.
+        :raise: AssertionError or ValueError.
+        """
+        self.cost_minutes(start, end)
+        return [(money(min(end, end_k) - max(start, start_k)), charge) for start_k, end_k, charge in self.bands
+                if start_k < end and start < end_k]
+
+
+def reference_cost(charge_strategy, start, end):
+    """
+    Calculate the charge of a range of minutes minute by minute, the reference implementation of ChargeTable.cost.
+
+    :param charge_strategy: dict, charge strategy of the day.
+    :param start: int, start minute.
+    :param end: int, end minute.
+    :return: int or fractions.Fraction, charge of the range.
+    :raise: ValueError.
+
+    Usage::
+        >>> reference_cost(CHARGE_STRATEGY[('Mon', 'Tue', 'Wed', 'Thu', 'Fri')], 690, 735)
+        Fraction(55, 2)
+    """
+    charge_minutes = 0
+    for minute in xrange(start, end):
+        for (start_str, end_str), charge in charge_strategy.iteritems():
+            if convert_time_str_minute(start_str) <= minute < convert_time_str_minute(end_str):
+                charge_minutes += charge
+                break
+        else:
+            raise ValueError('Can not find the charge of the hours in config.')
+    return money(charge_minutes)
+
+
+def compile_charge_strategy(charge_strategy):
+    """
+    Compile the charge strategy to a charge table for each day of week.
+
+    :param charge_strategy: dict, keys are tuple of days of week, values are charge strategy of the days.
+    :return: dict, keys are day of week string like 'Mon', values are ChargeTable.
+
+    Usage::
+        >>> compile_charge_strategy(CHARGE_STRATEGY)['Sat'].cost(720, 900)
+        150
+    """
+    tables = dict()
+    for week, strategy in charge_strategy.iteritems():
+        table = ChargeTable(strategy, week)
+        for week_str in week:
+            tables[week_str] = table
+    return tables
+
+
+def parse_date_str(date_str):
+    """
+    Parse a date string with the fixed layout '%Y-%m-%d' without strptime.
+
+    :param date_str: str, date string like '2016-06-02'.
+    :return: datetime.date.
+    :raise: ValueError.
+
+    Usage::
+        >>> parse_date_str('2016-06-02')
+        datetime.date(2016, 6, 2)
+    """
+    if len(date_str) != 10 or date_str[4] != '-' or date_str[7] != '-':
+        raise ValueError('Date string is not match the format. %s' % date_str)
+    return datetime.date(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:]))
+
+
+class LRUCache(object):
+    """
+    A bounded cache which evicts the least recently used item, with the statistics of hits and misses.
+
+    Usage::
+        >>> cache = LRUCache(2)
+        >>> cache.put('a', 1)
+        >>> cache.put('b', 2)
+        >>> cache.get('a')
+        1
+        >>> cache.put('c', 3)
+        >>> cache.get('b') is None
+        True
+        >>> sorted(cache.stats().items())
+        [('evictions', 1), ('hit_rate', 0.5), ('hits', 1), ('misses', 1), ('size', 2)]
+    """
+
+    def __init__(self, max_size):
+        """
+        :param max_size: int, the max numbers of items in the cache.
+        """
+        self.max_size = max_size
+        # items are kept in a circular doubly linked list of [prev, next, key, value],
+        # the root is a sentinel, root[1] is the least recently used one
+        self._map = dict()
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+        self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def get(self, key, default=None):
+        """
+        Get the value of the key and mark it as the most recently used.
+
+        :param key: hashable, key of the item.
+        :param default: the value returned if the key is not in the cache.
+        :return: value of the key.
+        """
+        link = self._map.get(key)
+        if link is None:
+            self.misses += 1
+            return default
+        # move the link to the end of the list
+        link_prev, link_next = link[0], link[1]
+        link_prev[1], link_next[0] = link_next, link_prev
+        root = self._root
+        last = root[0]
+        last[1] = root[0] = link
+        link[0], link[1] = last, root
+        self.hits += 1
+        return link[3]
+
+    def put(self, key, value):
+        """
+        Put an item to the cache, evict the least recently used one if the cache is full.
+
+        :param key: hashable, key of the item.
+        :param value: value of the item.
+        """
+        link = self._map.pop(key, None)
+        if link is not None:
+            link[0][1], link[1][0] = link[1], link[0]
+        elif len(self._map) >= self.max_size:
+            oldest = self._root[1]
+            oldest[0][1], oldest[1][0] = oldest[1], oldest[0]
+            del self._map[oldest[2]]
+            self.evictions += 1
+        root = self._root
+        last = root[0]
+        link = [last, root, key, value]
+        last[1] = root[0] = self._map[key] = link
+
+    def clear(self):
+        """
+        Remove all items in the cache, the statistics are kept.
+        """
+        self._map.clear()
+        self._root[:] = [self._root, self._root, None, None]
+
+    def stats(self):
+        """
+        Statistics of the cache.
+
+        :return: dict, hits, misses, evictions, size and hit rate of the cache.
+        """
+        lookups = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions, size=len(self._map),
+                    hit_rate=float(self.hits) / lookups if lookups else 0.0)
+
+
+def _canonical(obj):
     """
-    Help function for check legality of CHARGE_STRATEGY.
+    Help function to convert the dicts in an object to sorted lists, so the repr is stable.
+    """
+    if isinstance(obj, dict):
+        return [(_canonical(k), _canonical(v)) for k, v in sorted(obj.iteritems())]
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(item) for item in obj]
+    return obj
+
+
+def strategy_key():
+    """
+    Stable repr of the strategies, it changes when any of the strategies affecting the results changes.
+
+    :return: str, repr of INCOMES_PER_APPLICANT, APPLICANTS_PER_COURT, ODER_STRATEGY and CHARGE_STRATEGY.
+    """
+    strategies = (INCOMES_PER_APPLICANT, APPLICANTS_PER_COURT, ODER_STRATEGY, CHARGE_STRATEGY)
+    return repr(_canonical(strategies))
+
+
+def strategy_hash():
+    """
+    Hash of the strategies, it changes when any of the strategies affecting the results changes.
+
+    :return: str, hex digest of strategy_key.
+    """
+    # hashlib is only imported by the incremental calculation, so the programme starts fast
+    import hashlib
+    return hashlib.sha1(strategy_key()).hexdigest()
+
+
+def strategy_fingerprint():
+    """
+    Cheap fingerprint of the strategies, it is compared on each call to find the changes of the strategies
+    at runtime, and strategy_key is only calculated when it changed.
+
+    :return: tuple, values of the strategies, the dicts in them are copied to lists of items.
+    """
+    return (INCOMES_PER_APPLICANT, APPLICANTS_PER_COURT,
+            [(key, value.items()) for key, value in ODER_STRATEGY.iteritems()],
+            [(key, value.items()) for key, value in CHARGE_STRATEGY.iteritems()])
+
+
+def _compiled_data(courts_table, charge_tables):
+    """
+    Help function to convert the compiled strategies to the built-in types, which are saved by marshal.
+    """
+    courts_data = (courts_table.applicants_per_court, courts_table.open_quotient,
+                   getattr(courts_table, 'open_extra', None), courts_table.size, courts_table.table)
+    charge_data = [(table.week, table.bands, table.cumulative, table.covered)
+                   for table in set(charge_tables.itervalues())]
+    return courts_data, charge_data
+
+
+def _compiled_from_data(courts_data, charge_data):
+    """
+    Help function to restore the compiled strategies from the data by _compiled_data, without running any code.
+    """
+    courts_table = CourtsTable.__new__(CourtsTable)
+    courts_table.applicants_per_court, courts_table.open_quotient, open_extra, courts_table.size, \
+        courts_table.table = courts_data
+    if open_extra is not None:
+        courts_table.open_extra = open_extra
+    charge_tables = dict()
+    for week, bands, cumulative, covered in charge_data:
+        table = ChargeTable.__new__(ChargeTable)
+        table.week, table.bands, table.cumulative, table.covered = week, bands, cumulative, covered
+        for week_str in week:
+            charge_tables[week_str] = table
+    return courts_table, charge_tables
+
+
+def compile_strategies(current_key, is_force=False):
+    """
+    Check and compile the strategies, or load the ones compiled from the same strategies by an earlier run.
+    The compiled strategies are saved to COMPILED_STRATEGIES_PATH by marshal, which only loads the built-in types,
+    nothing is saved if it is not writable.
+
+    :param current_key: str, the strategies by strategy_key.
+    :param is_force: bool, if compile the strategies even if they were compiled.
+    :return: tuple, formed by CourtsTable and the charge tables by compile_charge_strategy.
+    :raise: AssertionError, if the strategies are illegal.
+    """
+    key = (COMPILED_STRATEGIES_VERSION, current_key, COURTS_TABLE_SIZE)
+    if not is_force and COMPILED_STRATEGIES_PATH is not None:
+        try:
+            with open(COMPILED_STRATEGIES_PATH, 'rb') as f:
+                compiled_key, courts_data, charge_data = marshal.load(f)
+            if compiled_key == key:
+                return _compiled_from_data(courts_data, charge_data)
+        except Exception:
+            # missing or broken, compile again
+            pass
+    check_charge_strategy(CHARGE_STRATEGY)
+    compiled = (CourtsTable(ODER_STRATEGY, APPLICANTS_PER_COURT, COURTS_TABLE_SIZE),
+                compile_charge_strategy(CHARGE_STRATEGY))
+    if COMPILED_STRATEGIES_PATH is not None:
+        tmp_path = '%s.%d.tmp' % (COMPILED_STRATEGIES_PATH, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(COMPILED_STRATEGIES_PATH)):
+                os.makedirs(os.path.dirname(COMPILED_STRATEGIES_PATH))
+            with open(tmp_path, 'wb') as f:
+                marshal.dump((key,) + _compiled_data(*compiled), f)
+            os.rename(tmp_path, COMPILED_STRATEGIES_PATH)
+        except (IOError, OSError, ValueError):
+            # not writable, or the charges are not of the built-in types
+            pass
+    return compiled
+
+
+def check_charge_strategy(charge_strategy):
+    """
+    Check legality of a charge strategy like CHARGE_STRATEGY, the hours of a week group can not overlap,
+    and a day can not be in two week groups.
+
+    :param charge_strategy: dict, charge strategy like CHARGE_STRATEGY.
+    :raise: AssertionError, if the charge strategy is illegal.
     """
     assert_msg = 'Config in CHARGE_STRATEGY is illegal.'
-    for week, strategy in CHARGE_STRATEGY.iteritems():
+    days = set()
+    for week, strategy in charge_strategy.iteritems():
         for item in week:
-            assert item in ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'), assert_msg
+            assert item in WEEK_STRS, assert_msg
+            assert item not in days, assert_msg
+            days.add(item)
+        ranges = list()
         for k, v in strategy.iteritems():
             start_k, end_k = convert_time_str_tuple(k)
             assert start_k < end_k, assert_msg
             assert v > 0, assert_msg
-
-# assert the strategy is legal
-_check_strategy()
+            ranges.append((start_k, end_k))
+        ranges.sort()
+        for (_, end_k), (start_next, _) in zip(ranges[:-1], ranges[1:]):
+            assert end_k <= start_next, assert_msg
 
 
 if __name__ == '__main__':
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+A module calculate the summary of an append-only input file incrementally.
+A checkpoint file keeps the processed offset of the input, the size and the modified time of the input,
+the totals and the hash of the strategies, so a rerun only calculates the new lines, appends them to the output
+and rewrites the footer.
+'''
+
+import json
+import os
+
+import core
+import ledger
+from helpers import strategy_hash, amount_from_str
+
+# version of the checkpoint format
+CHECKPOINT_VERSION = 3
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Load the checkpoint file.
+
+    :param checkpoint_path: str, path of the checkpoint file.
+    :return: dict, the checkpoint, None if the file does not exist or is broken.
+    """
+    try:
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if not isinstance(checkpoint, dict) or checkpoint.get('version') != CHECKPOINT_VERSION:
+        return None
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    """
+    Save the checkpoint file, the file is replaced atomically.
+
+    :param checkpoint_path: str, path of the checkpoint file.
+    :param checkpoint: dict, the checkpoint.
+    """
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.rename(tmp_path, checkpoint_path)
+
+
+def _is_resumable(checkpoint, input_path, output_path):
+    """
+    Help function to check if the checkpoint matches the files and the strategies.
+    """
+    return checkpoint is not None and \
+        checkpoint['strategy_hash'] == strategy_hash() and \
+        checkpoint['input'] == os.path.abspath(input_path) and \
+        checkpoint['output'] == os.path.abspath(output_path) and \
+        os.path.exists(output_path) and \
+        os.path.getsize(input_path) >= checkpoint['offset'] and \
+        os.path.getsize(output_path) >= checkpoint['footer_offset'] and \
+        (not checkpoint['is_unterminated'] or _read_at(input_path, checkpoint['offset']) in ('', '\n'))
+
+
+def _read_at(file_path, offset):
+    """
+    Help function to read the byte of a file at the offset, empty if the offset is at the end.
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        return f.read(1)
+
+
+def _is_settled(checkpoint, input_path, input_stat):
+    """
+    Help function to check if the input file has not changed since the checkpoint.
+    """
+    return checkpoint is not None and \
+        checkpoint['input'] == os.path.abspath(input_path) and \
+        checkpoint['input_size'] == input_stat.st_size and \
+        checkpoint['input_mtime'] == input_stat.st_mtime
+
+
+def _complete_lines(f, state, is_settled):
+    """
+    Help function to read the lines ending with a line separator, and record the offset after the last one.
+    A last line without line separator may be still being written, it is left to the next run,
+    unless the input file has not changed since the last run.
+    """
+    for line in iter(f.readline, ''):
+        if not line.endswith('\n'):
+            if not is_settled:
+                break
+            state['is_unterminated'] = True
+        state['offset'] += len(line)
+        state['lines'] += 1
+        yield line
+
+
+def summary_incremental(input_path, output_path, checkpoint_path, is_check, writer_factory, chunk_size=None,
+                        ledger_path=None):
+    """
+    Calculate the new lines of the input file since the checkpoint, append them to the output file
+    and rewrite the footer. Everything is recalculated if the checkpoint does not match.
+    A last line without line separator is calculated if the input file has the same size and modified time
+    as the last run, and if the line is continued later instead of ended by a line separator,
+    everything is recalculated.
+
+    :param input_path: str, path of the input file.
+    :param output_path: str, path of the output file.
+    :param checkpoint_path: str, path of the checkpoint file.
+    :param is_check: bool, if check the input each line.
+    :param writer_factory: callable, create a writer like streams.BufferedWriter of a file.
+    :param chunk_size: int, numbers of lines calculated together by core.info_batch, None or 0 for line by line.
+    :param ledger_path: str, path of the ledger index updated with the new lines, None if not indexing.
+    :return: int, numbers of the lines calculated in this run.
+    """
+    input_stat = os.stat(input_path)
+    checkpoint = load_checkpoint(checkpoint_path)
+    is_settled = _is_settled(checkpoint, input_path, input_stat)
+    is_resumable = _is_resumable(checkpoint, input_path, output_path)
+    index = None
+    if ledger_path is not None:
+        index = ledger.load_ledger(ledger_path) if is_resumable else None
+        # the index is appended only if it has the same totals as the checkpoint
+        if index is None or [str(total) for total in index.totals()[1:3]] != checkpoint['totals'][:2]:
+            is_resumable = False
+            index = ledger.LedgerIndex()
+    if is_resumable:
+        state = dict(offset=checkpoint['offset'], lines=0, is_unterminated=checkpoint['is_unterminated'])
+        # the line separator ending the last line calculated without it
+        if state['is_unterminated'] and _read_at(input_path, state['offset']) == '\n':
+            state['offset'] += 1
+            state['is_unterminated'] = False
+        totals = [amount_from_str(total) for total in checkpoint['totals']]
+        footer_offset = checkpoint['footer_offset']
+        out_file = open(output_path, 'r+b')
+    else:
+        state = dict(offset=0, lines=0, is_unterminated=False)
+        totals = [0, 0, 0]
+        footer_offset = None
+        out_file = open(output_path, 'wb')
+
+    with out_file, open(input_path, 'rb') as in_file:
+        writer = writer_factory(out_file)
+        if footer_offset is None:
+            for line in core.SUMMARY_TITLE:
+                writer.write(line)
+        else:
+            out_file.seek(footer_offset)
+            out_file.truncate()
+        in_file.seek(state['offset'])
+        bookings = (core.parse_line(line, is_check) for line in _complete_lines(in_file, state, is_settled))
+        collector = ledger.LedgerCollector()
+        for booking, inc, pay, pro, result_str in core.info_results(bookings, chunk_size):
+            totals = [totals[0] + inc, totals[1] + pay, totals[2] + pro]
+            if index is not None:
+                collector.add(booking, inc, pay, pro)
+            writer.write(booking.time + result_str)
+        writer.flush()
+        footer_offset = out_file.tell()
+        for line in core.summary_footer(*totals):
+            writer.write(line)
+        writer.close()
+
+    if index is not None:
+        collector.flush(index)
+        index.save(ledger_path)
+    save_checkpoint(checkpoint_path, dict(version=CHECKPOINT_VERSION, input=os.path.abspath(input_path),
+                                          output=os.path.abspath(output_path), offset=state['offset'],
+                                          input_size=input_stat.st_size, input_mtime=input_stat.st_mtime,
+                                          is_unterminated=state['is_unterminated'],
+                                          footer_offset=footer_offset, totals=[str(total) for total in totals],
+                                          strategy_hash=strategy_hash()))
+    return state['lines']
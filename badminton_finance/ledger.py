@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+A module indexing the totals of the summary by date, so the totals between any two dates are answered in O(log n).
+The totals of each day are kept in Fenwick trees over the days from the first date, which grow when later days
+are appended, and the index is saved next to the output file.
+'''
+
+import json
+import os
+
+import core
+from core import date_ordinal
+from helpers import amount_from_str
+
+# version of the ledger index format
+LEDGER_VERSION = 1
+
+
+class LedgerIndex(object):
+    """
+    Fenwick trees of the numbers of lines, income and payment of each day, indexed by the days from the base date.
+
+    Usage::
+        >>> index = LedgerIndex()
+        >>> index.update(date_ordinal('2016-06-04'), 1, 210, 240)
+        >>> index.update(date_ordinal('2016-06-01'), 2, 90, 60)
+        >>> index.update(date_ordinal('2016-06-30'), 1, 30, 20)
+        >>> index.query(date_ordinal('2016-06-02'), date_ordinal('2016-06-30'))
+        (2, 240, 260, -20)
+    """
+
+    def __init__(self):
+        # ordinal of the first day, None if empty
+        self.base = None
+        # the trees are 1-based, the position of a day is the days from the base date plus 1
+        self.lines = [0]
+        self.income = [0]
+        self.payment = [0]
+
+    def __len__(self):
+        return len(self.lines) - 1
+
+    def _trees(self):
+        return self.lines, self.income, self.payment
+
+    def _append_day(self):
+        """
+        Help function to append an empty day, the new node is the sum of the days it covers before it.
+        """
+        position = len(self.lines)
+        low = position - (position & -position)
+        for tree in self._trees():
+            tree.append(self._prefix(tree, position - 1) - self._prefix(tree, low))
+
+    def _rebase(self, base):
+        """
+        Help function to move the base date earlier, the trees are built again.
+        """
+        days = [self.query(date, date)[:3] for date in xrange(self.base, self.base + len(self))]
+        shift = self.base - base
+        self.base = base
+        self.lines, self.income, self.payment = [0], [0], [0]
+        for _ in xrange(shift + len(days)):
+            self._append_day()
+        for offset, (lines, inc, pay) in enumerate(days):
+            self.update(base + shift + offset, lines, inc, pay)
+
+    @staticmethod
+    def _prefix(tree, position):
+        total = 0
+        while position > 0:
+            total += tree[position]
+            position -= position & -position
+        return total
+
+    def update(self, date, lines, inc, pay):
+        """
+        Add the totals of a day, the days after the last one are appended.
+
+        :param date: int, ordinal of the date.
+        :param lines: int, numbers of lines.
+        :param inc: int or fractions.Fraction, income.
+        :param pay: int or fractions.Fraction, payment.
+        """
+        if self.base is None:
+            self.base = date
+        elif date < self.base:
+            self._rebase(date)
+        position = date - self.base + 1
+        while len(self) < position:
+            self._append_day()
+        size = len(self)
+        while position <= size:
+            self.lines[position] += lines
+            self.income[position] += inc
+            self.payment[position] += pay
+            position += position & -position
+
+    def query(self, start_date, end_date):
+        """
+        Get the totals of the days between the dates, both of them are included.
+
+        :param start_date: int, ordinal of the start date.
+        :param end_date: int, ordinal of the end date.
+        :return: tuple, formed by numbers of lines, income, payment and profit.
+        """
+        if self.base is None or end_date < start_date:
+            return 0, 0, 0, 0
+        start = min(max(start_date - self.base, 0), len(self))
+        end = min(max(end_date - self.base + 1, 0), len(self))
+        lines, inc, pay = [self._prefix(tree, end) - self._prefix(tree, start) for tree in self._trees()]
+        return lines, inc, pay, inc - pay
+
+    def totals(self):
+        """
+        Get the totals of all days.
+
+        :return: tuple, formed by numbers of lines, income, payment and profit.
+        """
+        lines, inc, pay = [self._prefix(tree, len(self)) for tree in self._trees()]
+        return lines, inc, pay, inc - pay
+
+    def save(self, ledger_path):
+        """
+        Save the index, the file is replaced atomically.
+
+        :param ledger_path: str, path of the index file.
+        """
+        tmp_path = ledger_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(version=LEDGER_VERSION, base=self.base, lines=self.lines,
+                           income=[str(amount) for amount in self.income],
+                           payment=[str(amount) for amount in self.payment]), f)
+        os.rename(tmp_path, ledger_path)
+
+
+def load_ledger(ledger_path):
+    """
+    Load the index saved by LedgerIndex.save.
+
+    :param ledger_path: str, path of the index file.
+    :return: LedgerIndex, None if the file does not exist or is broken.
+    """
+    try:
+        with open(ledger_path) as f:
+            saved = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if not isinstance(saved, dict) or saved.get('version') != LEDGER_VERSION:
+        return None
+    index = LedgerIndex()
+    index.base = saved['base']
+    index.lines = saved['lines']
+    index.income = [amount_from_str(amount) for amount in saved['income']]
+    index.payment = [amount_from_str(amount) for amount in saved['payment']]
+    return index
+
+
+class LedgerCollector(object):
+    """
+    Collector of the totals of each day, they are added to an index by flush.
+    """
+
+    def __init__(self):
+        # lists of numbers of lines, income and payment keyed by the ordinal of the date
+        self.days = dict()
+
+    def add(self, booking, inc, pay, pro):
+        day = self.days.get(booking.date)
+        if day is None:
+            self.days[booking.date] = [1, inc, pay]
+        else:
+            day[0] += 1
+            day[1] += inc
+            day[2] += pay
+
+    def merge(self, other):
+        """
+        Merge the days of another collector.
+
+        :param other: LedgerCollector.
+        """
+        for date, (lines, inc, pay) in other.days.iteritems():
+            day = self.days.setdefault(date, [0, 0, 0])
+            day[0] += lines
+            day[1] += inc
+            day[2] += pay
+
+    def flush(self, index):
+        """
+        Add the collected days to the index in order of date, and clear them.
+
+        :param index: LedgerIndex.
+        """
+        for date in sorted(self.days):
+            index.update(date, *self.days[date])
+        self.days.clear()
+
+
+def query_report(index, start_date_str, end_date_str):
+    """
+    Generate the report of the totals between the dates like the footer of the summary.
+
+    :param index: LedgerIndex.
+    :param start_date_str: str, start date like '2016-06-04', included.
+    :param end_date_str: str, end date, included.
+    :return: list, output strings.
+    :raise: ValueError, if a date is illegal.
+
+    Usage::
+        >>> index = LedgerIndex()
+        >>> index.update(date_ordinal('2016-06-04'), 1, 210, 240)
+        >>> query_report(index, '2016-06-01', '2016-06-30')
+        ['2016-06-01~2016-06-30', 'Lines: 1', 'Total Income: 210', 'Total Payment: 240', 'Profit: -30']
+    """
+    lines, inc, pay, pro = index.query(date_ordinal(start_date_str), date_ordinal(end_date_str))
+    return ['%s~%s' % (start_date_str, end_date_str), 'Lines: %d' % lines] + core.summary_footer(inc, pay, pro)[1:]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
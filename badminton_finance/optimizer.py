@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+A module searching the fee, the applicants per court and the threshold of the oder strategy for the most profit
+of a booking history.
+The distinct lines are reduced once to the applicants and the charge of a court with their numbers,
+each candidate of the grid is scored on them by numpy, and the fees are scored together since the income is
+linear in the fee.
+'''
+
+from collections import namedtuple
+
+import core
+import helpers
+import scenario
+from helpers import format_amount, money
+
+# format of a row of the report
+_ROW_FORMAT = '%-10s %6s %10s %10s %12s %12s %12s'
+
+# result of a candidate, threshold is None if the oder strategy is not changed
+Candidate = namedtuple('Candidate', ('fee', 'applicants_per_court', 'threshold', 'income', 'payment', 'profit'))
+
+
+def parse_range(range_str):
+    """
+    Parse a range of integers, both ends are included.
+
+    :param range_str: str, 'START:STOP:STEP', 'START:STOP' or 'NUMBER'.
+    :return: list, the integers.
+    :raise: ValueError.
+
+    Usage::
+        >>> parse_range('20:30:5')
+        [20, 25, 30]
+        >>> parse_range('4:6')
+        [4, 5, 6]
+        >>> parse_range('35')
+        [35]
+    """
+    parts = [int(part) for part in range_str.split(':')]
+    if len(parts) > 3 or (len(parts) == 3 and parts[2] <= 0):
+        raise ValueError('Can not resolve the range. %s' % range_str)
+    start, stop, step = parts[0], parts[min(len(parts), 2) - 1], parts[2] if len(parts) == 3 else 1
+    return range(start, stop + 1, step)
+
+
+def split_oder_strategy(oder_strategy, threshold):
+    """
+    Change the remainder ordering one more court in the oder strategy.
+    The conditions of a quotient having both 'same' and 'plus' are replaced, the other conditions are kept.
+
+    :param oder_strategy: dict, oder strategy like helpers.ODER_STRATEGY.
+    :param threshold: int, the remainder from which one more court is ordered.
+    :return: dict, the changed oder strategy.
+
+    Usage::
+        >>> oder_strategy = split_oder_strategy(helpers.ODER_STRATEGY, 3)
+        >>> helpers.resolve_courts(15, oder_strategy, 6), helpers.resolve_courts(15, helpers.ODER_STRATEGY, 6)
+        (3, 2)
+    """
+    changed = dict()
+    for quotient_range, conditions in oder_strategy.iteritems():
+        if set(conditions.itervalues()) == {'same', 'plus'}:
+            conditions = {(None, threshold - 1): 'same', (threshold, None): 'plus'}
+        changed[quotient_range] = conditions
+    return changed
+
+
+def sufficient_statistics(line_counts):
+    """
+    Reduce the counted lines to the applicants and the charge of a court, by the charge strategy in helpers.
+
+    :param line_counts: scenario.LineCounts, the counted lines.
+    :return: tuple, arrays of applicants, charge minutes of a court and numbers of the distinct pairs of them.
+    :raise: ValueError or AssertionError.
+    """
+    numpy = core.import_numpy()
+    weekdays, starts, ends, applicants, counts = line_counts.arrays()
+    if not len(counts):
+        return applicants, applicants, counts
+    court_charges = core.batch_court_charges(scenario.Scenario(scenario.BASELINE_NAME, {}).compile(),
+                                             weekdays, starts, ends)
+    pairs, inverse = numpy.unique(numpy.column_stack((applicants, court_charges)), axis=0, return_inverse=True)
+    pair_counts = numpy.zeros(len(pairs), dtype=numpy.int64)
+    numpy.add.at(pair_counts, inverse, counts)
+    return pairs[:, 0], pairs[:, 1], pair_counts
+
+
+def search(line_counts, fees, applicants_per_courts, thresholds=None, max_fee=None):
+    """
+    Score every candidate of the grid on the counted lines.
+
+    :param line_counts: scenario.LineCounts, the counted lines.
+    :param fees: iterable, candidates of INCOMES_PER_APPLICANT.
+    :param applicants_per_courts: iterable, candidates of APPLICANTS_PER_COURT.
+    :param thresholds: iterable, candidates of the threshold by split_oder_strategy, None means not changing
+                       ODER_STRATEGY.
+    :param max_fee: int, the fees above it are not searched, None means no limit.
+    :return: tuple, formed by the list of Candidate in descending order of profit and numbers of the candidates
+             skipped as the oder strategy can not be compiled or can not resolve some applicants.
+
+    Usage::
+        >>> line_counts = scenario.LineCounts()
+        >>> for line in ('2016-06-02 20:00~22:00 7', '2016-06-04 09:00~12:00 14', '2016-06-06 19:00~21:00 4'):
+        ...     line_counts.add(core.parse_line(line, True), 0, 0, 0)
+        >>> candidates, infeasible = search(line_counts, [30, 40], [5, 6], max_fee=35)
+        >>> candidates[0], infeasible
+        (Candidate(fee=30, applicants_per_court=6, threshold=None, income=750, payment=620, profit=130), 0)
+    """
+    numpy = core.import_numpy()
+    fees = [fee for fee in fees if max_fee is None or fee <= max_fee]
+    applicants, court_charges, counts = sufficient_statistics(line_counts)
+    candidates = list()
+    infeasible = 0
+    for applicants_per_court in applicants_per_courts:
+        for threshold in thresholds or (None,):
+            oder_strategy = helpers.ODER_STRATEGY
+            if threshold is not None:
+                oder_strategy = split_oder_strategy(oder_strategy, threshold)
+            try:
+                courts_table = helpers.CourtsTable(oder_strategy, applicants_per_court, helpers.COURTS_TABLE_SIZE)
+                numbers_courts = core.batch_courts(applicants, core.batch_courts_tables(courts_table))
+            except (AttributeError, ValueError):
+                infeasible += len(fees)
+                continue
+            # the income is the fee times the applicants of the lines ordering courts
+            booked = int(numpy.dot(applicants * (numbers_courts > 0), counts))
+            payment = money(int(numpy.dot(court_charges * numbers_courts, counts)))
+            for fee in fees:
+                candidates.append(Candidate(fee, applicants_per_court, threshold, fee * booked, payment,
+                                            fee * booked - payment))
+    candidates.sort(key=lambda candidate: (-candidate.profit, candidate.fee, candidate.applicants_per_court,
+                                           candidate.threshold))
+    return candidates, infeasible
+
+
+def _format_row(label, candidate):
+    threshold = '-' if candidate.threshold is None else candidate.threshold
+    return _ROW_FORMAT % (label, candidate.fee, candidate.applicants_per_court, threshold,
+                          format_amount(candidate.income), format_amount(candidate.payment),
+                          format_amount(candidate.profit))
+
+
+def report(line_counts, fees, applicants_per_courts, thresholds=None, max_fee=None, top=10):
+    """
+    Generate the report of the best candidates, after the strategies in use.
+
+    :param line_counts: scenario.LineCounts, the counted lines.
+    :param fees: iterable, candidates of INCOMES_PER_APPLICANT.
+    :param applicants_per_courts: iterable, candidates of APPLICANTS_PER_COURT.
+    :param thresholds: iterable, candidates of the threshold by split_oder_strategy, None means not changing
+                       ODER_STRATEGY.
+    :param max_fee: int, the fees above it are not searched, None means no limit.
+    :param top: int, numbers of the best candidates in the report.
+    :return: list, output strings.
+    """
+    baseline = search(line_counts, [helpers.INCOMES_PER_APPLICANT], [helpers.APPLICANTS_PER_COURT])[0][0]
+    candidates, infeasible = search(line_counts, fees, applicants_per_courts, thresholds, max_fee)
+    output_list = ['[Optimizer]', '',
+                   _ROW_FORMAT % ('rank', 'fee', 'per court', 'threshold', 'income', 'payment', 'profit'),
+                   _format_row(scenario.BASELINE_NAME, baseline)]
+    for rank, candidate in enumerate(candidates[:top], 1):
+        output_list.append(_format_row(rank, candidate))
+    output_list.append('')
+    output_list.append('Candidates: %d' % len(candidates))
+    if infeasible:
+        output_list.append('Infeasible: %d' % infeasible)
+    return output_list
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+A module calculate the summary of a large input file, or many input files, by multiple processes.
+'''
+
+import copy
+import os
+from itertools import islice, izip
+from multiprocessing import Pool
+
+import core
+import streams
+from rollup import format_group
+
+# the target size of the bytes in a chunk, a chunk is the unit of work of a process
+CHUNK_BYTES = 16 * 1024 * 1024
+
+# numbers of the lines of a compressed file calculated together, the file is calculated in this process batch by
+# batch while the next lines are decompressed, so the memory does not grow with the file
+STREAM_BATCH_LINES = 64 * 1024
+
+
+def file_chunks(file_path, chunk_count):
+    """
+    Split a file to byte ranges, each range starts at the beginning of a line and ends after a line.
+    A compressed file can not be read from the middle, so it is a single range.
+
+    :param file_path: str, path of the file.
+    :param chunk_count: int, the numbers of ranges wanted, empty ranges are dropped.
+    :return: list, items are tuple formed by the start and end offset.
+    """
+    size = os.path.getsize(file_path)
+    if streams.detect_compression(file_path) is not None:
+        return [(0, size)] if size else []
+    offsets = [0]
+    with open(file_path, 'rb') as f:
+        for i in range(1, chunk_count):
+            target = size * i // chunk_count
+            if target <= offsets[-1]:
+                continue
+            # move to the beginning of the next line
+            f.seek(target - 1)
+            f.readline()
+            offsets.append(min(f.tell(), size))
+    offsets.append(size)
+    return [(start, end) for start, end in zip(offsets[:-1], offsets[1:]) if start < end]
+
+
+def _summarize_chunk(args):
+    """
+    Help function to calculate a chunk of the file in a worker process.
+
+    :param args: tuple, formed by file path, start offset, end offset, is_check, chunk_size, empty collectors
+                 and if quarantining the invalid lines.
+    :return: tuple, formed by the list of output strings, the tuple of total income, payment and profit,
+             the collectors of the chunk, numbers of lines of the chunk and the streams.Quarantine of the chunk,
+             the line numbers in the quarantine start from 1 in each chunk.
+    """
+    file_path, start, end, is_check, chunk_size, collectors, is_quarantine = args
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        # only split by the line separator, like reading the file by lines
+        lines = f.read(end - start).split('\n')
+    if not lines[-1]:
+        lines.pop()
+    return _summarize_lines(lines, is_check, chunk_size, collectors, is_quarantine)
+
+
+def _summarize_lines(lines, is_check, chunk_size, collectors, is_quarantine):
+    """
+    Help function to calculate the lines of a chunk, the result is like _summarize_chunk.
+    """
+    output_list = list()
+    total_income, total_payment, total_profit = 0, 0, 0
+    quarantine = streams.Quarantine() if is_quarantine else None
+    if quarantine is not None:
+        bookings = quarantine.parse_lines(lines, is_check)
+    else:
+        bookings = (core.parse_line(line, is_check) for line in lines)
+    for booking, inc, pay, pro, result_str in core.info_results(bookings, chunk_size):
+        total_income += inc
+        total_payment += pay
+        total_profit += pro
+        for collector in collectors:
+            collector.add(booking, inc, pay, pro)
+        output_list.append(booking.time + result_str)
+    return output_list, (total_income, total_payment, total_profit), collectors, len(lines), quarantine
+
+
+def _summarize_stream(args, compression_mode):
+    """
+    Help function to calculate a compressed file in this process, batch by batch of STREAM_BATCH_LINES.
+
+    :param args: tuple, the same as _summarize_chunk, the offsets are not used.
+    :param compression_mode: str, in streams.COMPRESSION_MODES.
+    :return: generator, results like _summarize_chunk of each batch, the collectors are in the last result,
+             which has no lines.
+    """
+    file_path, _, _, is_check, chunk_size, collectors, is_quarantine = args
+    lines = streams.read_compressed_lines(file_path, streams.detect_compression(file_path), compression_mode)
+    while True:
+        batch = list(islice(lines, STREAM_BATCH_LINES))
+        if not batch:
+            break
+        output_list, totals, collectors, line_count, quarantine = _summarize_lines(batch, is_check, chunk_size,
+                                                                                   collectors, is_quarantine)
+        yield output_list, totals, (), line_count, quarantine
+    yield list(), (0, 0, 0), collectors, 0, streams.Quarantine() if is_quarantine else None
+
+
+def summary_parallel(file_path, workers, is_check, chunk_size=None, collectors=(), quarantine=None,
+                     compression_mode='thread'):
+    """
+    Calculate the summary of a file by a pool of processes.
+    The output strings are in the same order as the serial calculation.
+
+    :param file_path: str, path of the input file.
+    :param workers: int, numbers of processes.
+    :param is_check: bool, if check the input each line.
+    :param chunk_size: int, numbers of lines calculated together by core.info_batch, None or 0 for line by line.
+    :param collectors: iterable, objects collecting each line by add(booking, income, payment, profit),
+                       they are copied to the processes and merged back by merge(other).
+    :param quarantine: streams.Quarantine, collecting the invalid lines instead of raising, None if not quarantining.
+    :param compression_mode: str, in streams.COMPRESSION_MODES, a compressed file is calculated in this process.
+    :return: generator, output strings with total information.
+    """
+    chunk_count = max(workers, os.path.getsize(file_path) // CHUNK_BYTES + 1)
+    # the copies sent to the processes are never changed, while the collectors are merging the results
+    empty_collectors = copy.deepcopy(list(collectors))
+    tasks = [(file_path, start, end, is_check, chunk_size, empty_collectors, quarantine is not None)
+             for start, end in file_chunks(file_path, chunk_count)]
+    for line in core.SUMMARY_TITLE:
+        yield line
+    totals = [0, 0, 0]
+    line_count = 0
+    for chunk_results in _imap_chunks(tasks, workers, compression_mode):
+        for output_list, chunk_totals, chunk_collectors, chunk_lines, chunk_quarantine in chunk_results:
+            for line in output_list:
+                yield line
+            totals = [total + chunk_total for total, chunk_total in zip(totals, chunk_totals)]
+            for collector, chunk_collector in zip(collectors, chunk_collectors):
+                collector.merge(chunk_collector)
+            if quarantine is not None:
+                for line_number, line, reason in chunk_quarantine.entries:
+                    quarantine.reject(line_count + line_number, line, reason)
+            line_count += chunk_lines
+    rejected = quarantine.rejected if quarantine is not None else None
+    for line in core.summary_footer(*(totals + [rejected])):
+        yield line
+
+
+def summary_files(file_paths, workers, is_check, chunk_size=None, collectors=(), quarantine=None,
+                  compression_mode='thread'):
+    """
+    Calculate the summary of many files by a pool of processes, the files are split to chunks like summary_parallel.
+    The lines of each file are followed by its subtotal, the files are in the order of the paths and the footer
+    has the totals of all files, whichever process finishes first.
+
+    :param file_paths: list, paths of the input files.
+    :param workers: int, numbers of processes, 1 means calculating in this process.
+    :param is_check: bool, if check the input each line.
+    :param chunk_size: int, numbers of lines calculated together by core.info_batch, None or 0 for line by line.
+    :param collectors: iterable, objects collecting each line by add(booking, income, payment, profit),
+                       they are copied to the processes and merged back by merge(other).
+    :param quarantine: streams.Quarantine, collecting the invalid lines instead of raising, None if not quarantining,
+                       the line numbers are like 'path:number'.
+    :param compression_mode: str, in streams.COMPRESSION_MODES, the compressed files are calculated in this process.
+    :return: generator, output strings with subtotal and total information.
+    """
+    # the files share the processes, a large file is still split to chunks of CHUNK_BYTES
+    chunks_per_file = -(-workers // len(file_paths)) if file_paths else 1
+    empty_collectors = copy.deepcopy(list(collectors))
+    tasks = list()
+    file_tasks = list()
+    for file_path in file_paths:
+        chunks = file_chunks(file_path, max(chunks_per_file, os.path.getsize(file_path) // CHUNK_BYTES + 1))
+        tasks.extend((file_path, start, end, is_check, chunk_size, empty_collectors, quarantine is not None)
+                     for start, end in chunks)
+        file_tasks.append(len(chunks))
+    for line in core.SUMMARY_TITLE:
+        yield line
+    totals = [0, 0, 0]
+    chunk_results = _imap_chunks(tasks, workers, compression_mode)
+    for i, (file_path, task_count) in enumerate(izip(file_paths, file_tasks)):
+        if i:
+            yield ''
+        yield '[File %s]' % file_path
+        subtotals = [0, 0, 0]
+        line_count = 0
+        for _ in xrange(task_count):
+            for output_list, chunk_totals, chunk_collectors, chunk_lines, chunk_quarantine in next(chunk_results):
+                for line in output_list:
+                    yield line
+                subtotals = [subtotal + chunk_total for subtotal, chunk_total in zip(subtotals, chunk_totals)]
+                for collector, chunk_collector in zip(collectors, chunk_collectors):
+                    collector.merge(chunk_collector)
+                if quarantine is not None:
+                    for line_number, line, reason in chunk_quarantine.entries:
+                        quarantine.reject('%s:%d' % (file_path, line_count + line_number), line, reason)
+                line_count += chunk_lines
+        yield format_group('Subtotal:', *subtotals)
+        totals = [total + subtotal for total, subtotal in zip(totals, subtotals)]
+    rejected = quarantine.rejected if quarantine is not None else None
+    for line in core.summary_footer(*(totals + [rejected])):
+        yield line
+
+
+def _copy_collectors(task):
+    """
+    Help function to copy the empty collectors of a task calculated in this process, they are shared by the tasks,
+    while a process gets its own copy by pickling.
+    """
+    return task[:5] + (copy.deepcopy(task[5]),) + task[6:]
+
+
+def _imap_chunks(tasks, workers, compression_mode='thread'):
+    """
+    Help function to calculate the chunks, the results are in the order of the tasks.
+    The compressed files can not be split, so they are calculated in this process by _summarize_stream,
+    while the pool is calculating the other chunks.
+
+    :param tasks: list, arguments of _summarize_chunk.
+    :param workers: int, numbers of processes, 1 means calculating in this process.
+    :param compression_mode: str, in streams.COMPRESSION_MODES.
+    :return: generator, iterables of the results of each task, like _summarize_chunk.
+    """
+    is_streams = [streams.detect_compression(task[0]) is not None for task in tasks]
+    chunk_tasks = [task for task, is_stream in izip(tasks, is_streams) if not is_stream]
+    pool = None
+    if workers <= 1 or not chunk_tasks:
+        chunk_results = (_summarize_chunk(_copy_collectors(task)) for task in chunk_tasks)
+    else:
+        pool = Pool(workers)
+        # imap keeps the order of the tasks
+        chunk_results = pool.imap(_summarize_chunk, chunk_tasks)
+    try:
+        for task, is_stream in izip(tasks, is_streams):
+            if is_stream:
+                yield _summarize_stream(_copy_collectors(task), compression_mode)
+            else:
+                yield (next(chunk_results),)
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
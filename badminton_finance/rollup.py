@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+A module rolling up the income, payment and profit by day, ISO week, month, weekday and charge band.
+The rollups are collectors of core.generate_summary, so all of them are calculated in the same pass.
+'''
+
+import datetime
+
+import core
+from helpers import WEEK_STRS, format_amount, money
+
+# granularities of the rollups
+GRANULARITIES = ('day', 'week', 'month', 'weekday', 'band')
+
+
+def _day_key(booking):
+    return booking.date
+
+
+def _day_label(key):
+    return datetime.date.fromordinal(key).isoformat()
+
+
+def _week_key(booking):
+    # ordinal of the monday of the week
+    return booking.date - (booking.date + 6) % 7
+
+
+def _week_label(key):
+    iso_year, iso_week, _ = datetime.date.fromordinal(key).isocalendar()
+    return '%d-W%02d' % (iso_year, iso_week)
+
+
+def _month_key(booking):
+    date = datetime.date.fromordinal(booking.date)
+    return date.year, date.month
+
+
+def _month_label(key):
+    return '%d-%02d' % key
+
+
+def _weekday_key(booking):
+    return (booking.date + 6) % 7
+
+
+def _weekday_label(key):
+    return WEEK_STRS[key]
+
+
+# key and label functions of the granularities except band
+_GROUP_FUNCS = {
+    'day': (_day_key, _day_label),
+    'week': (_week_key, _week_label),
+    'month': (_month_key, _month_label),
+    'weekday': (_weekday_key, _weekday_label),
+}
+
+
+def format_group(label, inc, pay, pro):
+    """
+    Format the totals of a group in the same way as a line of the summary.
+
+    :param label: str, label of the group.
+    :param inc: int or fractions.Fraction, total income.
+    :param pay: int or fractions.Fraction, total payment.
+    :param pro: int or fractions.Fraction, total profit.
+    :return: str, output string.
+
+    Usage::
+        >>> format_group('2016-06', 630, 420, 210)
+        '2016-06 +630 -420 +210'
+    """
+    return '%s +%s -%s %s' % (label, format_amount(inc), format_amount(pay), format_amount(pro, is_sign=pro != 0))
+
+
+def _split_amount(amount, minutes):
+    """
+    Help function to divide an amount by the minutes exactly, like helpers.money.
+    """
+    if amount % minutes == 0:
+        return amount // minutes
+    from fractions import Fraction
+    return Fraction(amount, minutes)
+
+
+class Rollup(object):
+    """
+    Totals of income, payment and profit grouped by a granularity.
+
+    Usage::
+        >>> rollup = Rollup('weekday')
+        >>> for line in ['2016-06-02 20:00~22:00 7', '2016-06-09 16:00~18:00 16']:
+        ...     info = core.info_single(line)
+        ...     rollup.add(core.parse_line(line), info['income'], info['payment'], info['profit'])
+        >>> rollup.report()
+        ['[Rollup by weekday]', '', 'Thu +690 -540 +150']
+    """
+
+    def __init__(self, granularity):
+        """
+        :param granularity: str, one of GRANULARITIES except band.
+        """
+        self.granularity = granularity
+        # keys are the groups, values are list of total income, payment and profit
+        self.groups = dict()
+
+    def _add_group(self, key, inc, pay, pro):
+        totals = self.groups.get(key)
+        if totals is None:
+            self.groups[key] = [inc, pay, pro]
+        else:
+            totals[0] += inc
+            totals[1] += pay
+            totals[2] += pro
+
+    def add(self, booking, inc, pay, pro):
+        """
+        Add the result of a line to its group.
+
+        :param booking: core.Booking, the parsed line.
+        :param inc: int, income of the line.
+        :param pay: int, payment of the line.
+        :param pro: int, profit of the line.
+        """
+        self._add_group(_GROUP_FUNCS[self.granularity][0](booking), inc, pay, pro)
+
+    def merge(self, other):
+        """
+        Merge the groups of another rollup with the same granularity.
+
+        :param other: Rollup.
+        """
+        for key, totals in other.groups.iteritems():
+            self._add_group(key, *totals)
+
+    def _label(self, key):
+        return _GROUP_FUNCS[self.granularity][1](key)
+
+    def report(self):
+        """
+        Generate the report of the rollup, the groups are in order.
+
+        :return: list, output strings.
+        """
+        output_list = ['[Rollup by %s]' % self.granularity, '']
+        for key in sorted(self.groups):
+            output_list.append(format_group(self._label(key), *self.groups[key]))
+        return output_list
+
+
+class BandRollup(Rollup):
+    """
+    Totals grouped by the bands of CHARGE_STRATEGY, a line crossing bands is split to the bands.
+    The payment of each band is exact, and the income is split exactly by the minutes in each band,
+    so the bands add up to the totals of the summary.
+    Each line is folded into the integer totals of its bands when it is added, the income of a band is kept by the
+    minutes of the lines, so the memory only grows with the bands and the lengths of the lines, and the fractions
+    are only calculated for the report.
+
+    Usage::
+        >>> rollup = BandRollup()
+        >>> line = '2016-06-03 10:00~13:00 14'
+        >>> info = core.info_single(line)
+        >>> rollup.add(core.parse_line(line), info['income'], info['payment'], info['profit'])
+        >>> rollup.report()[2:]
+        ['Mon,Tue,Wed,Thu,Fri 09:00~12:00 +280 -120 +160', 'Mon,Tue,Wed,Thu,Fri 12:00~18:00 +140 -100 +40']
+    """
+
+    def __init__(self):
+        # the groups are calculated from the parts, so they are not set by Rollup
+        self.granularity = 'band'
+        # keys are the bands formed by week group, start and end, values are list of the incomes times the minutes
+        # in the band keyed by the minutes of the lines, and the payment in charge minutes
+        self.parts = dict()
+
+    @property
+    def groups(self):
+        """
+        Totals of the bands, calculated from the parts.
+        """
+        groups = dict()
+        for key, (incomes, charge_minutes) in self.parts.iteritems():
+            inc = sum(_split_amount(amount, minutes) for minutes, amount in incomes.iteritems())
+            pay = money(charge_minutes)
+            groups[key] = [inc, pay, inc - pay]
+        return groups
+
+    def add(self, booking, inc, pay, pro):
+        """
+        Split the result of a line to the bands it crosses, the arguments are the same as Rollup.add.
+        """
+        # the strategies are refreshed by the summary
+        charge_table = core._charge_table_of_date(booking.date)
+        start, end = booking.start, booking.end
+        numbers_courts = core._courts(booking.applicants)
+        parts = self.parts
+        for start_k, end_k, charge in charge_table.bands:
+            band_minutes = min(end, end_k) - max(start, start_k)
+            if band_minutes > 0:
+                key = (charge_table.week, start_k, end_k)
+                part = parts.get(key)
+                if part is None:
+                    part = parts[key] = [dict(), 0]
+                incomes = part[0]
+                incomes[end - start] = incomes.get(end - start, 0) + inc * band_minutes
+                part[1] += band_minutes * charge * numbers_courts
+
+    def merge(self, other):
+        """
+        Merge the parts of another band rollup.
+
+        :param other: BandRollup.
+        """
+        for key, (incomes, charge_minutes) in other.parts.iteritems():
+            part = self.parts.setdefault(key, [dict(), 0])
+            for minutes, amount in incomes.iteritems():
+                part[0][minutes] = part[0].get(minutes, 0) + amount
+            part[1] += charge_minutes
+
+    def report(self):
+        """
+        Generate the report of the rollup, the bands are in order of the week group and the start.
+
+        :return: list, output strings.
+        """
+        output_list = ['[Rollup by %s]' % self.granularity, '']
+        groups = self.groups
+        # in order of the first day of the week group and the start minute
+        for key in sorted(groups, key=lambda k: (WEEK_STRS.index(k[0][0]), k[1])):
+            week, start_k, end_k = key
+            label = '%s %02d:%02d~%02d:%02d' % (','.join(week), start_k // 60, start_k % 60, end_k // 60, end_k % 60)
+            output_list.append(format_group(label, *groups[key]))
+        return output_list
+
+
+def create_rollups(granularities):
+    """
+    Create the rollups of the granularities.
+
+    :param granularities: iterable, items are in GRANULARITIES.
+    :return: list, Rollup.
+    :raise: ValueError.
+    """
+    rollups = list()
+    for granularity in granularities:
+        if granularity == 'band':
+            rollups.append(BandRollup())
+        elif granularity in _GROUP_FUNCS:
+            rollups.append(Rollup(granularity))
+        else:
+            raise ValueError('Can not resolve the granularity. %s' % granularity)
+    return rollups
+
+
+def rollup_report(rollups):
+    """
+    Generate the report of the rollups, each of them is a section.
+
+    :param rollups: iterable, Rollup.
+    :return: generator, output strings, sections are separated by an empty string.
+    """
+    for i, rollup in enumerate(rollups):
+        if i:
+            yield ''
+        for line in rollup.report():
+            yield line
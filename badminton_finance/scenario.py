@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+A module evaluating alternative strategies on the same input, like a higher evening charge or another income.
+The lines are counted by weekday, time and applicants when they are read, as a collector of core.generate_summary,
+so every scenario is evaluated on the distinct lines by numpy without reading the input again.
+'''
+
+import core
+import helpers
+from helpers import format_amount, money
+
+# names of the strategies a scenario can override
+SCENARIO_KEYS = ('INCOMES_PER_APPLICANT', 'APPLICANTS_PER_COURT', 'ODER_STRATEGY', 'CHARGE_STRATEGY')
+
+# name of the scenario of the strategies in use, it is the first row of the report
+BASELINE_NAME = 'baseline'
+
+# format of a row of the report
+_ROW_FORMAT = '%-20s %12s %12s %12s %12s'
+
+
+def merge_charge_strategy(charge_strategy, overrides):
+    """
+    Merge the charges of a scenario to a charge strategy, the other charges of the strategy are kept.
+
+    :param charge_strategy: dict, charge strategy like helpers.CHARGE_STRATEGY.
+    :param overrides: dict, the same form as charge_strategy, the charges of a week group replace the ones
+                      of the hours they cover, the hours not covered keep their charges, a new week group is added,
+                      so it can not have the days of another week group, Scenario.compile rejects that.
+    :return: dict, the merged charge strategy.
+
+    Usage::
+        >>> merged = merge_charge_strategy(helpers.CHARGE_STRATEGY,
+        ...                                {('Mon', 'Tue', 'Wed', 'Thu', 'Fri'): {('20:00', '22:00'): 70}})
+        >>> merged[('Mon', 'Tue', 'Wed', 'Thu', 'Fri')][('20:00', '22:00')]
+        70
+        >>> merged[('Mon', 'Tue', 'Wed', 'Thu', 'Fri')][('18:00', '20:00')]
+        80
+        >>> merged = merge_charge_strategy(helpers.CHARGE_STRATEGY,
+        ...                                {('Mon', 'Tue', 'Wed', 'Thu', 'Fri'): {('19:00', '21:00'): 100}})
+        >>> sorted(merged[('Mon', 'Tue', 'Wed', 'Thu', 'Fri')].items())[2:]
+        [(('18:00', '19:00'), 80), (('19:00', '21:00'), 100), (('21:00', '22:00'), 60)]
+    """
+    merged = dict((week, dict(strategy)) for week, strategy in charge_strategy.iteritems())
+    for week, strategy in overrides.iteritems():
+        merged_strategy = merged.setdefault(week, dict())
+        for (start_str, end_str), charge in strategy.iteritems():
+            start, end = helpers.convert_time_str_minute(start_str), helpers.convert_time_str_minute(end_str)
+            # the charges covered by the override are cut, the parts before and after it are kept
+            for band_start_str, band_end_str in merged_strategy.keys():
+                band_start = helpers.convert_time_str_minute(band_start_str)
+                band_end = helpers.convert_time_str_minute(band_end_str)
+                if band_start < end and start < band_end:
+                    band_charge = merged_strategy.pop((band_start_str, band_end_str))
+                    if band_start < start:
+                        merged_strategy[(band_start_str, start_str)] = band_charge
+                    if end < band_end:
+                        merged_strategy[(end_str, band_end_str)] = band_charge
+            merged_strategy[(start_str, end_str)] = charge
+    return merged
+
+
+class Scenario(object):
+    """
+    Strategies of a scenario, the ones not overridden are the strategies in helpers.
+
+    Usage::
+        >>> scenario = Scenario('income 35', {'INCOMES_PER_APPLICANT': 35})
+        >>> scenario.incomes_per_applicant, scenario.applicants_per_court
+        (35, 6)
+    """
+
+    def __init__(self, name, overrides):
+        """
+        :param name: str, name of the scenario in the report.
+        :param overrides: dict, strategies keyed by SCENARIO_KEYS, CHARGE_STRATEGY is merged by
+                          merge_charge_strategy.
+        :raise: ValueError, if a key is not in SCENARIO_KEYS.
+        """
+        for key in overrides:
+            if key not in SCENARIO_KEYS:
+                raise ValueError('Can not override %s in the scenario %s.' % (key, name))
+        self.name = name
+        self.incomes_per_applicant = overrides.get('INCOMES_PER_APPLICANT', helpers.INCOMES_PER_APPLICANT)
+        self.applicants_per_court = overrides.get('APPLICANTS_PER_COURT', helpers.APPLICANTS_PER_COURT)
+        self.oder_strategy = overrides.get('ODER_STRATEGY', helpers.ODER_STRATEGY)
+        self.charge_strategy = merge_charge_strategy(helpers.CHARGE_STRATEGY, overrides.get('CHARGE_STRATEGY', {}))
+
+    def compile(self):
+        """
+        Check the strategies and compile them to numpy arrays.
+
+        :return: dict, the arrays compiled by core.batch_tables.
+        :raise: AssertionError, if the strategies are illegal.
+        """
+        assert_msg = 'Config in the scenario %s is illegal.' % self.name
+        assert isinstance(self.incomes_per_applicant, int) and self.incomes_per_applicant >= 0, assert_msg
+        assert isinstance(self.applicants_per_court, int) and self.applicants_per_court > 0, assert_msg
+        helpers.check_charge_strategy(self.charge_strategy)
+        courts_table = helpers.CourtsTable(self.oder_strategy, self.applicants_per_court, helpers.COURTS_TABLE_SIZE)
+        charge_tables = helpers.compile_charge_strategy(self.charge_strategy)
+        return core.batch_tables(courts_table, [charge_tables.get(week_str) for week_str in helpers.WEEK_STRS])
+
+
+def load_scenarios(file_path):
+    """
+    Load the scenarios from a Python file, which defines SCENARIOS as a list of (name, overrides).
+
+    :param file_path: str, path of the file.
+    :return: list, Scenario in the order of the file.
+    :raise: ValueError, if SCENARIOS is not defined or a scenario is illegal.
+    """
+    namespace = dict()
+    execfile(file_path, namespace)
+    if 'SCENARIOS' not in namespace:
+        raise ValueError('Can not find SCENARIOS in %s.' % file_path)
+    return [Scenario(name, overrides) for name, overrides in namespace['SCENARIOS']]
+
+
+class LineCounts(object):
+    """
+    Collector counting the distinct lines by weekday number, start, end and applicants.
+    The counts are all needed to calculate the totals of any strategies.
+    """
+
+    def __init__(self):
+        # numbers of the lines keyed by weekday number, start, end and applicants
+        self.counts = dict()
+
+    def add(self, booking, inc, pay, pro):
+        _, date, start, end, applicants = booking
+        key = ((date + 6) % 7, start, end, applicants)
+        counts = self.counts
+        counts[key] = counts.get(key, 0) + 1
+
+    def merge(self, other):
+        """
+        Merge the counts of another collector.
+
+        :param other: LineCounts.
+        """
+        for key, count in other.counts.iteritems():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def arrays(self):
+        """
+        Convert the counts to numpy arrays, numpy is required.
+
+        :return: tuple, arrays of weekday number, start, end, applicants and numbers of the distinct lines.
+        :raise: ImportError.
+        """
+        numpy = core.import_numpy()
+        keys = numpy.array(self.counts.keys(), dtype=numpy.int64).reshape(-1, 4)
+        weekdays, starts, ends, applicants = keys.T
+        return weekdays, starts, ends, applicants, numpy.array(self.counts.values(), dtype=numpy.int64)
+
+
+class ScenarioCollector(LineCounts):
+    """
+    Collector counting the distinct lines, the scenarios are evaluated on the counts by evaluate.
+
+    Usage::
+        >>> collector = ScenarioCollector([Scenario('income 35', {'INCOMES_PER_APPLICANT': 35})])
+        >>> for line in ('2016-06-02 20:00~22:00 7', '2016-06-02 20:00~22:00 7', '2016-06-04 09:00~12:00 14'):
+        ...     collector.add(core.parse_line(line, True), 0, 0, 0)
+        >>> [(scenario.name, totals) for scenario, totals in collector.evaluate()]
+        [('baseline', (3, 840, 720, 120)), ('income 35', (3, 980, 720, 260))]
+    """
+
+    def __init__(self, scenarios):
+        """
+        :param scenarios: list, Scenario evaluated after the baseline.
+        """
+        super(ScenarioCollector, self).__init__()
+        self.scenarios = [Scenario(BASELINE_NAME, {})] + list(scenarios)
+
+    def evaluate(self):
+        """
+        Evaluate the scenarios on the counted lines.
+
+        :return: list, tuples formed by Scenario and its totals of lines, income, payment and profit.
+        :raise: AttributeError, ValueError or AssertionError, with the name of the scenario.
+        """
+        lines = sum(self.counts.itervalues())
+        if not self.counts:
+            return [(scenario, (0, 0, 0, 0)) for scenario in self.scenarios]
+        numpy = core.import_numpy()
+        weekdays, starts, ends, applicants, counts = self.arrays()
+        results = list()
+        for scenario in self.scenarios:
+            try:
+                inc, charge_minutes = core.batch_charges(scenario.compile(), scenario.incomes_per_applicant,
+                                                         weekdays, starts, ends, applicants)
+            except (AttributeError, ValueError, AssertionError), e:
+                raise e.__class__('%s: %s' % (scenario.name, e))
+            total_income = int(numpy.dot(inc, counts))
+            total_payment = money(int(numpy.dot(charge_minutes, counts)))
+            results.append((scenario, (lines, total_income, total_payment, total_income - total_payment)))
+        return results
+
+    def report(self):
+        """
+        Generate the comparison table of the scenarios, the last column is the profit compared to the baseline.
+
+        :return: list, output strings.
+        """
+        output_list = ['[Scenarios]', '', _ROW_FORMAT % ('scenario', 'income', 'payment', 'profit', 'vs baseline')]
+        results = self.evaluate()
+        baseline_profit = results[0][1][3]
+        for scenario, (_, inc, pay, pro) in results:
+            delta = pro - baseline_profit
+            output_list.append(_ROW_FORMAT % (scenario.name, format_amount(inc), format_amount(pay),
+                                              format_amount(pro), format_amount(delta, is_sign=True)))
+        return output_list
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+A module of the streaming service, booking lines are sent by many clients over a TCP or Unix socket.
+Each line is answered with its result line, and the running totals of all clients are answered to TOTALS_COMMAND.
+The service runs in one process by asyncore, the lines are calculated by core.session_result.
+'''
+
+import asynchat
+import asyncore
+import errno
+import os
+import socket
+import stat
+
+import core
+
+# command of the running totals, answered with the footer of the summary and an empty line
+TOTALS_COMMAND = 'TOTALS'
+
+# command closing the connection
+QUIT_COMMAND = 'QUIT'
+
+# bytes read from a socket each time
+READ_SIZE = 64 * 1024
+
+# bytes of the longest line, the connection sending a longer one is answered with an error and closed
+MAX_LINE_SIZE = 64 * 1024
+
+
+def parse_address(address):
+    """
+    Parse the address of the service.
+
+    :param address: str, 'host:port' or ':port' for TCP, otherwise path of the Unix socket.
+    :return: tuple, formed by socket family and the address of it.
+
+    Usage::
+        >>> parse_address('127.0.0.1:8787')
+        (2, ('127.0.0.1', 8787))
+        >>> parse_address(':8787')
+        (2, ('127.0.0.1', 8787))
+        >>> parse_address('/tmp/badminton.sock')
+        (1, '/tmp/badminton.sock')
+    """
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and '/' not in address:
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    return socket.AF_UNIX, address
+
+
+def _file_id(path):
+    """
+    Help function to get the device and inode of a Unix socket file, None if it is not a socket.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino) if stat.S_ISSOCK(st.st_mode) else None
+
+
+def remove_socket_file(path):
+    """
+    Remove the Unix socket file left by a former service, the other files are never removed.
+
+    :param path: str, path of the Unix socket.
+    :raise: socket.error, if the path is a file which is not a socket.
+    """
+    if _file_id(path) is not None:
+        os.remove(path)
+    elif os.path.lexists(path):
+        raise socket.error(errno.EADDRINUSE, 'Address in use, not a socket: %s' % path)
+
+
+class Totals(object):
+    """
+    Running totals of the lines from all clients.
+    """
+
+    def __init__(self):
+        self.lines = 0
+        self.rejected = 0
+        self.income = 0
+        self.payment = 0
+        self.profit = 0
+
+    def answer(self, line, is_check):
+        """
+        Calculate a line and add it to the totals.
+
+        :param line: str, a booking line.
+        :param is_check: bool, if check the line.
+        :return: str, the result line, or the error message starting with 'ERROR: '.
+        """
+        try:
+            booking = core.parse_line(line, is_check)
+            inc, pay, pro, result_str = core.session_result(booking)
+        except (ValueError, AssertionError, AttributeError), e:
+            return self.reject(e)
+        self.lines += 1
+        self.income += inc
+        self.payment += pay
+        self.profit += pro
+        return booking.time + result_str
+
+    def reject(self, reason):
+        """
+        Count a rejected line.
+
+        :param reason: Exception or str, why the line is rejected.
+        :return: str, the error message starting with 'ERROR: '.
+        """
+        self.rejected += 1
+        return 'ERROR: ' + str(reason)
+
+    def footer(self):
+        """
+        Footer of the summary of the totals.
+
+        :return: list, output strings of the footer.
+        """
+        return core.summary_footer(self.income, self.payment, self.profit, self.rejected)[1:]
+
+
+class BookingChannel(asynchat.async_chat):
+    """
+    Connection of a client, the answers of all complete lines in a read are sent together.
+    """
+
+    def __init__(self, sock, server):
+        """
+        :param sock: socket, the accepted connection.
+        :param server: BookingServer, the service.
+        """
+        asynchat.async_chat.__init__(self, sock, server.socket_map)
+        self.server = server
+        self.line_buffer = ''
+        # the strategies are refreshed once for each connection, not for each line
+        core.refresh_strategies()
+
+    def handle_read(self):
+        """
+        Answer the complete lines read, the incomplete one is kept to the next read unless it is too long.
+        """
+        try:
+            data = self.recv(READ_SIZE)
+        except socket.error:
+            self.handle_error()
+            return
+        if not data:
+            return
+        lines = (self.line_buffer + data).split('\n')
+        self.line_buffer = lines.pop()
+        answers = list()
+        is_quit = False
+        for line in lines:
+            command = line.strip()
+            if not command:
+                continue
+            if command == TOTALS_COMMAND:
+                answers.extend(self.server.totals.footer())
+                answers.append('')
+            elif command == QUIT_COMMAND:
+                is_quit = True
+                break
+            else:
+                answers.append(self.server.totals.answer(line, self.server.is_check))
+        if not is_quit and len(self.line_buffer) > MAX_LINE_SIZE:
+            self.line_buffer = ''
+            answers.append(self.server.totals.reject('Line is longer than %d bytes.' % MAX_LINE_SIZE))
+            is_quit = True
+        if answers:
+            self.push('\n'.join(answers) + '\n')
+        if is_quit:
+            self.close_when_done()
+
+    def handle_close(self):
+        self.close()
+
+
+class BookingServer(asyncore.dispatcher):
+    """
+    Listening socket of the service.
+    """
+
+    def __init__(self, address, is_check):
+        """
+        :param address: str, address parsed by parse_address.
+        :param is_check: bool, if check the lines.
+        :raise: socket.error, if the address is in use or the path is not a socket.
+        """
+        self.socket_map = dict()
+        asyncore.dispatcher.__init__(self, map=self.socket_map)
+        self.is_check = is_check
+        self.totals = Totals()
+        family, self.address = parse_address(address)
+        # identity of the Unix socket file this server created, only it is removed when closing
+        self.socket_file_id = None
+        if family == socket.AF_UNIX:
+            remove_socket_file(self.address)
+        self.create_socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_UNIX:
+            self.bind(self.address)
+            self.socket_file_id = _file_id(self.address)
+        else:
+            self.set_reuse_addr()
+            self.bind(self.address)
+        self.listen(128)
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            BookingChannel(pair[0], self)
+
+    def serve(self, count=None):
+        """
+        Run the service until it is interrupted.
+
+        :param count: int, numbers of the polls, None means forever.
+        """
+        try:
+            asyncore.loop(timeout=1, use_poll=True, map=self.socket_map, count=count)
+        finally:
+            if count is None:
+                self.close_all()
+
+    def close_all(self):
+        """
+        Close the listening socket and all connections.
+        """
+        asyncore.close_all(self.socket_map)
+        if self.socket_file_id is not None and _file_id(self.address) == self.socket_file_id:
+            os.remove(self.address)
+        self.socket_file_id = None
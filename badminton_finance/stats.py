@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+A module of the instrumentation of the pipeline stages.
+The functions of the stages are wrapped only when the instrumentation is enabled,
+so there is no overhead at all when it is disabled.
+'''
+
+import collections
+import json
+import signal
+import sys
+import time
+
+import core
+import helpers
+import streams
+
+# stages of the pipeline
+STAGES = ('read', 'validation', 'parse', 'courts', 'tariff', 'batch', 'format', 'write')
+
+
+def _stage_targets():
+    """
+    Help function to list the functions of the stages.
+
+    :return: list, items are tuple formed by stage, owner object and attribute name.
+             The stage of the parse functions is None, it is validation or parse by the is_check argument,
+             and the position of the argument is the fourth item.
+    """
+    return [
+        (None, core, 'parse_line', 1),
+        (None, core, 'parse_buffer', 3),
+        ('courts', core, '_courts', None),
+        ('tariff', core, '_charge_table_of_date', None),
+        ('tariff', helpers.ChargeTable, 'cost_minutes', None),
+        ('tariff', core, 'batch_court_charges', None),
+        ('batch', core, 'info_batch', None),
+        ('format', core, 'format_result', None),
+        ('write', streams.BufferedWriter, 'write', None),
+    ]
+
+
+class StageRecord(object):
+    """
+    Statistics of a stage.
+    The total time includes the time of the nested stages, like parse in read, while the self time excludes it.
+    """
+
+    __slots__ = ('calls', 'total', 'own')
+
+    def __init__(self):
+        self.calls, self.total, self.own = 0, 0.0, 0.0
+
+
+class Stats(object):
+    """
+    Instrumentation of the stages, records the wall time and calls of each stage.
+
+    Usage::
+        >>> stats = Stats()
+        >>> stats.enable()
+        >>> rows = core.info_rows(['2016-06-02 20:00~22:00 7'])
+        >>> stats.disable()
+        >>> stats.stages['parse'].calls
+        1
+    """
+
+    def __init__(self):
+        self.stages = collections.OrderedDict((stage, StageRecord()) for stage in STAGES)
+        self.lines = 0
+        self.wall = 0.0
+        self._start = None
+        # the time of the nested stages of each running stage
+        self._stack = list()
+        # the original functions, items are tuple formed by owner, attribute name and the function
+        self._originals = list()
+        # the profilers of the stages
+        self._profilers = dict()
+
+    def _wrap(self, stage, func, check_index=None):
+        """
+        Help function to wrap a function of a stage,
+        the stage of None means validation or parse by the is_check argument at the check index.
+        """
+        stack = self._stack
+        stages = self.stages
+        profilers = self._profilers
+
+        def wrapper(*args, **kwargs):
+            if stage is None:
+                is_check = kwargs.get('is_check', args[check_index] if len(args) > check_index else False)
+                record_stage = 'validation' if is_check else 'parse'
+            else:
+                record_stage = stage
+            profiler = profilers.get(record_stage)
+            stack.append(0.0)
+            if profiler is not None:
+                profiler.enable()
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.time() - start
+                if profiler is not None:
+                    profiler.disable()
+                nested = stack.pop()
+                record = stages[record_stage]
+                record.calls += 1
+                record.total += elapsed
+                record.own += elapsed - nested
+                if stack:
+                    stack[-1] += elapsed
+        wrapper.__name__ = getattr(func, '__name__', stage)
+        wrapper.__doc__ = getattr(func, '__doc__', None)
+        return wrapper
+
+    def enable(self):
+        """
+        Wrap the functions of the stages and start the wall clock.
+        """
+        if self._originals:
+            return
+        for stage, owner, name, check_index in _stage_targets():
+            # the attribute in __dict__ is the function itself, not the unbound method
+            func = owner.__dict__[name] if isinstance(owner, type) else getattr(owner, name)
+            self._originals.append((owner, name, func))
+            setattr(owner, name, self._wrap(stage, func, check_index))
+        self._start = time.time()
+
+    def disable(self):
+        """
+        Restore the functions of the stages and stop the wall clock.
+        """
+        for owner, name, func in reversed(self._originals):
+            setattr(owner, name, func)
+        self._originals = list()
+        if self._start is not None:
+            self.wall += time.time() - self._start
+            self._start = None
+
+    def profile(self, stage, profiler):
+        """
+        Run a profiler only in the calls of the stage.
+
+        :param stage: str, one of STAGES.
+        :param profiler: object, with enable() and disable() like cProfile.Profile or SamplingProfiler.
+        """
+        self._profilers[stage] = profiler
+
+    def timed_iter(self, stage, iterable):
+        """
+        Wrap an iterable, the time of getting each item is recorded to the stage, and each item is a line.
+
+        :param stage: str, one of STAGES.
+        :param iterable: iterable.
+        :return: generator, the items of the iterable.
+        """
+        next_item = iter(iterable).next
+        next_wrapper = self._wrap(stage, next_item)
+        while True:
+            try:
+                item = next_wrapper()
+            except StopIteration:
+                return
+            self.lines += 1
+            yield item
+
+    def report(self):
+        """
+        Generate the report of the statistics.
+
+        :return: dict, the statistics of the stages and the caches.
+        """
+        wall = self.wall + (time.time() - self._start if self._start is not None else 0.0)
+        stages = collections.OrderedDict()
+        for stage, record in self.stages.iteritems():
+            stages[stage] = dict(calls=record.calls, total_seconds=record.total, self_seconds=record.own,
+                                 calls_per_sec=record.calls / record.total if record.total > 0 else 0.0)
+        return dict(wall_seconds=wall, lines=self.lines, lines_per_sec=self.lines / wall if wall > 0 else 0.0,
+                    stages=stages, date_cache=core.date_cache_stats(), result_cache=core.result_cache_stats())
+
+    def format_report(self):
+        """
+        Format the report to readable lines.
+
+        :return: list, output strings.
+        """
+        report = self.report()
+        output_list = ['[Stats]', '', 'Wall: %.3fs  Lines: %d  Lines/s: %.0f' % (report['wall_seconds'],
+                                                                              report['lines'],
+                                                                              report['lines_per_sec']),
+                       '%-12s %12s %12s %12s %14s' % ('stage', 'calls', 'total(s)', 'self(s)', 'calls/s')]
+        for stage, item in report['stages'].iteritems():
+            output_list.append('%-12s %12d %12.3f %12.3f %14.0f' % (stage, item['calls'], item['total_seconds'],
+                                                                   item['self_seconds'], item['calls_per_sec']))
+        for name in ('date_cache', 'result_cache'):
+            cache = report[name]
+            output_list.append('%s: hits %d, misses %d, evictions %d, hit rate %.2f%%' % (
+                name, cache['hits'], cache['misses'], cache['evictions'], cache['hit_rate'] * 100))
+        return output_list
+
+    def dump(self, file_path):
+        """
+        Write the report to a JSON file.
+
+        :param file_path: str, path of the JSON file.
+        """
+        with open(file_path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+class SamplingProfiler(object):
+    """
+    A sampling profiler based on the profiling timer, it counts the functions running at each sample.
+    It can only be used in the main thread.
+    """
+
+    def __init__(self, interval=0.001):
+        """
+        :param interval: float, seconds between the samples of the profiling time.
+        """
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._is_sampling = False
+        self._is_started = False
+
+    def _handler(self, signum, frame):
+        if self._is_sampling and frame is not None:
+            code = frame.f_code
+            self.samples[(code.co_filename, frame.f_lineno, code.co_name)] += 1
+
+    def enable(self):
+        if not self._is_started:
+            signal.signal(signal.SIGPROF, self._handler)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            self._is_started = True
+        self._is_sampling = True
+
+    def disable(self):
+        self._is_sampling = False
+
+    def stop(self):
+        """
+        Stop the profiling timer.
+        """
+        if self._is_started:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            self._is_started = False
+
+    def print_stats(self, limit=20, stream=sys.stderr):
+        """
+        Print the most sampled lines.
+
+        :param limit: int, numbers of lines printed.
+        :param stream: file, where to print.
+        """
+        total = sum(self.samples.values())
+        stream.write('%d samples\n' % total)
+        for (file_name, line_no, func_name), count in self.samples.most_common(limit):
+            stream.write('%8d %6.2f%%  %s:%d(%s)\n' % (count, 100.0 * count / total, file_name, line_no, func_name))
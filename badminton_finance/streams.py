@@ -0,0 +1,599 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+A module of the input and output streams for large files.
+The compressed files of gzip, bz2 and xz are read and written as streams, without decompressing them to a file.
+'''
+
+import os
+import sys
+import time
+from functools import partial
+
+import core
+
+# the modules of the patterns, the compressions, the memory mapping, the threads and the processes are imported when
+# they are used, so the programme starts fast
+
+# compressions of the files, formed by name, file extension and magic bytes
+COMPRESSIONS = (('gzip', '.gz', '\x1f\x8b'), ('bz2', '.bz2', 'BZh'), ('xz', '.xz', '\xfd7zXZ\x00'))
+
+# commands of the compressions, used by the process mode
+COMPRESSION_COMMANDS = {'gzip': 'gzip', 'bz2': 'bzip2', 'xz': 'xz'}
+
+# where the compressed files are decompressed or compressed, in a thread overlapping the calculation,
+# in a process of the command of the compression, or inline in the calculation
+COMPRESSION_MODES = ('thread', 'process', 'inline')
+
+# bytes of the compressed file read each time, and the most bytes of a decompressed block,
+# so the batches waiting in the queue stay small however the data is compressed
+COMPRESSED_READ_SIZE = 64 * 1024
+DECOMPRESSED_BLOCK_SIZE = 256 * 1024
+
+# numbers of the batches of the decompressed lines waiting for the calculation in the thread mode
+DECOMPRESSED_QUEUE_SIZE = 16
+
+
+def expand_input_paths(paths, dir_pattern='*'):
+    """
+    Expand the input paths, a directory is expanded to its files matching the pattern and a glob to its matches.
+    The expanded files are sorted by name, and the order of the paths is kept, a file is only kept the first time.
+
+    :param paths: iterable, paths of files, directories or globs.
+    :param dir_pattern: str or tuple, pattern or patterns of the names of the files in a directory.
+    :return: list, paths of the files, a path which is neither a directory nor a glob is kept even if it is missing.
+    """
+    dir_patterns = (dir_pattern, ) if isinstance(dir_pattern, basestring) else tuple(dir_pattern)
+    expanded = list()
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            import fnmatch
+            matches = sorted(os.path.join(path, name) for name in os.listdir(path)
+                             if any(fnmatch.fnmatch(name, pattern) for pattern in dir_patterns)
+                             and os.path.isfile(os.path.join(path, name)))
+        # the same check as glob.has_magic
+        elif any(char in path for char in '*?['):
+            import glob
+            matches = sorted(match for match in glob.glob(path) if os.path.isfile(match))
+        else:
+            matches = [path]
+        for match in matches:
+            if os.path.abspath(match) not in seen:
+                seen.add(os.path.abspath(match))
+                expanded.append(match)
+    return expanded
+
+
+def detect_compression(file_path, is_magic=True):
+    """
+    Detect the compression of a file by its extension, or by its magic bytes.
+
+    :param file_path: str, path of the file.
+    :param is_magic: bool, if read the magic bytes when the extension is not of a compression.
+    :return: str, name of the compression in COMPRESSIONS, None if the file is not compressed.
+    """
+    for compression, extension, _ in COMPRESSIONS:
+        if file_path.endswith(extension):
+            return compression
+    if not is_magic:
+        return None
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(max(len(magic) for _, _, magic in COMPRESSIONS))
+    except IOError:
+        return None
+    for compression, _, magic in COMPRESSIONS:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def _import_lzma():
+    """
+    Help function to import the lzma module, which is only in the standard library of Python 3.
+
+    :return: module, None if it is not installed.
+    """
+    try:
+        import lzma
+    except ImportError:
+        try:
+            from backports import lzma
+        except ImportError:
+            return None
+    return lzma
+
+
+def _is_process_mode(compression, mode):
+    """
+    Help function to check if a compression runs in the process mode, xz does if lzma is not installed.
+    """
+    return mode == 'process' or (compression == 'xz' and _import_lzma() is None)
+
+
+def _decompressor(compression):
+    """
+    Help function to create the decompressor of a compression in this process.
+    """
+    if compression == 'gzip':
+        import zlib
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compression == 'bz2':
+        import bz2
+        return bz2.BZ2Decompressor()
+    return _import_lzma().LZMADecompressor()
+
+
+def _is_stream_end(decompressor, compression):
+    """
+    Help function to check if the decompressor reached the end of the stream, or the file is truncated.
+    """
+    if compression == 'gzip':
+        # the data after the end of the stream is unused
+        decompressor.decompress('\x00')
+        return decompressor.unused_data == '\x00'
+    if compression == 'bz2':
+        try:
+            decompressor.decompress('')
+        except EOFError:
+            return True
+        return False
+    return decompressor.eof
+
+
+def _decompressed_blocks(file_path, compression):
+    """
+    Help function to decompress a file block by block, the streams concatenated in the file are all decompressed.
+    """
+    decompressor = _decompressor(compression)
+    is_empty = True
+    with open(file_path, 'rb') as f:
+        for data in iter(partial(f.read, COMPRESSED_READ_SIZE), ''):
+            is_empty = False
+            while data:
+                if compression == 'gzip':
+                    block = decompressor.decompress(data, DECOMPRESSED_BLOCK_SIZE)
+                else:
+                    block = decompressor.decompress(data)
+                # a block of bz2 or xz is only cut after decompressed
+                for offset in xrange(0, len(block), DECOMPRESSED_BLOCK_SIZE):
+                    yield block[offset:offset + DECOMPRESSED_BLOCK_SIZE]
+                if compression == 'gzip' and decompressor.unconsumed_tail:
+                    data = decompressor.unconsumed_tail
+                    continue
+                data = decompressor.unused_data
+                if data:
+                    decompressor = _decompressor(compression)
+    if not is_empty and not _is_stream_end(decompressor, compression):
+        raise IOError('Can not decompress %s, the file is truncated.' % file_path)
+
+
+def _process_blocks(file_path, compression):
+    """
+    Help function to decompress a file by the command of the compression in another process.
+    """
+    import subprocess
+    import tempfile
+    # the messages of the command are in the error, a file never blocks the command like a full pipe
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen([COMPRESSION_COMMANDS[compression], '-dc', file_path], stdout=subprocess.PIPE,
+                               stderr=errors)
+    is_done = False
+    try:
+        for block in iter(partial(process.stdout.read, COMPRESSED_READ_SIZE), ''):
+            yield block
+        is_done = True
+    finally:
+        if not is_done and process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        return_code = process.wait()
+        errors.seek(0)
+        message = errors.read().strip()
+        errors.close()
+    if return_code:
+        raise IOError('Can not decompress %s by %s. %s' % (file_path, COMPRESSION_COMMANDS[compression], message))
+
+
+def _line_batches(blocks):
+    """
+    Help function to split the blocks to lists of lines, a line may be split by two blocks.
+    """
+    rest = ''
+    for block in blocks:
+        lines = (rest + block).split('\n')
+        rest = lines.pop()
+        if lines:
+            yield lines
+    if rest:
+        yield [rest]
+
+
+def _threaded_batches(batches):
+    """
+    Help function to get the batches from a thread, so the thread reads ahead while the batches are calculated.
+    The decompression of zlib and bz2 releases the GIL, so it runs with the calculation at the same time.
+    """
+    import Queue
+    import threading
+    queue = Queue.Queue(DECOMPRESSED_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def put(item):
+        # the thread stops waiting if the batches are not wanted any more
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for batch in batches:
+                if not put(batch):
+                    return
+            put(None)
+        except Exception:
+            # the error is raised in the calculation, a batch is a list so the tuple is distinguished
+            put(sys.exc_info())
+
+    thread = threading.Thread(target=produce, name='decompression')
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            item = queue.get()
+            if item is None:
+                break
+            if isinstance(item, tuple):
+                raise item[0], item[1], item[2]
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def read_compressed_lines(file_path, compression, mode='thread'):
+    """
+    Read the lines of a compressed file as a stream.
+
+    :param file_path: str, path of the file.
+    :param compression: str, name of the compression in COMPRESSIONS.
+    :param mode: str, in COMPRESSION_MODES, the xz file is decompressed in the process mode if lzma is not installed.
+    :return: generator, the lines without line separator.
+    :raise: IOError, zlib.error or ValueError, if the file is broken.
+    """
+    if _is_process_mode(compression, mode):
+        batches = _line_batches(_process_blocks(file_path, compression))
+    else:
+        batches = _line_batches(_decompressed_blocks(file_path, compression))
+        if mode == 'thread':
+            batches = _threaded_batches(batches)
+    for lines in batches:
+        for line in lines:
+            yield line
+
+
+def read_compressed(file_path, compression, is_check, quarantine=None, mode='thread'):
+    """
+    Read a compressed file as a stream, the lines are parsed while the next ones are decompressed.
+
+    :param file_path: str, path of the file.
+    :param compression: str, name of the compression in COMPRESSIONS.
+    :param is_check: bool, if check the input each line.
+    :param quarantine: Quarantine, collecting the invalid lines instead of raising, None if not quarantining.
+    :param mode: str, in COMPRESSION_MODES.
+    :return: generator, Booking parsed from each line.
+    """
+    lines = read_compressed_lines(file_path, compression, mode)
+    if quarantine is not None:
+        return quarantine.parse_lines(lines, is_check)
+    return (core.parse_line(line, is_check) for line in lines)
+
+
+class CompressedFile(object):
+    """
+    A file compressing the data written to it, the compression is in this process or in a process of its command.
+
+    Usage::
+        >>> import tempfile
+        >>> file_path = tempfile.mktemp(suffix='.gz')
+        >>> with CompressedFile(file_path, 'gzip') as f:
+        ...     f.write('[Summary]\\n')
+        >>> list(read_compressed_lines(file_path, detect_compression(file_path)))
+        ['[Summary]']
+        >>> os.remove(file_path)
+    """
+
+    def __init__(self, file_path, compression, mode='thread'):
+        """
+        :param file_path: str, path of the file.
+        :param compression: str, name of the compression in COMPRESSIONS.
+        :param mode: str, in COMPRESSION_MODES, only the process mode runs in another process.
+        """
+        self.f = open(file_path, 'wb')
+        self.compressor = self.process = None
+        self.is_finished = False
+        if _is_process_mode(compression, mode):
+            import subprocess
+            self.process = subprocess.Popen([COMPRESSION_COMMANDS[compression], '-c'], stdin=subprocess.PIPE,
+                                            stdout=self.f)
+        elif compression == 'gzip':
+            import zlib
+            self.compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif compression == 'bz2':
+            import bz2
+            self.compressor = bz2.BZ2Compressor()
+        else:
+            self.compressor = _import_lzma().LZMACompressor()
+
+    def write(self, data):
+        """
+        Compress the data and write it to the file.
+        """
+        if self.process is not None:
+            self.process.stdin.write(data)
+        else:
+            self.f.write(self.compressor.compress(data))
+
+    def flush(self):
+        """
+        Flush the compressed data to the file, or the data to the command of the compression.
+        """
+        if self.process is not None:
+            self.process.stdin.flush()
+        else:
+            self.f.flush()
+
+    def fileno(self):
+        """
+        Get the file descriptor of the compressed file.
+        """
+        return self.f.fileno()
+
+    def finish(self):
+        """
+        Finish the compressed stream and flush it to the file, the file is kept open, so it can be synced to the disk.
+
+        :raise: IOError, if the command of the compression failed.
+        """
+        if self.is_finished:
+            return
+        self.is_finished = True
+        if self.process is not None:
+            self.process.stdin.close()
+            if self.process.wait():
+                raise IOError('Can not compress %s.' % self.f.name)
+        else:
+            self.f.write(self.compressor.flush())
+        self.f.flush()
+
+    def close(self):
+        """
+        Finish the compressed stream and close the file.
+
+        :raise: IOError, if the command of the compression failed.
+        """
+        if self.f.closed:
+            return
+        try:
+            self.finish()
+        finally:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_output(file_path, mode='thread'):
+    """
+    Open an output file, it is compressed if the extension is of a compression.
+
+    :param file_path: str, path of the file.
+    :param mode: str, in COMPRESSION_MODES.
+    :return: file or CompressedFile.
+    """
+    compression = detect_compression(file_path, is_magic=False)
+    if compression is None:
+        return open(file_path, 'w')
+    return CompressedFile(file_path, compression, mode)
+
+
+def read_mmap(file_path, is_check, quarantine=None):
+    """
+    Read a file by memory mapping, the lines are parsed from the mapped buffer directly.
+
+    :param file_path: str, path of the file.
+    :param is_check: bool, if check the input each line.
+    :param quarantine: Quarantine, collecting the invalid lines instead of raising, None if not quarantining.
+    :return: generator, Booking parsed from each line.
+    """
+    if os.path.getsize(file_path) == 0:
+        return
+    if quarantine is not None:
+        core.refresh_strategies()
+    import mmap
+    with open(file_path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        size = len(buf)
+        pos = 0
+        line_number = 0
+        while pos < size:
+            endpos = buf.find('\n', pos)
+            if endpos < 0:
+                endpos = size
+            line_number += 1
+            if quarantine is None:
+                yield core.parse_buffer(buf, pos, endpos, is_check)
+            else:
+                try:
+                    booking = core.parse_buffer(buf, pos, endpos, is_check)
+                except (ValueError, AssertionError), e:
+                    quarantine.reject(line_number, buf[pos:endpos], e)
+                else:
+                    if quarantine.admit(line_number, buf[pos:endpos], booking):
+                        yield booking
+            pos = endpos + 1
+    finally:
+        buf.close()
+
+
+class Quarantine(object):
+    """
+    Collect the invalid lines with their line numbers and reasons, so the run continues without them.
+    A line is invalid if it can not be parsed, or can not be calculated by the strategies.
+    The lines are written to the file as '{line number}\\t{reason}\\t{line}', or kept in entries if no file.
+
+    Usage::
+        >>> quarantine = Quarantine()
+        >>> lines = ['2016-06-02 20:00~22:00 7', 'bad', '2016-06-02 07:00~10:00 7']
+        >>> [booking.time for booking in quarantine.parse_lines(lines, False)]
+        ['2016-06-02 20:00~22:00']
+        >>> quarantine.rejected, quarantine.entries[0]
+        (2, (2, 'bad', 'need more than 1 value to unpack'))
+        >>> quarantine.entries[1]
+        (3, '2016-06-02 07:00~10:00 7', 'Can not find the charge of the hours in config.')
+    """
+
+    def __init__(self, f=None):
+        """
+        :param f: file, the quarantine file, None means keeping the lines in entries.
+        """
+        self.f = f
+        self.rejected = 0
+        self.entries = list()
+
+    def reject(self, line_number, line, reason):
+        """
+        Collect an invalid line.
+
+        :param line_number: int, line number in the input, starts from 1, or str like 'path:number' for many inputs.
+        :param line: str, the invalid line.
+        :param reason: Exception or str, why the line is invalid, the line in the end of it is not kept.
+        """
+        self.rejected += 1
+        line = line.rstrip('\r\n')
+        reason = str(reason).strip()
+        if line and reason.endswith(line):
+            # the errors of parsing end with the line itself, which is already in the entry
+            reason = reason[:-len(line)].rstrip()
+        entry = (line_number, line, reason.replace('\n', ' '))
+        if self.f is None:
+            self.entries.append(entry)
+        else:
+            self.f.write('%s\t%s\t%s\n' % (entry[0], entry[2], entry[1]))
+
+    def parse_lines(self, lines, is_check, first_line_number=1):
+        """
+        Parse the lines, the invalid ones are collected instead of raising.
+
+        :param lines: iterable, formed by string of ordering information.
+        :param is_check: bool, if check the input each line.
+        :param first_line_number: int, line number of the first line.
+        :return: generator, Booking parsed from each valid line.
+        """
+        core.refresh_strategies()
+        for line_number, line in enumerate(lines, first_line_number):
+            try:
+                booking = core.parse_line(line, is_check)
+            except (ValueError, AssertionError), e:
+                self.reject(line_number, line, e)
+            else:
+                if self.admit(line_number, line, booking):
+                    yield booking
+
+    def admit(self, line_number, line, booking):
+        """
+        Check if a parsed line can be calculated by the strategies, it is collected if not.
+        The line is only checked by core.check_booking, it is calculated by the summary.
+
+        :param line_number: int or str, the same as reject.
+        :param line: str, the line.
+        :param booking: core.Booking, the parsed line.
+        :return: bool, if the line can be calculated.
+        """
+        try:
+            # the strategies are refreshed by the caller
+            core.check_booking(booking)
+        except (ValueError, AssertionError, AttributeError), e:
+            self.reject(line_number, line, e)
+            return False
+        return True
+
+
+class BufferedWriter(object):
+    """
+    A writer collects the lines to a buffer and writes them to the file in bulk.
+    The buffer is flushed when its size reaches the buffer size, or the flush interval passed since the last flush.
+
+    Usage::
+        >>> from StringIO import StringIO
+        >>> f = StringIO()
+        >>> writer = BufferedWriter(f, buffer_size=1024, linesep='\\n')
+        >>> writer.write('[Summary]')
+        >>> f.getvalue()
+        ''
+        >>> writer.close()
+        >>> f.getvalue()
+        '[Summary]\\n'
+    """
+
+    def __init__(self, f, buffer_size, flush_interval=0, is_fsync=False, linesep=os.linesep):
+        """
+        :param f: file, the file to write.
+        :param buffer_size: int, bytes of the buffer.
+        :param flush_interval: float, seconds between the flushes, 0 means only flushing by the size.
+        :param is_fsync: bool, if sync the file to the disk when closing the writer.
+        :param linesep: str, separator written after each line.
+        """
+        self.f = f
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.is_fsync = is_fsync
+        self.linesep = linesep
+        self._buffer = list()
+        self._size = 0
+        self._last_flush = time.time()
+
+    def write(self, line):
+        """
+        Write a line to the buffer.
+
+        :param line: str, the line without line separator.
+        """
+        self._buffer.append(line)
+        self._size += len(line) + 1
+        if self._size >= self.buffer_size or \
+                (self.flush_interval and time.time() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffer to the file.
+        """
+        if self._buffer:
+            self._buffer.append('')
+            self.f.write(self.linesep.join(self._buffer))
+            self._buffer = list()
+            self._size = 0
+        self.f.flush()
+        self._last_flush = time.time()
+
+    def close(self):
+        """
+        Flush the buffer and sync the file if required, the file is not closed.
+        A compressed file is finished before the sync, so its last block is on the disk too.
+        """
+        self.flush()
+        if self.is_fsync:
+            if isinstance(self.f, CompressedFile):
+                self.f.finish()
+            os.fsync(self.f.fileno())
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+Benchmarks of the pipeline with regression baselines.
+
+Usage::
+
+    $ python -m benchmarks.bench run --sizes 1000 100000 --output baseline.json
+    $ python -m benchmarks.bench run --sizes 1000 100000 --output current.json
+    $ python -m benchmarks.bench compare baseline.json current.json
+    $ python -m benchmarks.bench startup --lines 10
+
+Each case runs in a new process, so the peak memory of a case is not affected by the others.
+'''
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from generator import write_booking_file
+
+# root of the repository, where run.py and config.py are
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# cases of the benchmarks
+CASES = ('check_input_line', 'info_single', 'info_rows', 'info_rows_generator', 'output_summary')
+
+# default numbers of lines of the benchmarks, any size from 1e3 to 1e8 can be passed
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# default times of running the programme in the startup benchmark
+DEFAULT_STARTUP_REPEAT = 20
+
+
+def _lines(file_path):
+    with open(file_path) as f:
+        for line in f:
+            yield line
+
+
+def _run_case(case, file_path):
+    """
+    Help function to run a case in this process.
+
+    :param case: str, one of CASES.
+    :param file_path: str, path of the booking file.
+    :return: dict, seconds and peak memory in KB.
+    """
+    sys.path.insert(0, REPO_ROOT)
+    import badminton_finance.core as core
+    start = time.time()
+    if case == 'check_input_line':
+        for line in _lines(file_path):
+            core.check_input_line(line)
+    elif case == 'info_single':
+        for line in _lines(file_path):
+            core.info_single(line)
+    elif case == 'info_rows':
+        core.info_rows(_lines(file_path))
+    elif case == 'info_rows_generator':
+        for _ in core.info_rows_generator(_lines(file_path)):
+            pass
+    elif case == 'output_summary':
+        import runner
+        fd, output_path = tempfile.mkstemp()
+        os.close(fd)
+        runner._CONFIG.update(INPUT_FILE_PATH=file_path, OUTPUT_FILE_PATH=output_path, INPUT_TYPE='file')
+        try:
+            runner.output_summary()
+        finally:
+            os.remove(output_path)
+    else:
+        raise ValueError('Can not resolve the case. %s' % case)
+    seconds = time.time() - start
+    return dict(seconds=seconds, peak_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def measure(case, file_path, lines):
+    """
+    Run a case in a new process.
+
+    :param case: str, one of CASES.
+    :param file_path: str, path of the booking file.
+    :param lines: int, numbers of lines in the file.
+    :return: dict, seconds, lines per second and peak memory in KB.
+    """
+    output = subprocess.check_output([sys.executable, '-m', 'benchmarks.bench', 'case', case, file_path],
+                                     cwd=REPO_ROOT)
+    result = json.loads(output)
+    result['lines_per_sec'] = lines / result['seconds'] if result['seconds'] > 0 else float('inf')
+    return result
+
+
+def measure_startup(file_path, repeat):
+    """
+    Run the programme on a small file, the time from the start of the process to its first output is measured,
+    it is dominated by the imports and the configuration loading.
+
+    :param file_path: str, path of the booking file.
+    :param repeat: int, times of running the programme.
+    :return: dict, min and median seconds to the first output and to the exit.
+    """
+    first_outputs, exits = list(), list()
+    for _ in xrange(repeat):
+        start = time.time()
+        process = subprocess.Popen([sys.executable, 'run.py', '-s', '-i', file_path, '-o', os.devnull],
+                                   cwd=REPO_ROOT, stdout=subprocess.PIPE)
+        process.stdout.read(1)
+        first_outputs.append(time.time() - start)
+        process.communicate()
+        exits.append(time.time() - start)
+    first_outputs.sort()
+    exits.sort()
+    return dict(first_output_min=first_outputs[0], first_output_median=first_outputs[len(first_outputs) // 2],
+                exit_min=exits[0], exit_median=exits[len(exits) // 2])
+
+
+def booking_file(data_dir, lines, seed):
+    """
+    Get the booking file of the size, generate it if it does not exist.
+
+    :param data_dir: str, directory of the booking files.
+    :param lines: int, numbers of lines.
+    :param seed: int, seed of the generator.
+    :return: str, path of the file.
+    """
+    if not os.path.isdir(data_dir):
+        os.makedirs(data_dir)
+    file_path = os.path.join(data_dir, 'bookings_%d_%d.txt' % (lines, seed))
+    if not os.path.exists(file_path):
+        write_booking_file(file_path, lines, seed)
+    return file_path
+
+
+def run_benchmarks(sizes, cases, data_dir, seed=0):
+    """
+    Run the cases with the sizes.
+
+    :param sizes: iterable, numbers of lines.
+    :param cases: iterable, items are in CASES.
+    :param data_dir: str, directory of the booking files.
+    :param seed: int, seed of the generator.
+    :return: dict, the meta information and the results keyed by 'case@size'.
+    """
+    results = dict()
+    for lines in sizes:
+        file_path = booking_file(data_dir, lines, seed)
+        for case in cases:
+            results['%s@%d' % (case, lines)] = result = measure(case, file_path, lines)
+            print '%-28s %12.0f lines/s %10d KB' % ('%s@%d' % (case, lines), result['lines_per_sec'],
+                                                    result['peak_kb'])
+    meta = dict(python=platform.python_version(), platform=platform.platform(), seed=seed,
+                time=time.strftime('%Y-%m-%d %H:%M:%S'))
+    return dict(meta=meta, results=results)
+
+
+def compare(baseline, current, throughput_threshold, memory_threshold):
+    """
+    Compare the results with the baseline.
+
+    :param baseline: dict, results of run_benchmarks as the baseline.
+    :param current: dict, results of run_benchmarks to compare.
+    :param throughput_threshold: float, ratio of the throughput drop regarded as a regression.
+    :param memory_threshold: float, ratio of the peak memory growth regarded as a regression.
+    :return: list, the regressions, items are tuple formed by key, metric, baseline value and current value.
+
+    Usage::
+        >>> baseline = dict(results={'info_single@1000': dict(lines_per_sec=1000.0, peak_kb=1000)})
+        >>> current = dict(results={'info_single@1000': dict(lines_per_sec=800.0, peak_kb=1000)})
+        >>> compare(baseline, current, 0.1, 0.1)
+        [('info_single@1000', 'lines_per_sec', 1000.0, 800.0)]
+    """
+    regressions = list()
+    for key in sorted(set(baseline['results']) & set(current['results'])):
+        base, cur = baseline['results'][key], current['results'][key]
+        if cur['lines_per_sec'] < base['lines_per_sec'] * (1 - throughput_threshold):
+            regressions.append((key, 'lines_per_sec', base['lines_per_sec'], cur['lines_per_sec']))
+        if cur['peak_kb'] > base['peak_kb'] * (1 + memory_threshold):
+            regressions.append((key, 'peak_kb', base['peak_kb'], cur['peak_kb']))
+    return regressions
+
+
+def main():
+    """
+    Entry of the benchmarks.
+    """
+    parser = argparse.ArgumentParser(prog='Badminton Finance Benchmarks')
+    subparsers = parser.add_subparsers(dest='command')
+
+    generate_parser = subparsers.add_parser('generate', help='Generate a booking file.')
+    generate_parser.add_argument('file', help='Path of the booking file.')
+    generate_parser.add_argument('lines', help='Numbers of lines.', type=int)
+    generate_parser.add_argument('--seed', help='Seed of the generator.', type=int, default=0)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks.')
+    run_parser.add_argument('--sizes', help='Numbers of lines.', type=int, nargs='+', default=DEFAULT_SIZES)
+    run_parser.add_argument('--cases', help='Cases to run.', nargs='+', choices=CASES, default=CASES)
+    run_parser.add_argument('--seed', help='Seed of the generator.', type=int, default=0)
+    run_parser.add_argument('--data-dir', help='Directory of the booking files.',
+                            default=os.path.join(tempfile.gettempdir(), 'badminton_finance_bench'))
+    run_parser.add_argument('-o', '--output', help='Set the output JSON file path.')
+
+    startup_parser = subparsers.add_parser('startup', help='Measure the startup time of the programme.')
+    startup_parser.add_argument('--lines', help='Numbers of lines of the input file.', type=int, default=10)
+    startup_parser.add_argument('--repeat', help='Times of running the programme.', type=int,
+                                default=DEFAULT_STARTUP_REPEAT)
+    startup_parser.add_argument('--seed', help='Seed of the generator.', type=int, default=0)
+    startup_parser.add_argument('--data-dir', help='Directory of the booking files.',
+                                default=os.path.join(tempfile.gettempdir(), 'badminton_finance_bench'))
+
+    compare_parser = subparsers.add_parser('compare', help='Compare the results with a baseline.')
+    compare_parser.add_argument('baseline', help='Path of the baseline JSON file.')
+    compare_parser.add_argument('current', help='Path of the current JSON file.')
+    compare_parser.add_argument('--throughput-threshold', type=float, default=0.1,
+                                help='Ratio of the throughput drop regarded as a regression.')
+    compare_parser.add_argument('--memory-threshold', type=float, default=0.2,
+                                help='Ratio of the peak memory growth regarded as a regression.')
+
+    case_parser = subparsers.add_parser('case', help='Run a case in this process and print the JSON result.')
+    case_parser.add_argument('case', choices=CASES)
+    case_parser.add_argument('file')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        write_booking_file(args.file, args.lines, args.seed)
+    elif args.command == 'run':
+        results = run_benchmarks(args.sizes, args.cases, args.data_dir, args.seed)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+    elif args.command == 'startup':
+        result = measure_startup(booking_file(args.data_dir, args.lines, args.seed), args.repeat)
+        for key in sorted(result):
+            print '%-20s %8.1f ms' % (key, result[key] * 1000)
+    elif args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.throughput_threshold, args.memory_threshold)
+        for key, metric, base_value, cur_value in regressions:
+            print 'REGRESSION %-28s %-14s %14.1f -> %14.1f' % (key, metric, base_value, cur_value)
+        if regressions:
+            sys.exit(1)
+        print 'No regression.'
+    elif args.command == 'case':
+        print json.dumps(_run_case(args.case, args.file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+A seeded generator of booking files for the benchmarks.
+'''
+
+import datetime
+import random
+
+# boundaries of the bands in CHARGE_STRATEGY, the crossing ranges are around them
+BOUNDARIES = (12, 18, 20)
+
+# the first and last hour of a day can be booked
+OPEN_HOUR, CLOSE_HOUR = 9, 22
+
+
+def booking_lines(count, seed=0, start_date=datetime.date(2016, 1, 1), days=365, weekend_ratio=0.4,
+                  cross_ratio=0.5, idle_ratio=0.1):
+    """
+    Generate booking lines like data/input.txt.
+
+    :param count: int, numbers of lines.
+    :param seed: int, seed of the random generator, the same seed generates the same lines.
+    :param start_date: datetime.date, the first day of the bookings.
+    :param days: int, numbers of days of the bookings.
+    :param weekend_ratio: float, ratio of the bookings in the weekend.
+    :param cross_ratio: float, ratio of the ranges crossing a boundary of the charge bands.
+    :param idle_ratio: float, ratio of the bookings with less than 4 applicants, which order no court.
+    :return: generator, lines without line separator.
+
+    Usage::
+        >>> lines = list(booking_lines(3, seed=1))
+        >>> lines == list(booking_lines(3, seed=1))
+        True
+        >>> len(lines)
+        3
+    """
+    rnd = random.Random(seed)
+    start_ordinal = start_date.toordinal()
+    # dates grouped by weekday and weekend
+    weekdays, weekends = list(), list()
+    for ordinal in range(start_ordinal, start_ordinal + days):
+        date = datetime.date.fromordinal(ordinal)
+        (weekends if date.weekday() >= 5 else weekdays).append(date.isoformat())
+    for _ in xrange(count):
+        dates = weekends if rnd.random() < weekend_ratio else weekdays
+        date_str = dates[rnd.randrange(len(dates))]
+        if rnd.random() < cross_ratio:
+            boundary = BOUNDARIES[rnd.randrange(len(BOUNDARIES))]
+            start = rnd.randint(max(OPEN_HOUR, boundary - 3), boundary - 1)
+            end = rnd.randint(boundary + 1, min(CLOSE_HOUR, boundary + 3))
+        else:
+            start = rnd.randint(OPEN_HOUR, CLOSE_HOUR - 1)
+            end = rnd.randint(start + 1, min(CLOSE_HOUR, start + 4))
+        if rnd.random() < idle_ratio:
+            applicants = rnd.randint(0, 3)
+        else:
+            applicants = int(rnd.triangular(4, 36, 12))
+        yield '%s %02d:00~%02d:00 %d' % (date_str, start, end, applicants)
+
+
+def write_booking_file(file_path, count, seed=0, **kwargs):
+    """
+    Write the booking lines to a file.
+
+    :param file_path: str, path of the file.
+    :param count: int, numbers of lines.
+    :param seed: int, seed of the random generator.
+    :param kwargs: other arguments of booking_lines.
+    """
+    with open(file_path, 'w') as f:
+        buf = list()
+        for line in booking_lines(count, seed, **kwargs):
+            buf.append(line)
+            if len(buf) >= 65536:
+                f.write('\n'.join(buf) + '\n')
+                buf = list()
+        if buf:
+            f.write('\n'.join(buf) + '\n')
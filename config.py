@@ -5,7 +5,7 @@ __author__ = 'guti'
 Configuration of the the badminton court and oder strategy.
 '''
 
-# which way being using to input
+# which way being using to input, file, terminal or mmap (memory mapping the file)
 INPUT_TYPE = 'file'
 
 # if check each input information
@@ -14,13 +14,92 @@ IS_CHECK = True
 # if using generator for the calculation
 IS_GENERATOR = True
 
+# numbers of lines calculated together by numpy, 0 means calculating line by line
+BATCH_SIZE = 0
+
+# numbers of processes calculating the input file, 1 means calculating in this process
+WORKERS = 1
+
 # if print the result on the screen
 IS_PRINT = False
 
-# file path if using file as input or output
+# bytes of the output buffer, the output is written in bulk when the buffer is full
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+# seconds between the flushes of the output buffer, 0 means only flushing when the buffer is full
+OUTPUT_FLUSH_INTERVAL = 0
+
+# if sync the output file to the disk at the end
+IS_FSYNC = False
+
+# file path if using file as input or output, the input can also be a list of files, directories and globs,
+# then the summary has the subtotal of each file
 INPUT_FILE_PATH = 'data/input.txt'
 OUTPUT_FILE_PATH = 'data/output.txt'
 
+# patterns of the names of the input files in a directory, a string or a tuple of strings, the default also reads
+# the compressed files of the extensions of gzip, bz2 and xz
+INPUT_DIR_PATTERN = ('*.txt', '*.gz', '*.bz2', '*.xz')
+
+# the input files of gzip, bz2 and xz, detected by extension or magic bytes, and the output files of their extensions
+# are decompressed and compressed as streams, in 'thread' overlapping the calculation, in 'process' of the command
+# of the compression, or 'inline'
+COMPRESSION_MODE = 'thread'
+
+# file path of the invalid lines with their line numbers and reasons, None means aborting at the first invalid line
+QUARANTINE_FILE_PATH = None
+
+# granularities of the rollups, in 'day', 'week', 'month', 'weekday' and 'band'
+ROLLUPS = ()
+
+# report file path of the rollups, None means appending the rollups to the output
+ROLLUP_FILE_PATH = None
+
+# numbers of the most profitable and the most loss-making sessions appended to the output, 0 means none
+TOP_SESSIONS = 0
+
+# Python file defining SCENARIOS, a list of (name, overrides) evaluated with the summary, None means no scenarios
+SCENARIO_FILE_PATH = None
+
+# grid of the optimizer, ranges 'START:STOP[:STEP]' of the fee, applicants per court and the remainder ordering
+# one more court, None thresholds means not changing the oder strategy
+OPTIMIZE_FEES = '20:40'
+OPTIMIZE_APPLICANTS_PER_COURT = '4:8'
+OPTIMIZE_THRESHOLDS = None
+
+# the highest fee searched by the optimizer, None means no limit
+OPTIMIZE_MAX_FEE = None
+
+# numbers of the best candidates in the report of the optimizer
+OPTIMIZE_TOP = 10
+
+# if index the totals of the summary by date, for the queries of the totals between two dates
+IS_LEDGER = False
+
+# file path of the ledger index, None means the output file path with '.ledger'
+LEDGER_FILE_PATH = None
+
+# if only calculate the lines appended to the input file since the last run
+IS_INCREMENTAL = False
+
+# checkpoint file path of the incremental calculation, None means the output file path with '.checkpoint'
+CHECKPOINT_FILE_PATH = None
+
+# if record the statistics of the pipeline stages
+IS_STATS = False
+
+# JSON file path of the statistics, None means printing them
+STATS_FILE_PATH = None
+
+# if cache the parsed input file in binary columns, and read the cache when the input file is not changed
+IS_COLUMN_CACHE = False
+
+# file path of the column cache, None means the input file path with '.colcache'
+COLUMN_CACHE_PATH = None
+
+# address of the streaming service, 'host:port' for TCP or path of the Unix socket
+SERVER_ADDRESS = '127.0.0.1:8787'
+
 # quit flags when using input_from_terminal
 QUIT_FLAGS = ('q', 'quit', 'exit', 'Q', 'Quit', 'Exit', 'QUIT', 'EXIT')
 
@@ -32,10 +111,28 @@ def _check_config():
     :return: None, assert the arguments is legal.
     """
     assert_msg = 'Config file error, illegal arguments in config module'
-    assert INPUT_TYPE in ('file', 'terminal'), assert_msg
+    assert INPUT_TYPE in ('file', 'terminal', 'mmap'), assert_msg
     assert isinstance(IS_CHECK, bool), assert_msg
     assert isinstance(IS_GENERATOR, bool), assert_msg
     assert isinstance(IS_PRINT, bool), assert_msg
+    assert isinstance(BATCH_SIZE, int) and BATCH_SIZE >= 0, assert_msg
+    assert isinstance(WORKERS, int) and WORKERS >= 1, assert_msg
+    assert isinstance(OUTPUT_BUFFER_SIZE, int) and OUTPUT_BUFFER_SIZE > 0, assert_msg
+    assert OUTPUT_FLUSH_INTERVAL >= 0, assert_msg
+    assert isinstance(IS_FSYNC, bool), assert_msg
+    assert all(granularity in ('day', 'week', 'month', 'weekday', 'band') for granularity in ROLLUPS), assert_msg
+    assert isinstance(INPUT_FILE_PATH, (str, list, tuple)), assert_msg
+    assert COMPRESSION_MODE in ('thread', 'process', 'inline'), assert_msg
+    assert isinstance(IS_INCREMENTAL, bool), assert_msg
+    assert not (IS_INCREMENTAL and ROLLUPS), assert_msg
+    assert not (IS_INCREMENTAL and QUARANTINE_FILE_PATH), assert_msg
+    assert not (IS_INCREMENTAL and SCENARIO_FILE_PATH), assert_msg
+    assert not (IS_INCREMENTAL and TOP_SESSIONS), assert_msg
+    assert isinstance(IS_STATS, bool), assert_msg
+    assert isinstance(IS_COLUMN_CACHE, bool), assert_msg
+    assert isinstance(IS_LEDGER, bool), assert_msg
+    assert isinstance(TOP_SESSIONS, int) and TOP_SESSIONS >= 0, assert_msg
+    assert isinstance(OPTIMIZE_TOP, int) and OPTIMIZE_TOP > 0, assert_msg
 
 # execute when this module being imported
 _check_config()
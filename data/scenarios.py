@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+Scenarios evaluated by run.py --scenarios, each of them overrides some strategies in badminton_finance.helpers.
+'''
+
+SCENARIOS = [
+    ('evening 70', {'CHARGE_STRATEGY': {('Mon', 'Tue', 'Wed', 'Thu', 'Fri'): {('20:00', '22:00'): 70}}}),
+    ('income 35', {'INCOMES_PER_APPLICANT': 35}),
+    ('5 per court', {'APPLICANTS_PER_COURT': 5}),
+]
@@ -0,0 +1,512 @@
+# -*- coding: utf-8 -*-
+__author__ = 'guti'
+
+'''
+The programme run by run.py.
+'''
+
+import sys
+import argparse
+
+import badminton_finance.core
+import badminton_finance.streams
+import config
+
+# the modules of the optional modes are imported when the mode is used, so the programme starts fast
+
+
+def load_config():
+    """
+    Load the configurations from config module.
+
+    :return: dict, configurations.
+    """
+    return dict((attr, value) for attr, value in vars(config).iteritems() if attr.isupper())
+
+# load the configuration
+_CONFIG = load_config()
+
+
+def _input_from_file(is_check, quarantine=None):
+    """
+    Get input from a file.
+    When the file is really huge or the data format is absolutely correct, please set is_check False.
+
+    :param is_check: bool, if check the input each line.
+    :param quarantine: badminton_finance.streams.Quarantine, collecting the invalid lines, None if not quarantining.
+    :return: generator, Booking parsed from each line.
+    """
+    compression = badminton_finance.streams.detect_compression(_CONFIG['INPUT_FILE_PATH'])
+    if compression is not None:
+        # the compressed file is decompressed while the lines are calculated
+        for booking in badminton_finance.streams.read_compressed(_CONFIG['INPUT_FILE_PATH'], compression, is_check,
+                                                                 quarantine, _CONFIG['COMPRESSION_MODE']):
+            yield booking
+        return
+    with open(_CONFIG['INPUT_FILE_PATH']) as f:
+        if quarantine is not None:
+            for booking in quarantine.parse_lines(f, is_check):
+                yield booking
+            return
+
+        # # a simple implement if the file is a little one
+        # info_list = f.readlines()
+        # if is_check:
+        #     map(badminton_court_cost.check_input_line, info_list)
+        # return info_list
+
+        # use generator
+        for line in f:
+            yield badminton_finance.core.parse_line(line, is_check)
+
+
+def _input_from_mmap(is_check, quarantine=None):
+    """
+    Get input from a file by memory mapping, it is faster than _input_from_file for a huge file.
+
+    :param is_check: bool, if check the input each line.
+    :param quarantine: badminton_finance.streams.Quarantine, collecting the invalid lines, None if not quarantining.
+    :return: generator, Booking parsed from each line.
+    """
+    return _read_file(_CONFIG['INPUT_FILE_PATH'], is_check, quarantine)
+
+
+def _read_file(file_path, is_check, quarantine=None):
+    """
+    Help function to read a file by memory mapping, a compressed file can not be mapped so it is read as a stream.
+    """
+    compression = badminton_finance.streams.detect_compression(file_path)
+    if compression is not None:
+        return badminton_finance.streams.read_compressed(file_path, compression, is_check, quarantine,
+                                                         _CONFIG['COMPRESSION_MODE'])
+    return badminton_finance.streams.read_mmap(file_path, is_check, quarantine)
+
+
+def _input_from_terminal(is_check, quarantine=None):
+    """
+    Type the input in the terminal, the invalid lines are printed and typed again.
+
+    :param is_check: bool, if check the input each line.
+    :param quarantine: not used, the invalid lines are not quarantined.
+    :return: list, contains the Booking parsed from each line.
+    """
+    input_list = list()
+    while True:
+        try:
+            line = raw_input()
+            if line in config.QUIT_FLAGS:
+                break
+            else:
+                input_list.append(badminton_finance.core.parse_line(line, is_check))
+        except (ValueError, AssertionError), e:
+                    print 'ERROR: ' + e.message
+        except (EOFError, KeyboardInterrupt):
+            print 'Exit the programme.'
+            break
+    return input_list
+
+_INPUT_TYPE_DICT = {'file': _input_from_file, 'terminal': _input_from_terminal, 'mmap': _input_from_mmap}
+
+
+def input_summary(quarantine=None):
+    """
+    Wrapper for input functions.
+
+    :param quarantine: badminton_finance.streams.Quarantine, collecting the invalid lines, None if not quarantining.
+    :return: iterable, list or generator.
+    """
+    input_func = _INPUT_TYPE_DICT[_CONFIG['INPUT_TYPE']]
+    return input_func(_CONFIG['IS_CHECK'], quarantine)
+
+
+def _cached_input():
+    """
+    Get input from the column cache of the input file, the cache is written if it does not match.
+
+    :return: badminton_finance.core.Columns or generator of Booking.
+    """
+    from badminton_finance import colcache
+    cache_path = _CONFIG['COLUMN_CACHE_PATH'] or _CONFIG['INPUT_FILE_PATH'] + '.colcache'
+    columns = colcache.load_columns(cache_path, _CONFIG['INPUT_FILE_PATH'], _CONFIG['IS_CHECK'])
+    if columns is not None:
+        return columns
+    return colcache.caching_bookings(input_summary(), cache_path, _CONFIG['INPUT_FILE_PATH'], _CONFIG['IS_CHECK'])
+
+
+def _file_writer(f):
+    """
+    Create a buffered writer of the output file.
+
+    :param f: file, the output file.
+    :return: badminton_finance.streams.BufferedWriter.
+    """
+    return badminton_finance.streams.BufferedWriter(f, _CONFIG['OUTPUT_BUFFER_SIZE'],
+                                                    _CONFIG['OUTPUT_FLUSH_INTERVAL'], _CONFIG['IS_FSYNC'])
+
+
+def _open_output(file_path):
+    """
+    Open an output file, it is compressed if its extension is of gzip, bz2 or xz.
+
+    :param file_path: str, path of the file.
+    :return: file or badminton_finance.streams.CompressedFile.
+    """
+    return badminton_finance.streams.open_output(file_path, _CONFIG['COMPRESSION_MODE'])
+
+
+def _ledger_path():
+    """
+    Get the file path of the ledger index.
+
+    :return: str, path of the index file.
+    """
+    return _CONFIG['LEDGER_FILE_PATH'] or _CONFIG['OUTPUT_FILE_PATH'] + '.ledger'
+
+
+def output_summary(stats=None):
+    """
+    Get a iterable object for output.
+    When the input is a really huge one, please set the is_generator True.
+
+    :param stats: badminton_finance.stats.Stats, the enabled instrumentation, None if disabled.
+    """
+    if _CONFIG['IS_INCREMENTAL'] and _CONFIG['INPUT_TYPE'] in ('file', 'mmap'):
+        from badminton_finance import incremental
+        # only calculate the lines appended since the last run
+        checkpoint_path = _CONFIG['CHECKPOINT_FILE_PATH'] or _CONFIG['OUTPUT_FILE_PATH'] + '.checkpoint'
+        incremental.summary_incremental(_CONFIG['INPUT_FILE_PATH'], _CONFIG['OUTPUT_FILE_PATH'], checkpoint_path,
+                                        _CONFIG['IS_CHECK'], _file_writer, _CONFIG['BATCH_SIZE'],
+                                        _ledger_path() if _CONFIG['IS_LEDGER'] else None)
+        return
+    # the invalid lines of the input file are sent to the quarantine file instead of aborting the run
+    quarantine_file = quarantine = None
+    if _CONFIG['QUARANTINE_FILE_PATH'] and _CONFIG['INPUT_TYPE'] in ('file', 'mmap'):
+        quarantine_file = open(_CONFIG['QUARANTINE_FILE_PATH'], 'w')
+        quarantine = badminton_finance.streams.Quarantine(quarantine_file)
+    try:
+        _write_summary(stats, quarantine)
+    finally:
+        if quarantine_file is not None:
+            quarantine_file.close()
+
+
+def _write_summary(stats, quarantine):
+    """
+    Help function to calculate the summary and write it to the output.
+
+    :param stats: badminton_finance.stats.Stats, the enabled instrumentation, None if disabled.
+    :param quarantine: badminton_finance.streams.Quarantine, collecting the invalid lines, None if not quarantining.
+    """
+    # many input files are calculated by the pool of processes, with the subtotal of each file
+    is_many_files = isinstance(_CONFIG['INPUT_FILE_PATH'], list) and _CONFIG['INPUT_TYPE'] in ('file', 'mmap')
+    # the rollups and the scenarios are collected in the same pass of the summary
+    rollups = ()
+    if _CONFIG['ROLLUPS']:
+        from badminton_finance import rollup
+        rollups = rollup.create_rollups(_CONFIG['ROLLUPS'])
+    collectors = list(rollups)
+    extreme_sessions = None
+    if _CONFIG['TOP_SESSIONS']:
+        from badminton_finance import extremes
+        extreme_sessions = extremes.ExtremeSessions(_CONFIG['TOP_SESSIONS'])
+        collectors.append(extreme_sessions)
+    scenarios = None
+    if _CONFIG['SCENARIO_FILE_PATH']:
+        from badminton_finance import scenario
+        scenarios = scenario.ScenarioCollector(scenario.load_scenarios(_CONFIG['SCENARIO_FILE_PATH']))
+        collectors.append(scenarios)
+    ledger_collector = None
+    if _CONFIG['IS_LEDGER']:
+        from badminton_finance import ledger
+        ledger_collector = ledger.LedgerCollector()
+        collectors.append(ledger_collector)
+    if is_many_files:
+        from badminton_finance import parallel
+        out_iter = parallel.summary_files(_CONFIG['INPUT_FILE_PATH'], _CONFIG['WORKERS'], _CONFIG['IS_CHECK'],
+                                          _CONFIG['BATCH_SIZE'], collectors, quarantine,
+                                          _CONFIG['COMPRESSION_MODE'])
+    elif _CONFIG['WORKERS'] > 1 and _CONFIG['INPUT_TYPE'] in ('file', 'mmap'):
+        from badminton_finance import parallel
+        # split the input file to the processes
+        out_iter = parallel.summary_parallel(_CONFIG['INPUT_FILE_PATH'], _CONFIG['WORKERS'], _CONFIG['IS_CHECK'],
+                                             _CONFIG['BATCH_SIZE'], collectors, quarantine,
+                                             _CONFIG['COMPRESSION_MODE'])
+    else:
+        # the cache only has the valid lines, so it is not used when quarantining
+        if _CONFIG['IS_COLUMN_CACHE'] and _CONFIG['INPUT_TYPE'] in ('file', 'mmap') and quarantine is None:
+            info_iter = _cached_input()
+        else:
+            info_iter = input_summary(quarantine)
+        if not isinstance(info_iter, badminton_finance.core.Columns) and not info_iter:
+            print 'Nothing for Calculation.'
+            return
+        if stats is not None and not isinstance(info_iter, badminton_finance.core.Columns):
+            info_iter = stats.timed_iter('read', info_iter)
+        # choose if using generator
+        out_iter = badminton_finance.core.generate_summary(info_iter, _CONFIG['IS_GENERATOR'],
+                                                           _CONFIG['BATCH_SIZE'], collectors, quarantine)
+    with _open_output(_CONFIG['OUTPUT_FILE_PATH']) as f:
+        # print result on the screen
+        if _CONFIG['IS_PRINT']:
+            writer = badminton_finance.streams.BufferedWriter(sys.stdout, _CONFIG['OUTPUT_BUFFER_SIZE'],
+                                                              _CONFIG['OUTPUT_FLUSH_INTERVAL'], linesep='\n')
+        else:
+            writer = _file_writer(f)
+        for line in out_iter:
+            writer.write(line)
+        # the rollups are extra sections of the summary if no report file
+        if rollups and not _CONFIG['ROLLUP_FILE_PATH']:
+            writer.write('')
+            for line in rollup.rollup_report(rollups):
+                writer.write(line)
+        if extreme_sessions is not None:
+            writer.write('')
+            for line in extreme_sessions.report():
+                writer.write(line)
+        # the comparison table of the scenarios is always the last section
+        if scenarios is not None:
+            writer.write('')
+            for line in scenarios.report():
+                writer.write(line)
+        writer.close()
+    if ledger_collector is not None:
+        index = ledger.LedgerIndex()
+        ledger_collector.flush(index)
+        index.save(_ledger_path())
+    if rollups and _CONFIG['ROLLUP_FILE_PATH']:
+        with _open_output(_CONFIG['ROLLUP_FILE_PATH']) as f:
+            writer = _file_writer(f)
+            for line in rollup.rollup_report(rollups):
+                writer.write(line)
+            writer.close()
+
+
+def serve_summary():
+    """
+    Run the streaming service, the totals are printed after it is interrupted.
+    """
+    from badminton_finance import server
+    booking_server = server.BookingServer(_CONFIG['SERVER_ADDRESS'], _CONFIG['IS_CHECK'])
+    print 'Serving on {}, send {} for the totals.'.format(_CONFIG['SERVER_ADDRESS'], server.TOTALS_COMMAND)
+    try:
+        booking_server.serve()
+    except KeyboardInterrupt:
+        print 'Exit the programme.'
+    print '\n'.join(booking_server.totals.footer())
+
+
+def query_summary(start_date_str, end_date_str):
+    """
+    Print the totals between two dates from the ledger index.
+
+    :param start_date_str: str, start date like '2016-06-04', included.
+    :param end_date_str: str, end date, included.
+    :return: bool, if the ledger index is found.
+    """
+    from badminton_finance import ledger
+    index = ledger.load_ledger(_ledger_path())
+    if index is None:
+        return False
+    print '\n'.join(ledger.query_report(index, start_date_str, end_date_str))
+    return True
+
+
+def optimize_summary():
+    """
+    Search the grid of the optimizer on the input, and print the report of the best candidates.
+    """
+    from badminton_finance import optimizer, scenario
+    line_counts = scenario.LineCounts()
+    if isinstance(_CONFIG['INPUT_FILE_PATH'], list) and _CONFIG['INPUT_TYPE'] in ('file', 'mmap'):
+        bookings = (booking for file_path in _CONFIG['INPUT_FILE_PATH']
+                    for booking in _read_file(file_path, _CONFIG['IS_CHECK']))
+    else:
+        bookings = input_summary()
+    for booking in bookings:
+        line_counts.add(booking, 0, 0, 0)
+    thresholds = _CONFIG['OPTIMIZE_THRESHOLDS']
+    report = optimizer.report(line_counts, optimizer.parse_range(_CONFIG['OPTIMIZE_FEES']),
+                              optimizer.parse_range(_CONFIG['OPTIMIZE_APPLICANTS_PER_COURT']),
+                              optimizer.parse_range(thresholds) if thresholds else None,
+                              _CONFIG['OPTIMIZE_MAX_FEE'], _CONFIG['OPTIMIZE_TOP'])
+    print '\n'.join(report)
+
+
+def main():
+    """
+    Entry of this programme.
+    """
+    # get options from args
+    parser = argparse.ArgumentParser(prog='Badminton Finance')
+
+    # version
+    parser.add_argument('-v', '--version', action='version', version='%(prog)s 0.0.1')
+
+    # config
+    parser.add_argument('-o', '--output', help='Set the output file path.')
+    parser.add_argument('-i', '--input', help='Set the input file paths, directories or globs.', nargs='+')
+    parser.add_argument('-t', '--type', help='Choose the input type: file, terminal or mmap.',
+                        choices=('file', 'terminal', 'mmap'))
+    parser.add_argument('-s', '--screen', help='Print the result to the screen', action='store_true')
+    parser.add_argument('-b', '--batch', help='Calculate the lines in chunks of the size by numpy.', type=int)
+    parser.add_argument('-w', '--workers', help='Calculate the input file by the numbers of processes.', type=int)
+    parser.add_argument('--fsync', help='Sync the output file to the disk at the end.', action='store_true')
+    parser.add_argument('--compression', help='Choose where the compressed files are decompressed and compressed.',
+                        choices=badminton_finance.streams.COMPRESSION_MODES)
+    parser.add_argument('-r', '--rollup', help='Roll up the totals by the granularities: day, week, month, weekday '
+                                               'or band.', nargs='+', metavar='GRANULARITY')
+    parser.add_argument('--rollup-file', help='Set the report file path of the rollups.')
+    parser.add_argument('--top-sessions', help='Append the numbers of the most profitable and the most loss-making '
+                                               'sessions to the output.', type=int, metavar='K')
+    parser.add_argument('--scenarios', help='Evaluate the scenarios defined in the Python file with the summary.',
+                        metavar='SCENARIO_FILE')
+    parser.add_argument('--ledger', help='Index the totals by date next to the output file for the queries.',
+                        action='store_true')
+    parser.add_argument('--query', help='Print the totals between the dates from the ledger index.', nargs=2,
+                        metavar=('START_DATE', 'END_DATE'))
+    parser.add_argument('--incremental', help='Only calculate the lines appended since the last run.',
+                        action='store_true')
+    parser.add_argument('-q', '--quarantine', help='Write the invalid lines to the file and continue.')
+    parser.add_argument('--column-cache', help='Cache the parsed input file in binary columns, or read the cache.',
+                        action='store_true')
+    parser.add_argument('--serve', help='Answer the lines from the clients of the TCP or Unix socket address.',
+                        nargs='?', const='', metavar='ADDRESS')
+    parser.add_argument('--optimize', help='Search the fee, applicants per court and threshold for the most profit '
+                                           'of the input, and print the best ones.', action='store_true')
+    parser.add_argument('--fees', help='Range START:STOP[:STEP] of the fees searched by the optimizer.')
+    parser.add_argument('--per-court', help='Range of the applicants per court searched by the optimizer.')
+    parser.add_argument('--thresholds', help='Range of the remainders ordering one more court searched by the '
+                                             'optimizer.')
+    parser.add_argument('--max-fee', help='The highest fee searched by the optimizer.', type=int)
+    parser.add_argument('--stats', help='Print the statistics of the stages, or write them to the JSON file.',
+                        nargs='?', const='', metavar='STATS_FILE')
+    parser.add_argument('--profile', help='Profile the stage: read, validation, parse, courts, tariff, batch, '
+                                          'format or write.', metavar='STAGE')
+    parser.add_argument('--profiler', help='Choose the profiler of the stage.', choices=('cprofile', 'sampling'),
+                        default='cprofile')
+    args = parser.parse_args()
+    if args.output:
+        _CONFIG['OUTPUT_FILE_PATH'] = args.output
+    if args.input:
+        _CONFIG['INPUT_FILE_PATH'] = args.input
+    if args.type:
+        _CONFIG['INPUT_TYPE'] = args.type
+    if args.screen:
+        _CONFIG['IS_PRINT'] = True
+    if args.batch is not None:
+        _CONFIG['BATCH_SIZE'] = args.batch
+    if args.workers is not None:
+        _CONFIG['WORKERS'] = args.workers
+    if args.fsync:
+        _CONFIG['IS_FSYNC'] = True
+    if args.compression:
+        _CONFIG['COMPRESSION_MODE'] = args.compression
+    if args.rollup:
+        from badminton_finance import rollup
+        for granularity in args.rollup:
+            if granularity not in rollup.GRANULARITIES:
+                parser.error('argument -r/--rollup: invalid choice: %r (choose from %s)' %
+                             (granularity, ', '.join(rollup.GRANULARITIES)))
+        _CONFIG['ROLLUPS'] = tuple(args.rollup)
+    if args.rollup_file:
+        _CONFIG['ROLLUP_FILE_PATH'] = args.rollup_file
+    if args.top_sessions is not None:
+        if args.top_sessions < 0:
+            parser.error('argument --top-sessions: K can not be negative.')
+        _CONFIG['TOP_SESSIONS'] = args.top_sessions
+    if args.scenarios:
+        _CONFIG['SCENARIO_FILE_PATH'] = args.scenarios
+    if args.ledger:
+        _CONFIG['IS_LEDGER'] = True
+    if args.incremental:
+        _CONFIG['IS_INCREMENTAL'] = True
+    if args.quarantine:
+        _CONFIG['QUARANTINE_FILE_PATH'] = args.quarantine
+    if args.column_cache:
+        _CONFIG['IS_COLUMN_CACHE'] = True
+    if args.stats is not None:
+        _CONFIG['IS_STATS'] = True
+        if args.stats:
+            _CONFIG['STATS_FILE_PATH'] = args.stats
+    # the instrumentation is only imported when it is enabled, so it costs nothing otherwise
+    if _CONFIG['IS_STATS'] or args.profile:
+        from badminton_finance import stats
+        if args.profile and args.profile not in stats.STAGES:
+            parser.error('argument --profile: invalid choice: %r (choose from %s)' %
+                         (args.profile, ', '.join(stats.STAGES)))
+        # the stages are only wrapped in this process, the processes of the pool would not be counted
+        if _CONFIG['WORKERS'] > 1:
+            parser.error('statistics and profiling are not supported by many workers.')
+    if _CONFIG['INPUT_TYPE'] in ('file', 'mmap'):
+        input_paths = _CONFIG['INPUT_FILE_PATH']
+        if isinstance(input_paths, str):
+            input_paths = [input_paths]
+        input_paths = badminton_finance.streams.expand_input_paths(input_paths, _CONFIG['INPUT_DIR_PATTERN'])
+        if not input_paths:
+            parser.error('can not find any input file.')
+        # a single file is calculated as before, without the subtotal
+        _CONFIG['INPUT_FILE_PATH'] = input_paths[0] if len(input_paths) == 1 else input_paths
+        if len(input_paths) > 1 and _CONFIG['IS_INCREMENTAL']:
+            parser.error('many input files are not supported by the incremental calculation.')
+        if _CONFIG['IS_INCREMENTAL'] and (badminton_finance.streams.detect_compression(input_paths[0]) or
+                                          badminton_finance.streams.detect_compression(_CONFIG['OUTPUT_FILE_PATH'],
+                                                                                       is_magic=False)):
+            parser.error('compressed files are not supported by the incremental calculation.')
+    if _CONFIG['IS_INCREMENTAL'] and _CONFIG['ROLLUPS']:
+        parser.error('rollups are not supported by the incremental calculation.')
+    if _CONFIG['IS_INCREMENTAL'] and _CONFIG['TOP_SESSIONS']:
+        parser.error('top sessions are not supported by the incremental calculation.')
+    if _CONFIG['IS_INCREMENTAL'] and _CONFIG['SCENARIO_FILE_PATH']:
+        parser.error('scenarios are not supported by the incremental calculation.')
+    if _CONFIG['IS_INCREMENTAL'] and _CONFIG['QUARANTINE_FILE_PATH']:
+        parser.error('quarantine is not supported by the incremental calculation.')
+    for arg, key in ((args.fees, 'OPTIMIZE_FEES'), (args.per_court, 'OPTIMIZE_APPLICANTS_PER_COURT'),
+                     (args.thresholds, 'OPTIMIZE_THRESHOLDS'), (args.max_fee, 'OPTIMIZE_MAX_FEE')):
+        if arg is not None:
+            _CONFIG[key] = arg
+    if args.query:
+        try:
+            if not query_summary(*args.query):
+                parser.error('can not find the ledger index %s, run with --ledger first.' % _ledger_path())
+        except ValueError, e:
+            parser.error(str(e))
+        return
+    if args.optimize:
+        optimize_summary()
+        return
+    if args.serve is not None:
+        if args.serve:
+            _CONFIG['SERVER_ADDRESS'] = args.serve
+        serve_summary()
+        return
+
+    # call the output function, with the instrumentation if required
+    if not _CONFIG['IS_STATS'] and not args.profile:
+        output_summary()
+        return
+    import cProfile
+    import pstats
+    recorder = stats.Stats()
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile() if args.profiler == 'cprofile' else stats.SamplingProfiler()
+        recorder.profile(args.profile, profiler)
+    recorder.enable()
+    try:
+        output_summary(recorder)
+    finally:
+        recorder.disable()
+    if isinstance(profiler, cProfile.Profile):
+        # pstats can not print a profiler which has never run
+        if profiler.getstats():
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(20)
+        else:
+            sys.stderr.write('The stage %s is not run.\n' % args.profile)
+    elif profiler is not None:
+        profiler.stop()
+        profiler.print_stats()
+    if _CONFIG['STATS_FILE_PATH']:
+        recorder.dump(_CONFIG['STATS_FILE_PATH'])
+    elif _CONFIG['IS_STATS']:
+        sys.stderr.write('\n'.join(recorder.format_report()) + '\n')
+
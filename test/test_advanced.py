@@ -3,13 +3,36 @@ __author__ = 'guti'
 
 from context import core
 
+import os
+import shutil
+import tempfile
 import unittest
 
 
+def make_lines(numbers, is_quarter=False, is_yearly=False):
+    """
+    Help function to make the lines of the tests, in June and on the hour by default.
+
+    :param numbers: int, numbers of the lines.
+    :param is_quarter: bool, if the sessions start at the quarters of the hours.
+    :param is_yearly: bool, if the dates are in every month of the year.
+    :return: list, formed by string of ordering information.
+    """
+    return ['2016-%02d-%02d %02d:%02d~22:00 %d' % (day % 12 + 1 if is_yearly else 6, day % 28 + 1, 9 + day % 13,
+                                                  day % 4 * 15 if is_quarter else 0, day % 40)
+            for day in range(numbers)]
+
+
 class AdvancedTestSuite(unittest.TestCase):
     """
     Advanced test cases for exception.
     """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
     def check_input_line_test(self):
         with self.assertRaises(ValueError):
             core.check_input_line('2016-02-30 09:00~11:00 7')
@@ -20,6 +43,462 @@ class AdvancedTestSuite(unittest.TestCase):
         with self.assertRaises(AssertionError):
             core.check_input_line('2016-10-31 10:00~09:00 11')
 
+    def test_parse_line(self):
+        line = '2016-06-02 20:00~22:00 7'
+        assert core.parse_line(line, is_check=True) == core.parse_line(line)
+        with self.assertRaises(ValueError):
+            core.parse_line('2016-02-30 09:00~11:00 7', is_check=True)
+        with self.assertRaises(ValueError):
+            core.parse_line('2016-10-01 0s8:00~11:00 4', is_check=True)
+        with self.assertRaises(ValueError):
+            core.parse_line('2016-10-20 09:00~22:00 a', is_check=True)
+        with self.assertRaises(ValueError):
+            core.parse_line('', is_check=True)
+        with self.assertRaises(AssertionError):
+            core.parse_line('2016-10-31 10:00~09:00 11', is_check=True)
+
+    def test_summary_parallel(self):
+        from badminton_finance import parallel
+        lines = make_lines(300)
+        file_path = os.path.join(self.temp_dir, 'input.txt')
+        with open(file_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        offsets = parallel.file_chunks(file_path, 7)
+        assert offsets[0][0] == 0 and offsets[-1][1] == os.path.getsize(file_path)
+        assert list(parallel.summary_parallel(file_path, 3, True)) == core.info_rows(lines)
+
+    def test_summary_files(self):
+        from badminton_finance import parallel, rollup, streams
+        lines = make_lines(90)
+        for name, part in (('b.txt', lines[:40]), ('a.txt', lines[40:]), ('c.txt', []), ('notes.md', ['x'])):
+            with open(os.path.join(self.temp_dir, name), 'w') as f:
+                f.write(''.join(line + '\n' for line in part))
+        file_paths = streams.expand_input_paths([os.path.join(self.temp_dir, 'b.txt'), self.temp_dir,
+                                                 os.path.join(self.temp_dir, '*.md')], '*.txt')
+        assert [os.path.basename(path) for path in file_paths] == ['b.txt', 'a.txt', 'c.txt', 'notes.md']
+        # the compressed files in a directory are read by the default patterns
+        compressed_dir = os.path.join(self.temp_dir, 'compressed')
+        os.mkdir(compressed_dir)
+        for name in ('b.txt.gz', 'a.bz2', 'c.xz', 'notes.md'):
+            open(os.path.join(compressed_dir, name), 'w').close()
+        assert [os.path.basename(path) for path in streams.expand_input_paths(
+            [compressed_dir], ('*.txt', '*.gz', '*.bz2', '*.xz'))] == ['a.bz2', 'b.txt.gz', 'c.xz']
+        file_paths = file_paths[:3]
+        summary = list(parallel.summary_files(file_paths, 1, True))
+        # the same output by the pool of processes, whichever process finishes first
+        assert list(parallel.summary_files(file_paths, 3, True)) == summary
+        assert summary[-3:] == core.info_rows(lines)[-3:]
+        first = core.info_rows(lines[:40])
+        assert summary[2:43] == ['[File %s]' % file_paths[0]] + first[2:-4]
+        income, payment, profit = [line.split()[-1] for line in first[-3:]]
+        assert summary[43] == 'Subtotal: +%s -%s %s' % (income, payment, profit)
+        assert summary[-7:-4] == ['', '[File %s]' % file_paths[2], 'Subtotal: +0 -0 0']
+        expected = rollup.Rollup('month')
+        core.info_rows(lines, collectors=[expected])
+        for workers in (1, 3):
+            collected = rollup.Rollup('month')
+            list(parallel.summary_files(file_paths, workers, True, collectors=[collected]))
+            assert collected.groups == expected.groups
+
+    def test_compressed_streams(self):
+        import gzip
+        import zlib
+        from badminton_finance import parallel, rollup, streams
+        lines = make_lines(90)
+        bookings = [core.parse_line(line) for line in lines]
+        # the file of gzip has two concatenated streams, and no extension
+        gzip_path = os.path.join(self.temp_dir, 'venue')
+        for part, mode in ((lines[:50], 'wb'), (lines[50:], 'ab')):
+            f = gzip.open(gzip_path, mode)
+            f.write(''.join(line + '\n' for line in part))
+            f.close()
+        file_paths = [gzip_path]
+        for name in ('venue.bz2', 'venue.xz'):
+            file_paths.append(os.path.join(self.temp_dir, name))
+            with streams.open_output(file_paths[-1]) as f:
+                f.write('\n'.join(lines))
+        assert [streams.detect_compression(path) for path in file_paths] == ['gzip', 'bz2', 'xz']
+        sizes = streams.COMPRESSED_READ_SIZE, streams.DECOMPRESSED_BLOCK_SIZE
+        for file_path in file_paths:
+            compression = streams.detect_compression(file_path)
+            for mode in streams.COMPRESSION_MODES:
+                assert list(streams.read_compressed(file_path, compression, True, mode=mode)) == bookings
+            # the lines are cut by the small blocks
+            streams.COMPRESSED_READ_SIZE, streams.DECOMPRESSED_BLOCK_SIZE = 7, 10
+            try:
+                assert list(streams.read_compressed(file_path, compression, True)) == bookings
+            finally:
+                streams.COMPRESSED_READ_SIZE, streams.DECOMPRESSED_BLOCK_SIZE = sizes
+            # stop reading in the middle
+            for booking in streams.read_compressed(file_path, compression, True):
+                break
+            assert list(parallel.summary_parallel(file_path, 2, True)) == core.info_rows(lines)
+        # the compressed files are calculated batch by batch, with a plain file by the pool
+        plain_path = os.path.join(self.temp_dir, 'venue.txt')
+        with open(plain_path, 'w') as f:
+            f.write('\n'.join(lines))
+        expected = rollup.Rollup('month')
+        summary = list(parallel.summary_files([plain_path] * 2, 1, True, collectors=[expected]))
+        batch_lines = parallel.STREAM_BATCH_LINES
+        parallel.STREAM_BATCH_LINES = 7
+        try:
+            for workers in (1, 2):
+                collected = rollup.Rollup('month')
+                rows = list(parallel.summary_files([file_paths[1], plain_path], workers, True,
+                                                   collectors=[collected]))
+                assert rows == summary[:2] + ['[File %s]' % file_paths[1]] + summary[3:]
+                assert collected.groups == expected.groups
+        finally:
+            parallel.STREAM_BATCH_LINES = batch_lines
+        with open(os.path.join(self.temp_dir, 'broken.gz'), 'wb') as f:
+            f.write(open(gzip_path, 'rb').read()[:-30] + 'x' * 30)
+        for mode in streams.COMPRESSION_MODES:
+            with self.assertRaises((IOError, zlib.error)):
+                list(streams.read_compressed_lines(f.name, 'gzip', mode))
+        # the compressed stream is finished before the file is synced to the disk
+        for mode in streams.COMPRESSION_MODES:
+            synced_path = os.path.join(self.temp_dir, 'synced.xz')
+            f = streams.open_output(synced_path, mode)
+            writer = streams.BufferedWriter(f, 1024, is_fsync=True, linesep='\n')
+            for line in lines:
+                writer.write(line)
+            writer.close()
+            assert list(streams.read_compressed_lines(synced_path, 'xz')) == lines
+            f.close()
+
+    def test_read_mmap(self):
+        from badminton_finance import streams
+        lines = ['2016-06-02 20:00~22:00 7', '2016-06-03 9:00~12:00 14', '2016-06-04 14:00~17:00 22']
+        file_path = os.path.join(self.temp_dir, 'input.txt')
+        with open(file_path, 'w') as f:
+            f.write('\r\n'.join(lines))
+        assert list(streams.read_mmap(file_path, False)) == [core.parse_line(line) for line in lines]
+        with self.assertRaises(ValueError):
+            list(streams.read_mmap(file_path, True))
+
+    def test_quarantine(self):
+        from badminton_finance import parallel, streams
+        lines = make_lines(30)
+        lines[3], lines[17], lines[29] = '2016-02-30 09:00~11:00 7', 'bad line', '2016-10-31 10:00~09:00 11'
+        valid = [line for index, line in enumerate(lines) if index not in (3, 17, 29)]
+        quarantine = streams.Quarantine()
+        rows = core.info_rows(quarantine.parse_lines(lines, True), quarantine=quarantine)
+        assert rows == core.info_rows(valid) + ['Rejected: 3']
+        assert [entry[0] for entry in quarantine.entries] == [4, 18, 30]
+        assert quarantine.entries[1] == (18, 'bad line', 'Input string is not match the format.')
+        file_path = os.path.join(self.temp_dir, 'input.txt')
+        with open(file_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        mmap_quarantine = streams.Quarantine()
+        assert core.info_rows(streams.read_mmap(file_path, True, mmap_quarantine),
+                              quarantine=mmap_quarantine) == rows
+        assert mmap_quarantine.entries == quarantine.entries
+        parallel_quarantine = streams.Quarantine()
+        assert list(parallel.summary_parallel(file_path, 3, True, quarantine=parallel_quarantine)) == rows
+        assert parallel_quarantine.entries == quarantine.entries
+        # without checking, the lines which can not be calculated are collected too,
+        # and the lines are only split by the line separator
+        lines[3], lines[17], lines[29] = '2016-06-02 07:00~10:00 7', 'bad\x0cline', 'bad\rline'
+        with open(file_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        quarantine = streams.Quarantine()
+        rows = core.info_rows(quarantine.parse_lines(lines, False), 2, quarantine=quarantine)
+        assert rows == core.info_rows(valid) + ['Rejected: 3']
+        assert [entry[0] for entry in quarantine.entries] == [4, 18, 30]
+        for read in (lambda each: streams.read_mmap(file_path, False, each),
+                     lambda each: each.parse_lines(open(file_path), False)):
+            each_quarantine = streams.Quarantine()
+            assert core.info_rows(read(each_quarantine), quarantine=each_quarantine) == rows
+            assert each_quarantine.entries == quarantine.entries
+        parallel_quarantine = streams.Quarantine()
+        assert list(parallel.summary_parallel(file_path, 3, False, quarantine=parallel_quarantine)) == rows
+        assert parallel_quarantine.entries == quarantine.entries
+
+    def test_rollups(self):
+        from badminton_finance import rollup
+        lines = make_lines(300)
+        rollups = rollup.create_rollups(rollup.GRANULARITIES)
+        summary = core.info_rows(lines, collectors=rollups)
+        # the bands are split exactly, so every rollup adds up to the totals
+        footer = summary[-3:]
+        for each in rollups:
+            totals = [sum(group[i] for group in each.groups.values()) for i in range(3)]
+            assert core.summary_footer(*totals)[1:] == footer
+        merged = rollup.Rollup('month')
+        for half in (lines[:150], lines[150:]):
+            part = rollup.Rollup('month')
+            core.info_rows(half, collectors=[part])
+            merged.merge(part)
+        assert merged.groups == rollups[2].groups
+        # the bands are the same whichever parts are merged first
+        parts = [rollup.BandRollup() for _ in range(3)]
+        for part, third in zip(parts, (lines[:100], lines[100:200], lines[200:])):
+            core.info_rows(third, collectors=[part])
+        merged = rollup.BandRollup()
+        for part in parts:
+            merged.merge(part)
+        parts[1].merge(parts[2])
+        parts[0].merge(parts[1])
+        assert merged.groups == parts[0].groups == rollups[4].groups
+
+    def test_extreme_sessions(self):
+        from badminton_finance import extremes
+        lines = make_lines(300, is_quarter=True, is_yearly=True)
+        extreme_sessions = extremes.ExtremeSessions(7)
+        results = list(core.info_results(core.parse_line(line, True) for line in lines))
+        for booking, inc, pay, pro, _ in results:
+            extreme_sessions.add(booking, inc, pay, pro)
+        assert len(extreme_sessions.top) == len(extreme_sessions.bottom) == 7
+        # the same as sorting all sessions by profit, then by date, start, end and applicants
+        ordered = sorted(results, key=lambda result: (-result[3],) + result[0][1:])
+        reversed_ordered = sorted(results, key=lambda result: (result[3],) + result[0][1:])
+        report = extreme_sessions.report()
+        assert report[2:9] == [result[0].time + result[4] for result in ordered[:7]]
+        assert report[12:] == [result[0].time + result[4] for result in reversed_ordered[:7]]
+        merged = extremes.ExtremeSessions(7)
+        for half in (results[150:], results[:150]):
+            part = extremes.ExtremeSessions(7)
+            for booking, inc, pay, pro, _ in half:
+                part.add(booking, inc, pay, pro)
+            merged.merge(part)
+        assert merged.report() == report
+
+    def test_scenarios(self):
+        from badminton_finance import helpers, scenario
+        lines = make_lines(300, is_quarter=True)
+        overrides_list = [{'CHARGE_STRATEGY': {('Mon', 'Tue', 'Wed', 'Thu', 'Fri'): {('20:00', '22:00'): 70}}},
+                          {'CHARGE_STRATEGY': {('Mon', 'Tue', 'Wed', 'Thu', 'Fri'): {('19:00', '22:00'): 100}}},
+                          {'INCOMES_PER_APPLICANT': 35}, {'APPLICANTS_PER_COURT': 5}]
+        collector = scenario.ScenarioCollector([scenario.Scenario(str(i), overrides)
+                                                for i, overrides in enumerate(overrides_list)])
+        summary = core.info_rows(lines, collectors=[collector])
+        results = collector.evaluate()
+        assert summary[-3:] == core.summary_footer(*results[0][1][1:])[1:]
+        # each scenario is the same as calculating the lines again with the strategies in helpers
+        for each, totals in results[1:]:
+            saved = dict((key, getattr(helpers, key)) for key in scenario.SCENARIO_KEYS)
+            try:
+                for key in scenario.SCENARIO_KEYS:
+                    setattr(helpers, key, getattr(each, key.lower()))
+                assert core.info_rows(lines)[-3:] == core.summary_footer(*totals[1:])[1:]
+            finally:
+                for key, value in saved.iteritems():
+                    setattr(helpers, key, value)
+        merged = scenario.ScenarioCollector(collector.scenarios[1:])
+        for half in (lines[:150], lines[150:]):
+            part = scenario.ScenarioCollector(collector.scenarios[1:])
+            core.info_rows(half, collectors=[part])
+            merged.merge(part)
+        assert merged.counts == collector.counts
+        # the override replaces the charges of the hours it covers
+        collector = scenario.ScenarioCollector([scenario.Scenario('evening', overrides_list[1])])
+        collector.add(core.parse_line('2016-06-02 19:00~22:00 7'), 0, 0, 0)
+        assert collector.evaluate()[1][1] == (1, 210, 600, -390)
+        with self.assertRaises(AssertionError):
+            helpers.check_charge_strategy({('Sat', 'Sun'): {('09:00', '12:00'): 40, ('11:00', '13:00'): 50}})
+        # a day can not be in two week groups
+        with self.assertRaises(AssertionError):
+            scenario.Scenario('saturday', {'CHARGE_STRATEGY': {('Sat', ): {('09:00', '12:00'): 40}}}).compile()
+
+    def test_optimizer(self):
+        from badminton_finance import helpers, optimizer, scenario
+        lines = make_lines(300, is_quarter=True)
+        line_counts = scenario.LineCounts()
+        for line in lines:
+            line_counts.add(core.parse_line(line, True), 0, 0, 0)
+        candidates, infeasible = optimizer.search(line_counts, range(20, 41), [4, 5, 6, 7], [3, 4, 5], max_fee=33)
+        assert len(candidates) == 14 * 4 * 3 and infeasible == 0
+        assert max(candidate.fee for candidate in candidates) == 33
+        profits = [candidate.profit for candidate in candidates]
+        assert profits == sorted(profits, reverse=True)
+        # each candidate is the same as evaluating the strategies of it
+        checked = candidates[:3] + candidates[-3:]
+        collector = scenario.ScenarioCollector([scenario.Scenario(str(i), {
+            'INCOMES_PER_APPLICANT': candidate.fee, 'APPLICANTS_PER_COURT': candidate.applicants_per_court,
+            'ODER_STRATEGY': optimizer.split_oder_strategy(helpers.ODER_STRATEGY, candidate.threshold)})
+            for i, candidate in enumerate(checked)])
+        collector.merge(line_counts)
+        for candidate, (_, totals) in zip(checked, collector.evaluate()[1:]):
+            assert totals[1:] == (candidate.income, candidate.payment, candidate.profit)
+        # the oder strategy can not be compiled for 8 applicants per court is infeasible
+        oder_strategy = helpers.ODER_STRATEGY
+        try:
+            helpers.ODER_STRATEGY = {(0, None): {(0, 5): 'same'}}
+            candidates, infeasible = optimizer.search(line_counts, [30, 40], [6, 8])
+            assert len(candidates) == 2 and infeasible == 2
+        finally:
+            helpers.ODER_STRATEGY = oder_strategy
+
+    def test_summary_incremental(self):
+        from badminton_finance import incremental, streams, helpers
+        lines = make_lines(30)
+        input_path, output_path, checkpoint_path = [os.path.join(self.temp_dir, name) for name in ('in', 'out', 'cp')]
+
+        def writer_factory(f):
+            return streams.BufferedWriter(f, 1024, linesep='\n')
+
+        def run():
+            return incremental.summary_incremental(input_path, output_path, checkpoint_path, True, writer_factory)
+
+        with open(input_path, 'w') as f:
+            f.write('\n'.join(lines[:20]) + '\n' + lines[20])
+        assert run() == 20
+        with open(input_path, 'a') as f:
+            f.write('\n' + '\n'.join(lines[21:]) + '\n')
+        assert run() == 10
+        with open(output_path) as f:
+            assert f.read().splitlines() == core.info_rows(lines)
+        # the checkpoint is not used after the strategies changed
+        checkpoint = incremental.load_checkpoint(checkpoint_path)
+        checkpoint['strategy_hash'] = helpers.strategy_hash()[::-1]
+        incremental.save_checkpoint(checkpoint_path, checkpoint)
+        assert run() == 30
+        # the last line without line separator is calculated when the input has not changed since the last run
+        with open(input_path, 'w') as f:
+            f.write('\n'.join(lines[:20]))
+        assert run() == 19
+        assert run() == 1
+        assert run() == 0
+        with open(output_path) as f:
+            assert f.read().splitlines() == core.info_rows(lines[:20])
+        with open(input_path, 'a') as f:
+            f.write('\n' + '\n'.join(lines[20:]) + '\n')
+        assert run() == 10
+        with open(output_path) as f:
+            assert f.read().splitlines() == core.info_rows(lines)
+        # everything is recalculated if the calculated line is continued
+        with open(input_path, 'w') as f:
+            f.write('\n'.join(lines[:20]))
+        run()
+        run()
+        with open(input_path, 'a') as f:
+            f.write('0\n' + '\n'.join(lines[20:]) + '\n')
+        assert run() == 30
+        with open(output_path) as f:
+            assert f.read().splitlines() == core.info_rows(lines[:19] + [lines[19] + '0'] + lines[20:])
+
+    def test_ledger(self):
+        from badminton_finance import incremental, ledger, streams
+        lines = make_lines(300, is_quarter=True, is_yearly=True)
+        collector = ledger.LedgerCollector()
+        rows = core.info_rows(lines, collectors=[collector])
+        index = ledger.LedgerIndex()
+        collector.flush(index)
+        for start_date_str, end_date_str in (('2016-06-04', '2016-09-30'), ('2015-01-01', '2016-03-01'),
+                                             ('2016-02-29', '2016-02-29'), ('2016-12-31', '2016-01-01')):
+            selected = [line for line in lines if start_date_str <= line[:10] <= end_date_str]
+            expected = core.info_rows(selected)[-3:] if selected else core.summary_footer(0, 0, 0)[1:]
+            report = ledger.query_report(index, start_date_str, end_date_str)
+            assert report[1:] == ['Lines: %d' % len(selected)] + expected
+        assert rows[-3:] == core.summary_footer(*index.totals()[1:])[1:]
+        input_path, output_path, checkpoint_path, ledger_path = [os.path.join(self.temp_dir, name)
+                                                                 for name in ('in', 'out', 'cp', 'ledger')]
+
+        def writer_factory(f):
+            return streams.BufferedWriter(f, 1024, linesep='\n')
+
+        # the index is appended by the incremental calculation, the dates are not in order
+        for part in (lines[:100], lines[100:]):
+            with open(input_path, 'a') as f:
+                f.write('\n'.join(part) + '\n')
+            incremental.summary_incremental(input_path, output_path, checkpoint_path, True, writer_factory,
+                                            ledger_path=ledger_path)
+        saved = ledger.load_ledger(ledger_path)
+        assert saved.totals() == index.totals()
+        assert saved.query(ledger.date_ordinal('2016-06-04'), ledger.date_ordinal('2016-09-30')) == \
+            index.query(ledger.date_ordinal('2016-06-04'), ledger.date_ordinal('2016-09-30'))
+
+    def test_column_cache(self):
+        from badminton_finance import colcache
+        lines = make_lines(30)
+        input_path, cache_path = os.path.join(self.temp_dir, 'in'), os.path.join(self.temp_dir, 'in.colcache')
+        with open(input_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        assert colcache.load_columns(cache_path, input_path, True) is None
+        bookings = colcache.caching_bookings((core.parse_line(line, True) for line in lines), cache_path,
+                                             input_path, True)
+        assert core.info_rows(bookings) == core.info_rows(lines)
+        columns = colcache.load_columns(cache_path, input_path, True)
+        assert core.info_rows(columns) == core.info_rows(lines)
+        assert core.info_rows(columns, 7) == core.info_rows(lines)
+        # the cache is not used after the input file changed
+        with open(input_path, 'a') as f:
+            f.write(lines[0] + '\n')
+        assert colcache.load_columns(cache_path, input_path, True) is None
+
+    def test_server(self):
+        import socket
+        from badminton_finance import server
+        lines = ['2016-06-02 20:00~22:00 7', '2016-06-03 09:00~12:00 14']
+        booking_server = server.BookingServer(os.path.join(self.temp_dir, 'sock'), True)
+        client = socket.socket(socket.AF_UNIX)
+        try:
+            client.connect(booking_server.address)
+            client.sendall('\n'.join(lines + ['bad line', server.TOTALS_COMMAND, server.QUIT_COMMAND]) + '\n')
+            booking_server.serve(count=3)
+            answers = client.makefile().read().splitlines()
+            assert answers[:2] == core.info_rows(lines)[2:4]
+            assert answers[2].startswith('ERROR: ')
+            assert answers[3:7] == core.info_rows(lines)[-3:] + ['Rejected: 1']
+            assert booking_server.totals.rejected == 1
+        finally:
+            client.close()
+            booking_server.close_all()
+        # without checking, the line can not be calculated is rejected, and a line without end closes the connection
+        booking_server = server.BookingServer(os.path.join(self.temp_dir, 'sock'), False)
+        client = socket.socket(socket.AF_UNIX)
+        try:
+            client.connect(booking_server.address)
+            client.sendall('2016-06-02 20:00~22:00 -3\n' + lines[0] + '\n' + 'x' * (server.MAX_LINE_SIZE + 1))
+            booking_server.serve(count=5)
+            answers = client.makefile().read().splitlines()
+            assert answers[0].startswith('ERROR: ') and answers[1] == core.info_rows(lines)[2]
+            assert answers[2].startswith('ERROR: ') and len(answers) == 3
+            assert booking_server.totals.rejected == 2
+        finally:
+            client.close()
+            booking_server.close_all()
+        # only the socket left by a former service is removed, never the other files
+        file_path = os.path.join(self.temp_dir, 'input.txt')
+        with open(file_path, 'w') as f:
+            f.write(lines[0] + '\n')
+        with self.assertRaises(socket.error):
+            server.BookingServer(file_path, True)
+        assert os.path.exists(file_path)
+        booking_server = server.BookingServer(os.path.join(self.temp_dir, 'sock'), True)
+        os.rename(file_path, booking_server.address)
+        booking_server.close_all()
+        assert os.path.exists(booking_server.address)
+
+    def test_booking_generator(self):
+        from benchmarks.generator import booking_lines
+        lines = list(booking_lines(2000, seed=3))
+        assert lines == list(booking_lines(2000, seed=3))
+        for line in lines:
+            core.check_input_line(line)
+
+    def test_stats(self):
+        from badminton_finance import stats
+        lines = ['2016-06-02 20:00~22:00 7', '2016-06-03 09:00~12:00 14']
+        parse_line = core.parse_line
+        # the results are not cached, so the charges are calculated
+        core.refresh_strategies(is_force=True)
+        recorder = stats.Stats()
+        recorder.enable()
+        try:
+            rows = core.info_rows(recorder.timed_iter('read', lines))
+            core.info_rows(lines, chunk_size=2)
+        finally:
+            recorder.disable()
+        assert core.parse_line is parse_line
+        assert rows == core.info_rows(lines)
+        report = recorder.report()
+        assert report['lines'] == 2
+        assert report['stages']['parse']['calls'] == 4
+        assert report['stages']['read']['self_seconds'] <= report['stages']['read']['total_seconds']
+        # the lookups of the charge tables of the lines, the charges of them, and the charges of the chunk
+        assert report['stages']['tariff']['calls'] == 2 + 2 + 1
+
     def payment_list_test(self):
         from copy import deepcopy
         strategy = deepcopy(core.CHARGE_STRATEGY[('Sat', 'Sun')])
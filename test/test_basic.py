@@ -43,6 +43,167 @@ class BasicTestSuite(unittest.TestCase):
         time_range = '19:00~22:00'
         assert core.payment_list(time_range, strategy) == [(3, 60)]
 
+    def test_courts_table(self):
+        from badminton_finance.helpers import resolve_courts
+        table = core.CourtsTable(core.ODER_STRATEGY, core.APPLICANTS_PER_COURT, 64)
+        for applicants in range(table.size * 2):
+            assert table.courts(applicants) == resolve_courts(applicants, core.ODER_STRATEGY,
+                                                              core.APPLICANTS_PER_COURT)
+        for applicants in range(core.COURTS_TABLE_SIZE):
+            assert core.courts(applicants) == resolve_courts(applicants, core.ODER_STRATEGY,
+                                                             core.APPLICANTS_PER_COURT)
+        with self.assertRaises(AttributeError):
+            table.courts(-1)
+
+    def test_day_of_week(self):
+        import datetime
+        date = datetime.date(2016, 1, 1)
+        for i in range(800):
+            day = date + datetime.timedelta(days=i)
+            assert core.day_of_week(day.isoformat()) == core.WEEK_STRS[day.weekday()]
+        with self.assertRaises(ValueError):
+            core.day_of_week('2016-02-30')
+
+    def test_date_cache(self):
+        stats = core.date_cache_stats()
+        for _ in range(3):
+            core.charge_table_of_date('2016-06-04')
+        new_stats = core.date_cache_stats()
+        assert new_stats['hits'] - stats['hits'] >= 2
+        assert new_stats['size'] <= core.DATE_CACHE_SIZE
+
+    def test_charge_table(self):
+        for week, strategy in core.CHARGE_STRATEGY.iteritems():
+            table = core.ChargeTable(strategy)
+            for start in range(9, 22):
+                for end in range(start + 1, 23):
+                    brute_force = sum(charge for hour in range(start, end) for (start_k, end_k), charge
+                                      in strategy.iteritems() if int(start_k[:2]) <= hour < int(end_k[:2]))
+                    assert table.cost(start * 60, end * 60) == brute_force
+                    assert sum(hours for hours, _ in table.payment_list(start * 60, end * 60)) == end - start
+        with self.assertRaises(ValueError):
+            core.ChargeTable(core.CHARGE_STRATEGY[('Sat', 'Sun')]).cost(480, 600)
+
+    def test_minute_charge_table(self):
+        import random
+        from badminton_finance import helpers
+        random.seed(11)
+        # bands of 5 to 45 minutes from 09:00 to 22:00, and the strategies in helpers
+        strategies = list(core.CHARGE_STRATEGY.itervalues())
+        for _ in range(5):
+            strategy, minute = dict(), 540
+            while minute < 1320:
+                end = min(1320, minute + random.choice([5, 15, 30, 45]))
+                strategy[('%02d:%02d' % divmod(minute, 60), '%02d:%02d' % divmod(end, 60))] = random.randint(1, 99)
+                minute = end
+            strategies.append(strategy)
+        for strategy in strategies:
+            table = core.ChargeTable(strategy)
+            for _ in range(300):
+                start = random.randint(540, 1319)
+                end = random.randint(start + 1, 1320)
+                assert table.cost(start, end) == helpers.reference_cost(strategy, start, end)
+        with self.assertRaises(ValueError):
+            core.ChargeTable(core.CHARGE_STRATEGY[('Sat', 'Sun')]).cost(530, 600)
+
+    def test_info_batch(self):
+        import random
+        random.seed(7)
+        lines = list()
+        for _ in range(500):
+            start = random.randint(9, 21)
+            lines.append('2016-%02d-%02d %02d:00~%02d:00 %d' % (random.randint(1, 12), random.randint(1, 28), start,
+                                                               random.randint(start + 1, 22),
+                                                               random.randint(0, core.COURTS_TABLE_SIZE * 2)))
+        for _ in range(500):
+            start = random.randint(540, 1319)
+            end = random.randint(start + 1, 1320)
+            lines.append('2016-%02d-%02d %02d:%02d~%02d:%02d %d' % ((random.randint(1, 12), random.randint(1, 28)) +
+                                                                  divmod(start, 60) + divmod(end, 60) +
+                                                                  (random.randint(0, 40), )))
+        assert core.info_rows(lines, chunk_size=64) == core.info_rows(lines)
+
+    def test_result_cache(self):
+        from badminton_finance import helpers
+        lines = ['2016-06-02 20:00~22:00 7', '2016-06-09 20:00~22:00 7']
+        stats = core.result_cache_stats()
+        assert core.info_rows(lines)[2:4] == ['2016-06-02 20:00~22:00 +210 -240 -30',
+                                              '2016-06-09 20:00~22:00 +210 -240 -30']
+        assert core.result_cache_stats()['hits'] > stats['hits']
+        # the cache is invalidated when the strategies change
+        strategy = helpers.CHARGE_STRATEGY[('Mon', 'Tue', 'Wed', 'Thu', 'Fri')]
+        strategy[('20:00', '22:00')] = 70
+        try:
+            assert core.info_rows(lines)[2] == '2016-06-02 20:00~22:00 +210 -280 -70'
+        finally:
+            strategy[('20:00', '22:00')] = 60
+        assert core.info_rows(lines)[2] == '2016-06-02 20:00~22:00 +210 -240 -30'
+        # a single line is calculated by the strategies of the last refresh
+        strategy[('20:00', '22:00')] = 70
+        helpers.INCOMES_PER_APPLICANT = 35
+        try:
+            assert core.info_single(lines[0]) == ('2016-06-02 20:00~22:00', 210, 240, -30)
+            assert core.refresh_strategies()
+            assert core.info_single(lines[0]) == ('2016-06-02 20:00~22:00', 245, 280, -35)
+            assert core.income(2) == 70
+        finally:
+            strategy[('20:00', '22:00')] = 60
+            helpers.INCOMES_PER_APPLICANT = 30
+        core.refresh_strategies()
+        assert core.info_single(lines[0]) == ('2016-06-02 20:00~22:00', 210, 240, -30)
+        assert core.income(2) == 60
+
+    def test_session_info(self):
+        import sys
+        info = core.info_single('2016-06-02 20:00~22:00 7')
+        assert info == ('2016-06-02 20:00~22:00', 210, 240, -30)
+        assert (info['time'], info['income'], info['payment'], info['profit']) == tuple(info)
+        with self.assertRaises(KeyError):
+            info['count']
+        # the methods of the dict it replaces
+        as_dict = dict(time=info.time, income=info.income, payment=info.payment, profit=info.profit)
+        assert dict(info.items()) == as_dict and sorted(info.keys()) == sorted(as_dict)
+        assert sorted(info.values()) == sorted(as_dict.values())
+        assert info.get('profit') == -30 and info.get('count') is None and info.get('count', 0) == 0
+        assert 'payment' in info and 'count' not in info
+        with self.assertRaises(AttributeError):
+            info.profit = 0
+        # smaller than the dict it replaces
+        assert sys.getsizeof(info) < sys.getsizeof(as_dict)
+
+    def test_compiled_strategies(self):
+        import os
+        import shutil
+        import tempfile
+        from badminton_finance import helpers
+        temp_dir = tempfile.mkdtemp()
+        compiled_path = helpers.COMPILED_STRATEGIES_PATH
+        helpers.COMPILED_STRATEGIES_PATH = os.path.join(temp_dir, 'cache', 'compiled')
+        try:
+            courts_table, charge_tables = helpers.compile_strategies(helpers.strategy_key())
+            assert os.path.exists(helpers.COMPILED_STRATEGIES_PATH)
+            loaded_courts_table, loaded_charge_tables = helpers.compile_strategies(helpers.strategy_key())
+            assert loaded_courts_table.table == courts_table.table
+            assert loaded_courts_table.courts(1000 * 6 + 5) == courts_table.courts(1000 * 6 + 5)
+            assert loaded_charge_tables['Sat'].cumulative == charge_tables['Sat'].cumulative
+            assert loaded_charge_tables['Sat'] is loaded_charge_tables['Sun']
+            assert loaded_charge_tables['Mon'].cost(600, 780) == charge_tables['Mon'].cost(600, 780)
+            # a broken file is compiled again
+            with open(helpers.COMPILED_STRATEGIES_PATH, 'wb') as f:
+                f.write('broken')
+            assert helpers.compile_strategies(helpers.strategy_key())[0].table == courts_table.table
+            # the strategies are checked when they are compiled
+            strategy = helpers.CHARGE_STRATEGY[('Sat', 'Sun')]
+            strategy[('15:00', '12:00')] = 50
+            try:
+                with self.assertRaises(AssertionError):
+                    helpers.compile_strategies(helpers.strategy_key())
+            finally:
+                del strategy[('15:00', '12:00')]
+        finally:
+            helpers.COMPILED_STRATEGIES_PATH = compiled_path
+            shutil.rmtree(temp_dir)
+
 
 if __name__ == '__main__':
     unittest.main()